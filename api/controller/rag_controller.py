@@ -1,18 +1,32 @@
 from fastapi import HTTPException, status, UploadFile
-from typing import Dict, Any, Optional, List
+from fastapi.responses import JSONResponse
+from typing import Dict, Any, Optional, List, Iterable, Callable, Awaitable
+from pathlib import Path
+import asyncio
+import contextlib
+import time
 import uuid
 
 from schema.rag_schema import DocumentPayload, QueryRequest, QueryResponse, SourceDocument
 from service.rag.rag_service import rag_service
-from service.features.file_processing_service import file_processing_service
+from service.features.file_processing_service import file_processing_service, SUPPORTED_EXTENSIONS
+from service.features.extraction_cache import extraction_cache
+from service.features.ingestion_job_service import ingestion_job_service
+from service.features.near_duplicate_service import near_duplicate_service
 from service.features.user_documents_service import user_documents_service
 from service.features.chat_session_service import chat_session_service
+from lib.pipeline import StagedPipeline
 import logging
 
 logger = logging.getLogger(__name__)
 
 from lib.config import settings
 
+
+async def _ignore_progress(stage: str, **progress):
+    """Default progress reporter for uploads indexed inside the request."""
+
+
 class RAGController:
 
     def _resolve_and_log_key(self, api_keys: Dict[str, str], key_key: str, setting_key: Optional[str], provider_name: str, username: str) -> Optional[str]:
@@ -34,18 +48,23 @@ class RAGController:
     async def delete_documents(self, filenames: list, user: Dict[str, Any]) -> Dict[str, Any]:
         """
         Deletes documents and their associated index data for a user.
+        Only the targeted records are read (IDs only), and the vector store, parent store,
+        document text and record deletions run concurrently. The metadata-filter vector
+        delete only runs when deleting by ID is not possible or failed.
         """
         username = user.get('username')
         logger.info(f"User '{username}' requesting deletion of {len(filenames)} documents: {filenames}")
         
         try:
             # Local imports to avoid circular dependencies
-            from service.rag.pinecone_service import pinecone_service
+            from service.rag.vector_store_service import vector_store_service
             from service.rag.parent_chunks_service import parent_chunks_service
+            from service.rag.document_text_service import document_text_service
 
-            # 1. Get the documents to retrieve metadata (chunk_ids, parent_ids) before deletion
-            existing_docs = await user_documents_service.get_user_documents(username)
-            target_docs = [doc for doc in existing_docs if doc.get('filename') in filenames]
+            # 1. Get the targeted documents' IDs (chunk_ids, parent_ids) before deletion
+            target_docs = await user_documents_service.find_documents(
+                username, filenames, projection={"filename": 1, "chunk_ids": 1, "parent_ids": 1, "text_doc_id": 1}
+            )
             
             if not target_docs:
                 logger.warning(f"No documents found for deletion matching: {filenames}")
@@ -54,36 +73,62 @@ class RAGController:
             # 2. Collect IDs
             chunk_ids = []
             parent_ids = []
+            text_doc_ids = []
             for doc in target_docs:
                 chunk_ids.extend(doc.get('chunk_ids', []))
                 parent_ids.extend(doc.get('parent_ids', []))
+                if doc.get('text_doc_id'):
+                    text_doc_ids.append(doc['text_doc_id'])
+            target_filenames = [doc['filename'] for doc in target_docs]
+            
+            # Drop cached parents up front so in-flight queries stop serving them
+            parent_chunks_service.invalidate_cache(parent_ids)
             
-            # 3. Delete from Vector Store (Pinecone)
-            # Delete child chunks by ID
-            vectors_deleted = 0
-            if chunk_ids:
-                vectors_deleted = await pinecone_service.delete_vectors_by_chunk_ids(chunk_ids)
+            # 3. Delete from Vector Store (Pinecone or local index)
+            async def _delete_vectors() -> Dict[str, Any]:
+                deleted = 0
+                if chunk_ids:
+                    deleted = await vector_store_service.delete_vectors_by_chunk_ids(chunk_ids, username=username)
+                    if deleted:
+                        return {"deleted": deleted, "method": "ids"}
+                    logger.warning(f"Deleting {len(chunk_ids)} vectors by ID failed; deleting by filter instead")
+                # Records without chunk IDs (or a failed ID pass): delete by metadata filter
+                removed = await vector_store_service.delete_vectors_by_filter({
+                    "username": username,
+                    "source_filename": {"$in": target_filenames}
+                })
+                return {"deleted": deleted, "method": "ids+filter" if chunk_ids else "filter", "ok": removed}
             
-            # Also delete by filter as a safety net
-            await pinecone_service.delete_vectors_by_filter({
-                "username": username,
-                "source_filename": {"$in": filenames}
-            })
+            # 4. Delete Parent Chunks (MongoDB) and compressed document text ("offsets" mode)
+            async def _delete_parents() -> Dict[str, Any]:
+                return {"deleted": await parent_chunks_service.delete_parent_chunks(parent_ids) if parent_ids else 0}
             
-            # 4. Delete Parent Chunks (MongoDB)
-            parents_deleted = 0
-            if parent_ids:
-                parents_deleted = await parent_chunks_service.delete_parent_chunks(parent_ids)
+            async def _delete_texts() -> Dict[str, Any]:
+                return {"deleted_blocks": await document_text_service.delete_texts(text_doc_ids) if text_doc_ids else 0}
                 
             # 5. Delete from User Documents Collection (MongoDB)
-            docs_deleted = await user_documents_service.delete_documents(username, filenames)
+            async def _delete_records() -> Dict[str, Any]:
+                return {"deleted": await user_documents_service.delete_documents(username, target_filenames)}
             
-            logger.info(f"Deletion complete. Docs: {docs_deleted}, Vectors: {vectors_deleted}, Parents: {parents_deleted}")
+            near_duplicate_service.unregister(username, target_filenames)
+            
+            stores = dict(zip(
+                ["vectors", "parent_chunks", "document_texts", "user_documents"],
+                await asyncio.gather(*[
+                    self._timed_step(step) for step in (_delete_vectors, _delete_parents, _delete_texts, _delete_records)
+                ])
+            ))
+            
+            docs_deleted = stores["user_documents"].get("deleted", 0)
+            vectors_deleted = stores["vectors"].get("deleted", 0)
+            parents_deleted = stores["parent_chunks"].get("deleted", 0)
+            logger.info(f"Deletion complete. Docs: {docs_deleted}, Vectors: {vectors_deleted}, Parents: {parents_deleted} ({stores})")
             
             return {
                 "deleted_documents": docs_deleted,
                 "deleted_vectors": vectors_deleted, 
                 "deleted_parent_chunks": parents_deleted,
+                "stores": stores,
                 "message": f"Successfully deleted {docs_deleted} documents."
             }
             
@@ -269,60 +314,534 @@ class RAGController:
     ) -> Dict[str, str]:
         """
         Controller logic to handle file upload, extract text, generate description, and then index it.
+        With ingestion jobs enabled the upload is queued instead and a 202 with the job ID is
+        returned; progress is then available from GET /rag/jobs/{job_id}.
         """
         logger.info(f"User '{user.get('username')}' uploaded file: '{file.filename}' for indexing.")
+        file_processing_service.check_upload_size(file)
+
+        if settings.ingestion_jobs_enabled:
+            return await self._queue_ingestion_job(file, user)
+        response = await self._index_upload(file, user)
+        if response.get("skipped"):
+            return JSONResponse(status_code=status.HTTP_200_OK, content=response)
+        return response
+
+    async def _queue_ingestion_job(self, file: UploadFile, user: Dict[str, Any]) -> JSONResponse:
+        """Spool the upload and queue it for the background ingestion workers."""
+        file_ext = Path(file.filename or "").suffix.lower()
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported file type: {file_ext}",
+            )
+
+        try:
+            job = await ingestion_job_service.submit(file, user)
+        except Exception as e:
+            logger.error(f"Error queueing '{file.filename}' for user '{user.get('username')}': {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to queue document for indexing: {str(e)}",
+            )
+
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "message": f"Queued '{file.filename}' for indexing",
+                "job_id": job["job_id"],
+                "status_url": f"/rag/jobs/{job['job_id']}",
+                "job": job
+            }
+        )
+
+    async def run_ingestion_job(self, job: Dict[str, Any], report: Callable[..., Awaitable[None]]) -> Dict[str, Any]:
+        """
+        Ingestion worker entry point: indexes a spooled upload as its owner.
+        The user (and their API keys) is loaded fresh, so keys are never stored on the job.
+        """
+        from service.infrastructure.user_service import user_service
+
+        user = await user_service.get_user_by_id(job["user_id"])
+        if user is None:
+            raise Exception(f"User '{job['username']}' no longer exists")
+        user["api_keys"] = await user_service.get_decrypted_api_keys(job["user_id"])
+
+        if job.get("kind") == "batch":
+            with contextlib.ExitStack() as stack:
+                uploads = [
+                    UploadFile(file=stack.enter_context(open(path, "rb")), filename=filename)
+                    for filename, path in zip(job["filenames"], job["spool_paths"])
+                ]
+                return await self._index_batch(uploads, user, report)
+
+        with open(job["spool_path"], "rb") as spooled:
+            upload = UploadFile(file=spooled, filename=job["filename"], size=job.get("size_bytes"))
+            response = await self._index_upload(upload, user, report)
+
+        document = response.get("document", {})
+        result = {
+            "message": response.get("message"),
+            "title": document.get("title"),
+            "chunks": document.get("chunks", 0),
+            "parent_chunks": len(document.get("parent_ids", [])),
+        }
+        for key in ("reindex", "skipped", "near_duplicate"):
+            if response.get(key):
+                result[key] = response[key]
+        return result
+
+    async def _index_upload(
+        self, file: UploadFile, user: Dict[str, Any], report: Callable[..., Awaitable[None]] = _ignore_progress
+    ) -> Dict[str, Any]:
+        """
+        Extract and index an upload, reporting each stage to `report`. The description is
+        generated concurrently with indexing and joined when the document record is written.
+        Near-duplicates of the user's other documents are flagged, or skipped before chunking
+        when NEAR_DUPLICATE_ACTION is "skip".
+        """
         api_keys = user.get('api_keys', {})
 
+        # Large plain-text uploads are chunked straight from the spooled file instead of read whole
+        if self._should_stream(file):
+            return await self._upload_and_index_stream(file, user, report)
+
         # 1. Extract text from the uploaded file
+        await report("extracting")
         extracted_data = await file_processing_service.extract_text_from_file(file)
 
         # 1.1 Deduplication Check: Remove existing document with same name
-        existing_docs = await user_documents_service.get_user_documents(user.get('username'))
-        if any(doc.get('filename') == file.filename for doc in existing_docs):
-            logger.info(f"Document '{file.filename}' already exists. Replacing it...")
-            await self.delete_documents([file.filename], user)
+        await self._replace_existing_document(file.filename, user)
+
+        # 1.2 Near-duplicate check against the user's other documents
+        near_duplicate = await near_duplicate_service.check_and_register(user.get('username'), file.filename, extracted_data["fingerprint"])
+        if near_duplicate and near_duplicate_service.action == "skip":
+            return self._near_duplicate_skipped(file.filename, near_duplicate)
+
+        # 2. Generate a description using Gemini or Groq, while the document is indexed
+        description_task = self._start_description(
+            extracted_data["content"], extracted_data["title"], api_keys, user.get('username'),
+            content_hash=extracted_data.get("content_hash"), cached=extracted_data.get("description")
+        )
+
+        # 3. Create a DocumentPayload from the extracted content
+        doc_payload = DocumentPayload(
+            title=extracted_data["title"],
+            content=extracted_data["content"],
+            metadata={
+                "source_filename": file.filename
+            }
+        )
+
+        # 4. Reuse the existing indexing logic
+        await report("indexing", chars=len(extracted_data["content"]), chunks_indexed=0)
+        return await self.process_and_index_document(
+            doc_payload, user, file.filename,
+            on_progress=lambda chunks: report("indexing", chunks_indexed=chunks),
+            description_task=description_task,
+            fingerprint=extracted_data["fingerprint"],
+            near_duplicate=near_duplicate,
+            section_markers=extracted_data.get("section_markers", False)
+        )
+
+    async def _upload_and_index_stream(
+        self, file: UploadFile, user: Dict[str, Any], report: Callable[..., Awaitable[None]] = _ignore_progress
+    ) -> Dict[str, Any]:
+        """
+        Indexes a large plain-text upload as a stream: the chunker reads it piece by piece,
+        so memory stays bounded by the indexing window rather than the file size.
+        The description is generated from the first piece only.
+        """
+        logger.info(f"Streaming '{file.filename}' through the indexer ({file_processing_service.upload_size(file)} bytes)")
+        title = Path(file.filename).stem
+
+        await self._replace_existing_document(file.filename, user)
+
+        fingerprint = await self._fingerprint_stream(file)
+        near_duplicate = await near_duplicate_service.check_and_register(user.get('username'), file.filename, fingerprint)
+        if near_duplicate and near_duplicate_service.action == "skip":
+            return self._near_duplicate_skipped(file.filename, near_duplicate)
+
+        preview = await self._read_stream_preview(file)
+        description_task = self._start_description(preview, title, user.get('api_keys', {}), user.get('username'))
+
+        doc_payload = DocumentPayload(
+            title=title,
+            content=preview,
+            metadata={
+                "source_filename": file.filename
+            }
+        )
+        await report("indexing", chunks_indexed=0)
+        return await self.process_and_index_document(
+            doc_payload, user, file.filename,
+            content_stream=file_processing_service.iter_text_stream(file),
+            on_progress=lambda chunks: report("indexing", chunks_indexed=chunks),
+            description_task=description_task,
+            fingerprint=fingerprint,
+            near_duplicate=near_duplicate
+        )
+
+    def _should_stream(self, file: UploadFile) -> bool:
+        """Large plain-text uploads are chunked straight from the spooled file instead of read whole."""
+        return (file_processing_service.can_stream(file)
+                and file_processing_service.upload_size(file) >= settings.streaming_index_min_mb * 1024 * 1024)
+
+    async def _read_stream_preview(self, file: UploadFile) -> str:
+        """The start of a streamed upload, used as its description input and payload content."""
+        preview_stream = file_processing_service.iter_text_stream(file)
+        preview = await asyncio.to_thread(lambda: next(preview_stream, "")[:2000])
+        preview_stream.close()
+        return preview
+
+    async def _fingerprint_stream(self, file: UploadFile) -> Optional[bytes]:
+        """MinHash fingerprint of a streamed upload, from a separate pass over the spooled file."""
+        if not near_duplicate_service.enabled:
+            return None
+        return await asyncio.to_thread(near_duplicate_service.fingerprint_stream, file_processing_service.iter_text_stream(file))
+
+    def _near_duplicate_skipped(self, filename: str, near_duplicate: Dict[str, Any]) -> Dict[str, Any]:
+        logger.info(f"Skipped indexing '{filename}': near-duplicate of '{near_duplicate['filename']}'")
+        return {
+            "message": f"Skipped '{filename}': near-duplicate of '{near_duplicate['filename']}' "
+                       f"(similarity {near_duplicate['similarity']})",
+            "skipped": True,
+            "near_duplicate": near_duplicate
+        }
+
+    async def upload_batch(self, files: List[UploadFile], user: Dict[str, Any]):
+        """
+        Index many uploads through a staged pipeline (extract -> chunk -> embed -> store)
+        connected by bounded queues, so one file's embedding overlaps the previous file's storage
+        and the next file's extraction. Queued as one background job when ingestion jobs are enabled.
+        """
+        username = user.get('username')
+        logger.info(f"User '{username}' uploaded a batch of {len(files)} files for indexing.")
+
+        if not files:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No files uploaded")
+        if len(files) > settings.batch_upload_max_files:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Too many files: {len(files)} (max {settings.batch_upload_max_files})",
+            )
+        filenames = [file.filename for file in files]
+        duplicates = sorted({name for name in filenames if filenames.count(name) > 1})
+        if duplicates:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Duplicate filenames in batch: {duplicates}")
+        unsupported = [name for name in filenames if Path(name or "").suffix.lower() not in SUPPORTED_EXTENSIONS]
+        if unsupported:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported file types: {unsupported}",
+            )
+        for file in files:
+            file_processing_service.check_upload_size(file)
+
+        if settings.ingestion_jobs_enabled:
+            try:
+                job = await ingestion_job_service.submit_batch(files, user)
+            except Exception as e:
+                logger.error(f"Error queueing batch for user '{username}': {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Failed to queue documents for indexing: {str(e)}",
+                )
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={
+                    "message": f"Queued {len(files)} files for indexing",
+                    "job_id": job["job_id"],
+                    "status_url": f"/rag/jobs/{job['job_id']}",
+                    "job": job
+                }
+            )
+
+        return await self._index_batch(files, user)
+
+    async def _index_batch(
+        self, files: List[UploadFile], user: Dict[str, Any], report: Callable[..., Awaitable[None]] = _ignore_progress
+    ) -> Dict[str, Any]:
+        """
+        Runs the batch pipeline. Files move through extract whole (which also checks for
+        near-duplicates and starts their description task); the chunk stage then emits each file's indexing windows, followed
+        by an end marker on which the store stage finalizes (or rolls back) that file.
+        Per-file failures do not stop the batch. Returns per-file outcomes and per-stage throughput.
+        """
+        username = user.get('username')
+        api_keys = user.get('api_keys', {})
+        states = [
+            {"upload": file, "filename": file.filename, "error": None, "response": None, "skipped": False,
+             "fingerprint": None, "near_duplicate": None}
+            for file in files
+        ]
+        progress = {"files_total": len(states), "files_done": 0, "files_failed": 0, "files_skipped": 0, "chunks_indexed": 0}
+
+        def _fail(stage: str, item: Dict[str, Any], exc: Exception):
+            state = item.get("state", item)
+            if not state["error"]:
+                state["error"] = f"{stage}: {getattr(exc, 'detail', None) or exc}"
+
+        async def extract(state, emit):
+            file = state["upload"]
+            if self._should_stream(file):
+                state["title"] = Path(file.filename).stem
+                state["content"] = await self._read_stream_preview(file)
+                state["content_stream"] = file_processing_service.iter_text_stream(file)
+                state["fingerprint"] = await self._fingerprint_stream(file)
+            else:
+                extracted = await file_processing_service.extract_text_from_file(file)
+                state["title"], state["content"] = extracted["title"], extracted["content"]
+                state["fingerprint"] = extracted["fingerprint"]
+                state["content_hash"], state["cached_description"] = extracted.get("content_hash"), extracted.get("description")
+                state["section_markers"] = extracted.get("section_markers", False)
+
+            await self._replace_existing_document(state["filename"], user)
+            state["near_duplicate"] = await near_duplicate_service.check_and_register(username, state["filename"], state["fingerprint"])
+            if state["near_duplicate"] and near_duplicate_service.action == "skip":
+                # Never reaches the later stages
+                state["skipped"], state["content"] = True, None
+                return 0
+
+            state["description_task"] = self._start_description(
+                state["content"], state["title"], api_keys, username,
+                content_hash=state.get("content_hash"), cached=state.get("cached_description")
+            )
+            await emit(state)
+            return len(state["content"])
+
+        async def chunk(state, emit):
+            filename = state["filename"]
+            windows = 0
+            try:
+                state["payload"] = DocumentPayload(
+                    title=state["title"],
+                    content=state["content"],
+                    metadata={"source_filename": filename}
+                )
+                indexing_input = await self._prepare_indexing_input(state["payload"], username, filename, state.get("content_stream"))
+                indexing_input["section_markers"] = state.get("section_markers", False)
+                state["previous"] = indexing_input.get("previous")
+                state["run"] = rag_service.start_index_run(indexing_input)
+                while True:
+                    window = await state["run"].next_window()
+                    if window is None:
+                        break
+                    windows += 1
+                    await emit({"state": state, "window": window})
+            except Exception as e:
+                _fail("chunk", state, e)
+            finally:
+                state["content"] = None
+                await emit({"state": state, "window": None})
+            return windows
+
+        async def embed(item, emit):
+            state, window = item["state"], item["window"]
+            if window is not None and not state["error"]:
+                item["vectors"] = await state["run"].embed(window)
+            await emit(item)
+            return len(window["new_children"]) if window is not None and not state["error"] else 0
+
+        async def store(item, emit):
+            state, window = item["state"], item["window"]
+            if window is not None:
+                if state["error"]:
+                    return 0
+                await state["run"].store(window, item["vectors"])
+                progress["chunks_indexed"] += len(window["new_children"]) + len(window["reused_ids"])
+                return len(window["new_children"])
+
+            # End of this file: finalize, or undo what was already written
+            run = state.get("run")
+            try:
+                if state["error"] is None:
+                    index_result = await run.finish()
+                    state["response"] = await self._record_indexed_document(
+                        state["payload"], user, state["filename"], state.get("previous"), index_result,
+                        state["description_task"], state["fingerprint"], state["near_duplicate"]
+                    )
+            except Exception as e:
+                _fail("store", state, e)
+            if state["error"] is not None and state.get("description_task"):
+                state["description_task"].cancel()
+            if state["error"] is not None:
+                near_duplicate_service.unregister(username, [state["filename"]])
+            if state["error"] is not None and run is not None:
+                # Only removes what this run wrote; a previous version stays as it was
+                await run.rollback()
+            progress["files_failed" if state["error"] else "files_done"] += 1
+            await report("indexing", **progress)
+
+        pipeline = StagedPipeline(queue_size=settings.batch_upload_queue_size, on_error=_fail)
+        pipeline.add_stage("extract", extract, workers=settings.batch_upload_extract_workers)
+        pipeline.add_stage("chunk", chunk)
+        pipeline.add_stage("embed", embed)
+        pipeline.add_stage("store", store)
+
+        await report("indexing", **progress)
+        stats = await pipeline.run(states)
+        # Files dropped by extract never reach the store stage
+        progress["files_failed"] = sum(1 for state in states if state["error"])
+        progress["files_skipped"] = sum(1 for state in states if state["skipped"] and not state["error"])
+        progress["files_done"] = len(states) - progress["files_failed"] - progress["files_skipped"]
+
+        results = []
+        for state in states:
+            if state["error"]:
+                results.append({"filename": state["filename"], "status": "failed", "error": state["error"]})
+                continue
+            if state["skipped"]:
+                results.append({"filename": state["filename"], "status": "skipped", "near_duplicate": state["near_duplicate"]})
+                continue
+            document = state["response"].get("document", {})
+            result = {"filename": state["filename"], "status": "indexed", "chunks": document.get("chunks", 0)}
+            for key in ("reindex", "near_duplicate"):
+                if state["response"].get(key):
+                    result[key] = state["response"][key]
+            results.append(result)
+
+        logger.info(f"Batch for user '{username}': {progress['files_done']} indexed, {progress['files_skipped']} skipped, "
+                    f"{progress['files_failed']} failed, "
+                    f"bottleneck '{stats['bottleneck']}' ({stats['wall_seconds']} s)")
+        return {
+            "message": f"Indexed {progress['files_done']} of {len(states)} files",
+            "indexed": progress["files_done"],
+            "failed": progress["files_failed"],
+            "skipped": progress["files_skipped"],
+            "files": results,
+            "pipeline": stats
+        }
+
+    @staticmethod
+    async def _timed_step(step: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Run one store's deletion; report its outcome and duration instead of raising."""
+        started = time.perf_counter()
+        try:
+            result = {"ok": True, **await step()}
+        except Exception as e:
+            logger.error(f"Deletion step failed: {e}")
+            result = {"ok": False, "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    async def _replace_existing_document(self, filename: str, user: Dict[str, Any]):
+        """
+        Deduplication: remove an existing document with the same name before re-indexing.
+        With incremental indexing the old version is kept; process_and_index_document
+        diffs against it and removes only the chunks that vanished.
+        """
+        if settings.incremental_indexing:
+            return
+        if await self._find_document(filename, user.get('username'), projection={"filename": 1}):
+            logger.info(f"Document '{filename}' already exists. Replacing it...")
+            await self.delete_documents([filename], user)
+
+    async def _find_document(self, filename: str, username: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        docs = await user_documents_service.find_documents(username, [filename], projection=projection)
+        return docs[0] if docs else None
 
-        # 2. Generate a description using Gemini or Groq
+    async def _remove_superseded_chunks(self, previous: Dict[str, Any], index_result: Dict[str, Any], username: str) -> Dict[str, int]:
+        """
+        After an incremental re-index has been recorded, point reused parents at the new
+        document text (offsets mode) and delete what only the previous version referenced.
+        """
+        from service.rag.vector_store_service import vector_store_service
+        from service.rag.parent_chunks_service import parent_chunks_service
+        from service.rag.document_text_service import document_text_service
+        
+        retarget_parents = index_result.get("retarget_parents") or []
+        retargeted = not retarget_parents or await parent_chunks_service.store_parent_chunks(retarget_parents)
+        if not retargeted:
+            logger.error(f"Failed to retarget {len(retarget_parents)} reused parent chunks; keeping the previous document text")
+        
+        current_chunks = set(index_result.get("chunk_ids", []))
+        current_parents = set(index_result.get("parent_ids", []))
+        vanished_chunks = [cid for cid in previous.get("chunk_ids", []) if cid not in current_chunks]
+        vanished_parents = [pid for pid in previous.get("parent_ids", []) if pid not in current_parents]
+        
+        steps = []
+        if vanished_chunks:
+            steps.append(vector_store_service.delete_vectors_by_chunk_ids(vanished_chunks, username=username))
+        if vanished_parents:
+            steps.append(parent_chunks_service.delete_parent_chunks(vanished_parents))
+        old_text_doc_id = previous.get("text_doc_id")
+        # Parents that could not be retargeted still point into the old text
+        if old_text_doc_id and old_text_doc_id != index_result.get("text_doc_id") and retargeted:
+            steps.append(document_text_service.delete_texts([old_text_doc_id]))
+        await asyncio.gather(*steps)
+        
+        return {"deleted_chunks": len(vanished_chunks), "deleted_parent_chunks": len(vanished_parents)}
+
+    def _start_description(self, content: str, title: str, api_keys: Dict[str, str], username: str, content_hash: Optional[str] = None, cached: Optional[str] = None) -> asyncio.Future:
+        """
+        Start generating the description in the background, bounded by
+        DESCRIPTION_TIMEOUT_SECONDS from now. Joined by _join_description().
+        A `cached` description (from an identical earlier upload) is used as-is; a newly
+        generated one is saved to the extraction cache under `content_hash`.
+        """
+        if cached:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(cached)
+            return future
+        return asyncio.create_task(self._describe(content, title, api_keys, username, content_hash))
+
+    async def _describe(self, content: str, title: str, api_keys: Dict[str, str], username: str, content_hash: Optional[str]) -> str:
+        description = await asyncio.wait_for(
+            self._generate_description(content, title, api_keys, username),
+            timeout=settings.description_timeout_seconds
+        )
+        # The LLM services return a placeholder instead of raising; never cache that
+        if content_hash and extraction_cache is not None and description and not description.startswith("No description available"):
+            await asyncio.to_thread(extraction_cache.set_description, content_hash, description)
+        return description
+
+    async def _join_description(self, description_task: asyncio.Task, filename: str) -> Optional[str]:
+        """The generated description, or None if it failed or timed out (indexing never waits on a retry)."""
+        try:
+            return await description_task
+        except asyncio.TimeoutError:
+            logger.warning(f"Description for '{filename}' timed out after {settings.description_timeout_seconds}s; saving without one")
+        except Exception as e:
+            logger.warning(f"Description for '{filename}' failed: {e}; saving without one")
+        return None
+
+    async def _generate_description(self, content: str, title: str, api_keys: Dict[str, str], username: str) -> str:
+        """Generate a short document description with Groq if a key is available, else Gemini."""
         from service.rag.gemini_service import gemini_service
         from service.rag.groq_service import groq_service
         
         # Resolve keys to decide which service to use
         # We prefer Groq for description if available (User or System)
-        groq_key = self._resolve_and_log_key(api_keys, 'groq_api_key', settings.groq_api_key, 'Groq', user.get('username'))
+        groq_key = self._resolve_and_log_key(api_keys, 'groq_api_key', settings.groq_api_key, 'Groq', username)
         
         if groq_key:
-             description = await groq_service.generate_description(
-                content=extracted_data["content"],
-                title=extracted_data["title"],
+            return await groq_service.generate_description(
+                content=content,
+                title=title,
                 api_key=groq_key
             )
-        else:
-            # Fallback to Gemini
-            google_key = self._resolve_and_log_key(api_keys, 'google_api_key', settings.google_api_key, 'Google', user.get('username'))
-            description = await gemini_service.generate_description(
-                content=extracted_data["content"],
-                title=extracted_data["title"],
-                api_key=google_key
-            )
-
-        # 3. Create a DocumentPayload from the extracted content and description
-        doc_payload = DocumentPayload(
-            title=extracted_data["title"],
-            content=extracted_data["content"],
-            metadata={
-                "source_filename": file.filename,
-                "description": description
-            }
+        # Fallback to Gemini
+        google_key = self._resolve_and_log_key(api_keys, 'google_api_key', settings.google_api_key, 'Google', username)
+        return await gemini_service.generate_description(
+            content=content,
+            title=title,
+            api_key=google_key
         )
 
-        # 4. Reuse the existing indexing logic
-        return await self.process_and_index_document(doc_payload, user, file.filename)
-
-    async def process_and_index_document(self, doc_payload: DocumentPayload, user: Dict[str, Any], filename: Optional[str] = None) -> Dict[str, Any]:
+    async def process_and_index_document(self, doc_payload: DocumentPayload, user: Dict[str, Any], filename: Optional[str] = None, content_stream: Optional[Iterable[str]] = None, on_progress: Optional[Callable[[int], Awaitable[None]]] = None, description_task: Optional[asyncio.Task] = None, fingerprint: Optional[bytes] = None, near_duplicate: Optional[Dict[str, Any]] = None, section_markers: bool = False) -> Dict[str, Any]:
         """
         Orchestrates the indexing process:
         1. Run the core RAG indexing module (Chunking -> Embedding -> Pinecone).
         2. Save document metadata to MongoDB (User Documents) with the generated IDs.
+        If `content_stream` is given it is indexed instead of doc_payload.content.
+        `on_progress(chunks_indexed)` is awaited after each indexing window.
+        A `description_task` (see _start_description) runs alongside indexing and is
+        joined only when the document record is written.
+        `fingerprint` and `near_duplicate` (see NearDuplicateService) are saved on the record.
+        `section_markers` says the text came from the Markdown extractor (see iter_small_to_big).
+        With incremental indexing, an existing document of the same name is diffed by
+        chunk ID: only new chunks are embedded and only vanished ones are deleted.
         """
         username = user.get('username')
         
@@ -336,53 +855,125 @@ class RAGController:
 
         try:
             # 1. Prepare data for indexing module
-            # CRITICAL: Inject username into metadata for multi-tenant isolation
-            doc_payload.metadata["username"] = username
-            
-            indexing_input = {
-                "content": doc_payload.content,
-                "title": doc_payload.title,
-                "metadata": doc_payload.metadata
-            }
+            indexing_input = await self._prepare_indexing_input(doc_payload, username, filename, content_stream)
+            if on_progress is not None:
+                indexing_input["on_progress"] = on_progress
+            indexing_input["section_markers"] = section_markers
             
             # 2. Run Indexing Module
             # This handles chunking, embedding, and storing in Pinecone/Parent Store
             index_result = await rag_service.indexing_module(indexing_input)
             
-            chunk_ids = index_result.get("chunk_ids", [])
-            parent_ids = index_result.get("parent_ids", [])
-            
-            if not chunk_ids:
-                 # It's possible indexing failed or content was empty/too short
-                 if len(doc_payload.content.strip()) < 10:
-                      logger.warning(f"Document content too short for indexing: {len(doc_payload.content)} chars")
-                 else:
-                      logger.warning("Indexing returned 0 chunks.")
-                 
             # 3. Save to User Documents (MongoDB)
-            doc_record = await user_documents_service.add_document(
-                username=username,
-                title=doc_payload.title,
-                filename=filename,
-                chunk_ids=chunk_ids,
-                parent_ids=parent_ids,
-                description=doc_payload.metadata.get("description")
-            )
-            
-            logger.info(f"Document '{filename}' successfully processed and stored for user '{username}'.")
-            
-            return {
-                "message": f"Successfully indexed '{filename}'",
-                "document": doc_record
-            }
+            return await self._record_indexed_document(doc_payload, user, filename, indexing_input.get("previous"), index_result, description_task, fingerprint, near_duplicate)
 
         except Exception as e:
+            if description_task:
+                description_task.cancel()
+            near_duplicate_service.unregister(username, [filename])
             logger.error(f"Error processing document '{filename}': {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to process document: {str(e)}",
             )
 
+    async def _prepare_indexing_input(self, doc_payload: DocumentPayload, username: str, filename: str, content_stream: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Build the indexing_module input, including the previous version for incremental re-indexing."""
+        # CRITICAL: Inject username into metadata for multi-tenant isolation
+        doc_payload.metadata["username"] = username
+        
+        indexing_input = {
+            "content": doc_payload.content,
+            "title": doc_payload.title,
+            "metadata": doc_payload.metadata
+        }
+        if content_stream is not None:
+            indexing_input["content_stream"] = content_stream
+        
+        # Chunk IDs are derived from this key and the chunk content
+        indexing_input["doc_key"] = f"{username}/{filename}"
+        if settings.incremental_indexing:
+            previous = await self._find_document(filename, username)
+            if previous:
+                logger.info(f"Document '{filename}' already exists. Re-indexing incrementally...")
+                indexing_input["previous"] = previous
+        return indexing_input
+
+    async def _record_indexed_document(self, doc_payload: DocumentPayload, user: Dict[str, Any], filename: str, previous: Optional[Dict[str, Any]], index_result: Dict[str, Any], description_task: Optional[asyncio.Task] = None, fingerprint: Optional[bytes] = None, near_duplicate: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Save the user document record, joining the concurrently generated description if there
+        is one, then remove what the previous version no longer needs. An incremental run that
+        indexed nothing has already been rolled back and leaves the previous version in place.
+        """
+        username = user.get('username')
+        chunk_ids = index_result.get("chunk_ids", [])
+        parent_ids = index_result.get("parent_ids", [])
+        
+        if not chunk_ids:
+             # It's possible indexing failed or content was empty/too short
+             if len(doc_payload.content.strip()) < 10:
+                  logger.warning(f"Document content too short for indexing: {len(doc_payload.content)} chars")
+             else:
+                  logger.warning("Indexing returned 0 chunks.")
+             if previous:
+                  # The run was rolled back; the previous version is still intact, so keep it
+                  raise Exception(f"Indexing produced no chunks; the previous version of '{filename}' was kept")
+        
+        if description_task:
+            doc_payload.metadata["description"] = await self._join_description(description_task, filename)
+             
+        doc_record = await user_documents_service.add_document(
+            username=username,
+            title=doc_payload.title,
+            filename=filename,
+            chunk_ids=chunk_ids,
+            parent_ids=parent_ids,
+            description=doc_payload.metadata.get("description"),
+            text_doc_id=index_result.get("text_doc_id"),
+            fingerprint=fingerprint,
+            near_duplicate_of=near_duplicate
+        )
+        
+        logger.info(f"Document '{filename}' successfully processed and stored for user '{username}'.")
+        
+        # Only now that the new version is recorded is the previous one taken apart. A failure
+        # here leaves orphans behind, but must not fail (and roll back) the recorded upload.
+        reindex_stats = None
+        if previous and chunk_ids:
+            try:
+                reindex_stats = await self._remove_superseded_chunks(previous, index_result, username)
+            except Exception as e:
+                logger.error(f"Failed to remove superseded chunks of '{filename}': {e}")
+                reindex_stats = {}
+            reindex_stats["reused_chunks"] = index_result.get("reused_chunks", 0)
+            reindex_stats["embedded_chunks"] = len(chunk_ids) - reindex_stats["reused_chunks"]
+            logger.info(f"Incremental re-index of '{filename}': {reindex_stats}")
+        
+        response = {
+            "message": f"Successfully indexed '{filename}'",
+            "document": doc_record
+        }
+        if reindex_stats:
+            response["reindex"] = reindex_stats
+        if near_duplicate:
+            response["near_duplicate"] = near_duplicate
+        return response
+
+    async def get_ingestion_job(self, job_id: str, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Status and progress of one of the user's ingestion jobs."""
+        job = await ingestion_job_service.get_job(job_id, user.get('username'))
+        if job is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Ingestion job '{job_id}' not found",
+            )
+        return job
+
+    async def list_ingestion_jobs(self, user: Dict[str, Any], limit: int = 50) -> Dict[str, Any]:
+        """The user's most recent ingestion jobs."""
+        jobs = await ingestion_job_service.list_jobs(user.get('username'), limit=limit)
+        return {'jobs': jobs, 'total': len(jobs)}
+
     async def get_indexed_documents(self, user: Dict[str, Any]) -> Dict[str, Any]:
         """
         Controller logic to retrieve all indexed documents for the user.
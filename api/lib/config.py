@@ -25,6 +25,124 @@ class Settings(BaseSettings):
     # Embedding Configuration
     embedding_dim: int = int(os.getenv("EMBEDDING_DIM", "768"))  # For FastEmbed (BGE Base)
     
+    # Embedding Cache (content-hash keyed, memory LRU + on-disk store)
+    embedding_cache_enabled: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    embedding_cache_dir: Optional[str] = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+    embedding_cache_memory_mb: int = int(os.getenv("EMBEDDING_CACHE_MEMORY_MB", "64"))
+    embedding_cache_max_disk_entries: int = int(os.getenv("EMBEDDING_CACHE_MAX_DISK_ENTRIES", "2000000"))
+    
+    # Query Embedding Micro-batching (coalesces concurrent get_embedding calls)
+    embedding_microbatch_enabled: bool = os.getenv("EMBEDDING_MICROBATCH_ENABLED", "true").lower() == "true"
+    embedding_microbatch_window_ms: float = float(os.getenv("EMBEDDING_MICROBATCH_WINDOW_MS", "3"))
+    embedding_microbatch_max_size: int = int(os.getenv("EMBEDDING_MICROBATCH_MAX_SIZE", "32"))
+    
+    # Sort texts by token length before batching to reduce padding in embedding inference
+    embedding_length_bucketing: bool = os.getenv("EMBEDDING_LENGTH_BUCKETING", "true").lower() == "true"
+    
+    # Pinecone client concurrency (SDK calls run on a dedicated thread pool)
+    pinecone_max_workers: int = int(os.getenv("PINECONE_MAX_WORKERS", "8"))
+    pinecone_upsert_concurrency: int = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", "4"))
+    # Per-user namespaces; off by default because an existing index must first be migrated
+    # (scripts/migrate_pinecone_namespaces.py), or its vectors stop matching queries and deletes
+    pinecone_use_namespaces: bool = os.getenv("PINECONE_USE_NAMESPACES", "false").lower() == "true"
+    
+    # Vector Store ("pinecone" or "local" in-process index)
+    vector_store_backend: str = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+    local_vector_store_dir: str = os.getenv("LOCAL_VECTOR_STORE_DIR", "data/indexes/vectors")
+    local_vector_store_dtype: str = os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")  # float32 | float16 | int8
+    
+    # Vector metadata: "full" (child text + document metadata) or "slim" (compact keys only)
+    vector_metadata_mode: str = os.getenv("VECTOR_METADATA_MODE", "full")
+    
+    # Inference Pool ("default" = shared executor, "thread" = dedicated threads, "process" = worker processes;
+    # in process mode only the workers load the embedding and rerank models)
+    inference_pool_mode: str = os.getenv("INFERENCE_POOL_MODE", "default")
+    inference_pool_size: int = int(os.getenv("INFERENCE_POOL_SIZE", "2"))
+    inference_onnx_threads: int = int(os.getenv("INFERENCE_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+    
+    # Parent chunk store (MongoDB) bulk writes
+    parent_chunks_write_batch_size: int = int(os.getenv("PARENT_CHUNKS_WRITE_BATCH_SIZE", "500"))
+    parent_chunks_write_concurrency: int = int(os.getenv("PARENT_CHUNKS_WRITE_CONCURRENCY", "4"))
+    
+    # Parent chunk LRU cache (per process)
+    parent_chunks_cache_enabled: bool = os.getenv("PARENT_CHUNKS_CACHE_ENABLED", "true").lower() == "true"
+    parent_chunks_cache_memory_mb: int = int(os.getenv("PARENT_CHUNKS_CACHE_MEMORY_MB", "64"))
+    
+    # Child chunking ("chars" = regex sentences over 20 chars, "tokens" = sentences merged/split
+    # by embedding-model tokens toward CHUNK_TARGET_TOKENS, never above CHUNK_MAX_TOKENS)
+    chunking_mode: str = os.getenv("CHUNKING_MODE", "chars")
+    chunk_target_tokens: int = int(os.getenv("CHUNK_TARGET_TOKENS", "128"))
+    chunk_max_tokens: int = int(os.getenv("CHUNK_MAX_TOKENS", "510"))  # bge-small: 512 incl. [CLS]/[SEP]
+    chunk_min_tokens: int = int(os.getenv("CHUNK_MIN_TOKENS", "8"))
+    
+    # Re-uploads diff chunk IDs against the stored version instead of re-indexing from scratch.
+    # Parent boundaries: "fixed" windows, or "content"-defined cut points that stay put after an edit.
+    # Fixed windows shift after any insert, so incremental indexing defaults to "content"
+    incremental_indexing: bool = os.getenv("INCREMENTAL_INDEXING", "true").lower() == "true"
+    parent_boundary_mode: str = os.getenv("PARENT_BOUNDARY_MODE", "content" if incremental_indexing else "fixed")
+    # End parents of Markdown uploads early at headings and code block starts (kept as markers
+    # by the Markdown extractor); text from other formats is never cut this way
+    parent_section_boundaries: bool = os.getenv("PARENT_SECTION_BOUNDARIES", "true").lower() == "true"
+    
+    # Indexing windows: child chunks embedded and stored per step, and the .txt upload
+    # size above which the file is streamed through the chunker instead of read whole
+    index_window_chunks: int = int(os.getenv("INDEX_WINDOW_CHUNKS", "512"))
+    streaming_index_min_mb: int = int(os.getenv("STREAMING_INDEX_MIN_MB", "8"))
+    
+    # Parent chunk storage ("full" = text stored on every parent, "offsets" = parents are
+    # (doc_id, start, end) spans into one compressed copy of each document's text)
+    parent_storage_mode: str = os.getenv("PARENT_STORAGE_MODE", "full")
+    document_text_block_chars: int = int(os.getenv("DOCUMENT_TEXT_BLOCK_CHARS", "65536"))
+    document_text_cache_memory_mb: int = int(os.getenv("DOCUMENT_TEXT_CACHE_MEMORY_MB", "64"))
+    
+    # Document descriptions are generated alongside indexing; past this the document is saved without one
+    description_timeout_seconds: float = float(os.getenv("DESCRIPTION_TIMEOUT_SECONDS", "20"))
+    
+    # Background ingestion jobs: uploads are spooled and indexed by a bounded worker pool
+    # (per process); jobs interrupted by a restart are resumed once their lease expires.
+    # Jobs are only claimed by the host that spooled them, unless INGESTION_SPOOL_SHARED says
+    # the spool directory is on storage every worker host can read.
+    ingestion_jobs_enabled: bool = os.getenv("INGESTION_JOBS_ENABLED", "true").lower() == "true"
+    ingestion_workers: int = int(os.getenv("INGESTION_WORKERS", "2"))
+    ingestion_spool_dir: str = os.getenv("INGESTION_SPOOL_DIR", "data/ingest")
+    ingestion_spool_shared: bool = os.getenv("INGESTION_SPOOL_SHARED", "false").lower() == "true"
+    ingestion_job_lease_seconds: int = int(os.getenv("INGESTION_JOB_LEASE_SECONDS", "120"))
+    ingestion_job_max_attempts: int = int(os.getenv("INGESTION_JOB_MAX_ATTEMPTS", "3"))
+    ingestion_job_retention_hours: int = int(os.getenv("INGESTION_JOB_RETENTION_HOURS", "168"))
+    # Inference threads (or worker processes in process mode) ingestion may occupy
+    ingestion_inference_threads: int = int(os.getenv("INGESTION_INFERENCE_THREADS", "1"))
+    
+    # Batch uploads (POST /rag/upload-batch): files per request, items buffered between
+    # pipeline stages, and concurrent workers for the extract stage
+    batch_upload_max_files: int = int(os.getenv("BATCH_UPLOAD_MAX_FILES", "100"))
+    batch_upload_queue_size: int = int(os.getenv("BATCH_UPLOAD_QUEUE_SIZE", "4"))
+    batch_upload_extract_workers: int = int(os.getenv("BATCH_UPLOAD_EXTRACT_WORKERS", "2"))
+    
+    # Extraction results and descriptions cached on disk by upload content hash (LRU-bounded)
+    extraction_cache_enabled: bool = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+    extraction_cache_dir: str = os.getenv("EXTRACTION_CACHE_DIR", ".cache/extractions")
+    extraction_cache_max_mb: int = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "512"))
+    
+    # Upload size limits: per file, and per request body of /rag/upload-batch. Oversized
+    # requests are rejected with 413 while the body is still streaming in.
+    max_upload_mb: int = int(os.getenv("MAX_UPLOAD_MB", "50"))
+    max_batch_upload_mb: int = int(os.getenv("MAX_BATCH_UPLOAD_MB", "500"))
+    
+    # PDF text extraction runs in its own process pool (0 = one thread); page ranges of a
+    # file are split across the workers. Larger or slower files are rejected.
+    pdf_extract_workers: int = int(os.getenv("PDF_EXTRACT_WORKERS", "2"))
+    pdf_max_pages: int = int(os.getenv("PDF_MAX_PAGES", "2000"))
+    pdf_extract_timeout_seconds: float = float(os.getenv("PDF_EXTRACT_TIMEOUT_SECONDS", "120"))
+    
+    # Near-duplicate uploads: MinHash fingerprints of the extracted text are compared against
+    # the user's other documents through a per-process LSH index. "flag" indexes the upload
+    # and records what it duplicates, "skip" returns without indexing it, "off" disables it.
+    near_duplicate_action: str = os.getenv("NEAR_DUPLICATE_ACTION", "flag")
+    near_duplicate_threshold: float = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+    # Per-user indexes are reloaded after this long to pick up other processes' uploads
+    near_duplicate_index_ttl_seconds: int = int(os.getenv("NEAR_DUPLICATE_INDEX_TTL_SECONDS", "300"))
+    near_duplicate_index_memory_mb: int = int(os.getenv("NEAR_DUPLICATE_INDEX_MEMORY_MB", "32"))
+    
     # Database (for future use if needed)
     database_url: Optional[str] = os.getenv("DATABASE_URL")
     
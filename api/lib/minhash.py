@@ -0,0 +1,148 @@
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_PATTERN = re.compile(r"\w+")
+# Shingle hashes are combined word hashes: h = h * _SHINGLE_BASE + word (mod 2^32)
+_SHINGLE_BASE = np.uint64(1000003)
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles, for estimating the Jaccard similarity of
+    two documents' text. Text is lowercased and split into words first, so layout
+    differences (line breaks, hyphenation spacing, re-exported PDFs) barely matter.
+    Signatures are `num_perm` uint32 values; `seed` must stay fixed for stored
+    signatures to remain comparable.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_words: int = 5, seed: int = 1, chunk_shingles: int = 1 << 16):
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self.chunk_shingles = chunk_shingles
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+
+    def empty(self) -> np.ndarray:
+        return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+
+    def _word_hashes(self, words: List[str]) -> np.ndarray:
+        # Hash each distinct word once
+        vocab: Dict[str, int] = {}
+        ids = np.fromiter((vocab.setdefault(w, len(vocab)) for w in words), dtype=np.int64, count=len(words))
+        table = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in vocab), dtype=np.uint64, count=len(vocab))
+        return table[ids]
+
+    def _update(self, signature: np.ndarray, words: List[str]):
+        """Fold the shingles of `words` into `signature` (in place)."""
+        if not words:
+            return
+        hashes = self._word_hashes(words)
+        k = min(self.shingle_words, len(hashes))
+        count = len(hashes) - k + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(k):
+            shingles = (shingles * _SHINGLE_BASE + hashes[offset:offset + count]) & _MAX_HASH
+        shingles = np.unique(shingles)
+        # (a * x + b) mod p, like datasketch; chunked to bound the (shingles x num_perm) matrix
+        for start in range(0, len(shingles), self.chunk_shingles):
+            x = shingles[start:start + self.chunk_shingles, None]
+            permuted = ((x * self._a + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+
+    def signature(self, text: str) -> np.ndarray:
+        signature = self.empty()
+        self._update(signature, _WORD_PATTERN.findall(text.lower()))
+        return signature.astype(np.uint32)
+
+    def signature_of_stream(self, pieces: Iterable[str]) -> np.ndarray:
+        """Same as signature("".join(pieces)) for pieces split at whitespace, without joining them."""
+        signature = self.empty()
+        carry: List[str] = []
+        for piece in pieces:
+            words = carry + _WORD_PATTERN.findall(piece.lower())
+            if len(words) >= self.shingle_words:
+                self._update(signature, words)
+                carry = words[len(words) - self.shingle_words + 1:]
+            else:
+                carry = words
+        if carry and np.all(signature == _MAX_HASH):
+            # Fewer words than one shingle in the whole stream
+            self._update(signature, carry)
+        return signature.astype(np.uint32)
+
+    @staticmethod
+    def to_bytes(signature: np.ndarray) -> bytes:
+        return signature.astype("<u4").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the two documents' shingle sets."""
+        if len(a) != len(b) or not len(a):
+            return 0.0
+        return float(np.count_nonzero(a == b)) / len(a)
+
+
+class MinHashLSH:
+    """
+    Banded LSH over MinHash signatures: `bands` tables keyed by a hash of `rows`
+    signature values each. Documents sharing any band are candidates; with 16 x 8
+    a pair at similarity 0.9 is found with probability > 0.99, at 0.5 about 6%.
+    Memory is one int key per band per document plus the signatures.
+    """
+
+    def __init__(self, bands: int = 16, rows: int = 8):
+        self.bands = bands
+        self.rows = rows
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in range(bands)]
+        self.signatures: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        return [
+            zlib.crc32(signature[i * self.rows:(i + 1) * self.rows].tobytes())
+            for i in range(self.bands)
+        ]
+
+    def add(self, key: str, signature: np.ndarray):
+        self.remove(key)
+        self.signatures[key] = signature
+        for table, band_key in zip(self._tables, self._band_keys(signature)):
+            table.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str):
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for table, band_key in zip(self._tables, self._band_keys(signature)):
+            members = table.get(band_key)
+            if members:
+                members.discard(key)
+                if not members:
+                    del table[band_key]
+
+    def query(self, signature: np.ndarray, threshold: float, exclude: Optional[str] = None) -> List[tuple]:
+        """(key, similarity) of indexed documents at or above `threshold`, most similar first."""
+        candidates: Set[str] = set()
+        for table, band_key in zip(self._tables, self._band_keys(signature)):
+            candidates |= table.get(band_key, set())
+        candidates.discard(exclude)
+        matches = [(key, MinHasher.similarity(signature, self.signatures[key])) for key in candidates]
+        return sorted([m for m in matches if m[1] >= threshold], key=lambda m: -m[1])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held: signatures plus one table entry per band per document."""
+        per_document = self.bands * 8 + 120
+        return sum(sig.nbytes + per_document for sig in self.signatures.values())
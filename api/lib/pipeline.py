@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# A stage handles one item and passes any number of items on with `await emit(item)`.
+# It may return an int (texts embedded, bytes read, ...) that is reported as "units".
+StageFn = Callable[[Any, Callable[[Any], Awaitable[None]]], Awaitable[Optional[int]]]
+
+_DONE = object()
+
+
+class _Stage:
+    def __init__(self, name: str, fn: StageFn, workers: int):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.items = 0
+        self.units = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # waiting for room in the next stage's queue
+
+    def stats(self, wall_seconds: float) -> Dict[str, Any]:
+        work_seconds = max(self.busy_seconds - self.blocked_seconds, 0.0)
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "units": self.units,
+            "errors": self.errors,
+            "busy_seconds": round(work_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "items_per_second": round(self.items / work_seconds, 2) if work_seconds else None,
+            "units_per_second": round(self.units / work_seconds, 2) if work_seconds and self.units else None,
+            # Share of the run this stage's workers spent working; the highest is the bottleneck
+            "utilization": round(work_seconds / (wall_seconds * self.workers), 3) if wall_seconds else 0.0,
+        }
+
+
+class StagedPipeline:
+    """
+    Runs items through a chain of async stages connected by bounded queues, so each
+    stage works on a different item at the same time (e.g. embedding one document
+    while the previous one is being stored) and a slow stage applies backpressure
+    instead of letting work pile up in memory.
+
+    With one worker, a stage sees items in the order the previous stage emitted them.
+    An exception from a stage drops that item and is passed to `on_error(stage, item, exc)`.
+    """
+
+    def __init__(self, queue_size: int = 4,
+                 on_error: Optional[Callable[[str, Any, Exception], None]] = None):
+        self.queue_size = max(1, queue_size)
+        self.on_error = on_error
+        self.stages: List[_Stage] = []
+
+    def add_stage(self, name: str, fn: StageFn, workers: int = 1) -> "StagedPipeline":
+        self.stages.append(_Stage(name, fn, workers))
+        return self
+
+    async def run(self, items: Iterable[Any]) -> Dict[str, Any]:
+        """Feed `items` through every stage and wait for the pipeline to drain. Returns per-stage stats."""
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        started = time.perf_counter()
+
+        async def _run_stage(index: int):
+            stage = self.stages[index]
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+
+            async def emit(item: Any):
+                if outbox is None:
+                    return
+                waited = time.perf_counter()
+                await outbox.put(item)
+                stage.blocked_seconds += time.perf_counter() - waited
+
+            async def _worker():
+                while True:
+                    item = await inbox.get()
+                    if item is _DONE:
+                        # Let sibling workers see the end marker too
+                        await inbox.put(_DONE)
+                        return
+                    begun = time.perf_counter()
+                    try:
+                        units = await stage.fn(item, emit)
+                        if isinstance(units, int):
+                            stage.units += units
+                    except Exception as e:
+                        stage.errors += 1
+                        logger.error(f"Pipeline stage '{stage.name}' failed: {e}")
+                        if self.on_error:
+                            self.on_error(stage.name, item, e)
+                    finally:
+                        stage.items += 1
+                        stage.busy_seconds += time.perf_counter() - begun
+
+            await asyncio.gather(*[_worker() for _ in range(stage.workers)])
+            if outbox is not None:
+                await outbox.put(_DONE)
+
+        async def _feed():
+            for item in items:
+                await queues[0].put(item)
+            await queues[0].put(_DONE)
+
+        await asyncio.gather(_feed(), *[_run_stage(i) for i in range(len(self.stages))])
+
+        wall_seconds = time.perf_counter() - started
+        stages = {stage.name: stage.stats(wall_seconds) for stage in self.stages}
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"]) if stages else None
+        return {"wall_seconds": round(wall_seconds, 3), "bottleneck": bottleneck, "stages": stages}
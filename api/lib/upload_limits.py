@@ -0,0 +1,59 @@
+from typing import Dict
+
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that caps the request body of upload endpoints (path -> max bytes).
+
+    A request whose Content-Length is over the limit gets a 413 before any of the body is
+    read. Otherwise the body is counted as it streams in, and the request fails with 413
+    as soon as it passes the limit, so an oversized multipart upload is never fully
+    received and spooled.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds the {limit // (1024 * 1024)} MB limit"
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Re-raised by FastAPI's body parsing and rendered as a 413
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            if response_started or e.status_code != status.HTTP_413_REQUEST_ENTITY_TOO_LARGE:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
@@ -16,8 +16,14 @@ from routes.speech import router as speech_router
 from routes.query_routes import router as query_router
 from routes.visualization import router as visualization_router
 from service.infrastructure.database_service import database_service
-from service.rag.pinecone_service import pinecone_service
+from service.rag.vector_store_service import vector_store_service
 from service.rag.gemini_service import gemini_service
+from service.rag.inference_pool import inference_pool
+from service.features.ingestion_job_service import ingestion_job_service
+from service.features.pdf_extraction_pool import pdf_extraction_pool
+from controller.rag_controller import rag_controller
+from lib.config import settings
+from lib.upload_limits import UploadSizeLimitMiddleware
 from service.features.sql_analysis_service import sql_analysis_service
 from service.features.database_visualization_service import DatabaseVisualizationService
 import service.features.database_visualization_service as viz_service_module
@@ -42,12 +48,12 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}. Check DATABASE_URL environment variable.")
 
-    # Initialize Pinecone
+    # Initialize Vector Store (Pinecone or local index)
     try:
-        if not pinecone_service.initialize():
-            logger.warning("Pinecone initialization returned false. Check configuration.")
+        if not vector_store_service.initialize():
+            logger.warning("Vector store initialization returned false. Check configuration.")
     except Exception as e:
-        logger.error(f"Failed to initialize Pinecone: {e}")
+        logger.error(f"Failed to initialize vector store: {e}")
 
     # Initialize Gemini
     try:
@@ -65,10 +71,21 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to initialize Database Visualization service: {e}")
 
+    # Start background ingestion workers (also resumes jobs interrupted by a restart)
+    if settings.ingestion_jobs_enabled:
+        try:
+            ingestion_job_service.start(rag_controller.run_ingestion_job)
+        except Exception as e:
+            logger.error(f"Failed to start ingestion workers: {e}")
+
     yield  # Application is running
 
     # Shutdown
     logger.info("Shutting down QueryWise API...")
+    await ingestion_job_service.stop()
+    inference_pool.shutdown()
+    pdf_extraction_pool.shutdown()
+    vector_store_service.shutdown()
     await database_service.close()
     logger.info("MongoDB connection closed.")
 
@@ -80,6 +97,16 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# --- Upload size limits (checked while the body streams in; added first so CORS wraps its 413s) ---
+# Multipart framing adds a little on top of the file itself
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/rag/upload-and-index": (settings.max_upload_mb + 1) * 1024 * 1024,
+        "/rag/upload-batch": settings.max_batch_upload_mb * 1024 * 1024,
+    },
+)
+
 # --- CORS middleware ---
 app.add_middleware(
     CORSMiddleware,
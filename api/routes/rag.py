@@ -21,7 +21,8 @@ async def delete_documents(
 @router.post(
     "/upload-and-index",
     status_code=status.HTTP_201_CREATED,
-    summary="Upload and index a file"
+    summary="Upload and index a file",
+    responses={202: {"description": "Queued for background indexing; poll the returned status_url"}}
 )
 async def upload_and_index_file(
     file: UploadFile = File(..., description="The document file to be indexed (pdf, docx, html, md, txt)."),
@@ -31,11 +32,65 @@ async def upload_and_index_file(
     Accepts a file, extracts its text content, and then processes it
     through the indexing module.
 
+    With background ingestion enabled (the default) this returns 202 with a
+    `job_id` right after the upload is stored; poll `GET /rag/jobs/{job_id}`.
+
     This is a protected endpoint and requires authentication.
     """
     return await rag_controller.upload_and_index_file(file, current_user)
 
 
+@router.post(
+    "/upload-batch",
+    status_code=status.HTTP_201_CREATED,
+    summary="Upload and index many files",
+    responses={202: {"description": "Queued for background indexing; poll the returned status_url"}}
+)
+async def upload_batch(
+    files: List[UploadFile] = File(..., description="Document files to be indexed (pdf, docx, html, md, txt)."),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Accepts many files and indexes them through a staged pipeline
+    (extract, chunk, embed, store) connected by bounded queues,
+    so different files are in different stages at the same time.
+
+    Returns per-file outcomes and per-stage throughput (items/s, utilization,
+    and the bottleneck stage). With background ingestion enabled this returns
+    202 with a `job_id`; the same report is the job's `result`.
+
+    This is a protected endpoint and requires authentication.
+    """
+    return await rag_controller.upload_batch(files, current_user)
+
+
+@router.get("/jobs", summary="List recent ingestion jobs")
+async def list_ingestion_jobs(
+    limit: int = Query(50, gt=0, le=200, description="Maximum number of jobs to return"),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Returns the user's most recent ingestion jobs, newest first.
+
+    This is a protected endpoint and requires authentication.
+    """
+    return await rag_controller.list_ingestion_jobs(current_user, limit)
+
+
+@router.get("/jobs/{job_id}", summary="Ingestion job status")
+async def get_ingestion_job(
+    job_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Returns the status (queued, running, completed, failed), current stage
+    (extracting, indexing) and progress of an ingestion job.
+
+    This is a protected endpoint and requires authentication.
+    """
+    return await rag_controller.get_ingestion_job(job_id, current_user)
+
+
 @router.post(
     "/index",
     status_code=status.HTTP_201_CREATED,
@@ -106,3 +161,35 @@ async def rag_health_check():
         "message": "RAG service is operational"
     }
 
+
+
+@router.get("/stats", summary="RAG pipeline statistics")
+async def rag_stats(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Returns runtime counters for the indexing and retrieval pipeline
+    (embedding and parent chunk cache hit ratios, query micro-batch sizes
+    and queue waits, chunk sizes) to help size caches and tune batching per worker.
+    """
+    from service.rag.embedding_service import embedding_service
+    from service.rag.parent_chunks_service import parent_chunks_service
+    from service.rag.document_text_service import document_text_service
+    from service.rag.rag_service import rag_service
+    from service.features.ingestion_job_service import ingestion_job_service
+    from service.features.near_duplicate_service import near_duplicate_service
+    from service.features.pdf_extraction_pool import pdf_extraction_pool
+    from service.features.extraction_cache import extraction_cache
+
+    return {
+        "embedding_cache": embedding_service.get_cache_stats(),
+        "query_embedding_batches": embedding_service.get_batcher_stats(),
+        "embedding_inference": embedding_service.get_inference_stats(),
+        "parent_chunk_cache": parent_chunks_service.get_cache_stats(),
+        "document_text_cache": document_text_service.get_cache_stats(),
+        "chunking": rag_service.get_chunking_stats(),
+        "ingestion_jobs": await ingestion_job_service.get_queue_stats(),
+        "near_duplicate_index": near_duplicate_service.get_stats(),
+        "pdf_extraction": pdf_extraction_pool.stats(),
+        "extraction_cache": extraction_cache.stats() if extraction_cache else {"enabled": False}
+    }
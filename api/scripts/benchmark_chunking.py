@@ -0,0 +1,70 @@
+"""
+Benchmark: child chunks produced by "chars" vs. "tokens" chunking.
+
+Chunks a text/PDF file in both modes and reports, per mode, the number of child
+chunks (= vectors to embed and upsert), their size in bge tokens, how many would be
+truncated by the model's 512-token window, and optionally the embedding time.
+
+Usage (from the api/ directory):
+    python -m scripts.benchmark_chunking path/to/file.pdf [--embed]
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+import numpy as np
+
+from lib.config import settings
+from service.features.file_processing_service import file_processing_service
+from service.rag.embedding_service import embedding_service
+from service.rag.rag_service import rag_service
+from service.rag.token_chunker import TokenChunker
+
+
+def load_text(path: Path) -> str:
+    if path.suffix.lower() == ".pdf":
+        return file_processing_service._extract_from_pdf(str(path))
+    return path.read_text(encoding="utf-8")
+
+
+async def run(args):
+    content = load_text(args.path)
+    tokenizer = embedding_service.get_length_tokenizer()
+    if tokenizer is None:
+        print("Tokenizer not reachable; token counts are ~4 chars/token estimates.")
+
+    for mode in ("chars", "tokens"):
+        rag_service.chunking_mode = mode
+        rag_service.token_chunker = None
+        if mode == "tokens":
+            rag_service.token_chunker = TokenChunker(
+                tokenizer_provider=embedding_service.get_length_tokenizer,
+                target_tokens=args.target_tokens,
+                max_tokens=settings.chunk_max_tokens,
+                min_tokens=settings.chunk_min_tokens,
+            )
+        _, child_chunks = rag_service._chunk_document_small_to_big(content, args.path.stem)
+        texts = [c["content"] for c in child_chunks]
+        lengths, truncated = embedding_service._token_lengths(texts) if texts else (np.zeros(0), 0)
+
+        line = (f"{mode:>6}: {len(texts):6d} chunks, tokens/chunk mean {lengths.mean() if len(texts) else 0:6.1f} "
+                f"p50 {np.percentile(lengths, 50) if len(texts) else 0:5.0f} p95 {np.percentile(lengths, 95) if len(texts) else 0:5.0f}, "
+                f"{truncated} over the model window")
+        if args.embed and texts:
+            start = time.perf_counter()
+            await embedding_service._embed_length_bucketed(texts, batch_size=32)
+            line += f", embed {time.perf_counter() - start:6.2f} s"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--target-tokens", type=int, default=settings.chunk_target_tokens)
+    parser.add_argument("--embed", action="store_true", help="Also time embedding the chunks (bypasses the cache)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark: DOCX text extraction with python-docx vs. the streaming iterparse extractor.
+
+Times the previous python-docx based extractor (kept here as the reference) against
+service.features.docx_extraction on the given files, or on generated table-heavy
+documents, and checks that both produce the same text. Documents with hyperlinks are
+expected to differ: the python-docx extractor dropped them.
+
+Usage (from the api/ directory):
+    python -m scripts.benchmark_docx_extraction --rows 1000 5000 20000
+    python -m scripts.benchmark_docx_extraction path/to/file.docx --repeat 5
+"""
+import argparse
+import io
+import time
+from pathlib import Path
+
+from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from service.features.docx_extraction import extract_docx_text
+
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+
+def legacy_extract(source) -> str:
+    """The python-docx extractor the streaming one replaced."""
+    doc = Document(source)
+    full_text = []
+
+    def get_markdown_table(table):
+        md_lines = []
+        if not table.rows:
+            return ""
+        headers = [cell.text.strip() for cell in table.rows[0].cells]
+        md_lines.append("| " + " | ".join(headers) + " |")
+        md_lines.append("| " + " | ".join(["---"] * len(headers)) + " |")
+        for row in table.rows[1:]:
+            cells = [cell.text.strip() for cell in row.cells]
+            md_lines.append("| " + " | ".join(cells) + " |")
+        return "\n" + "\n".join(md_lines) + "\n"
+
+    def get_para_text(para):
+        para_text = ""
+        for child in para._element:
+            if child.tag.endswith('r'):
+                if child.text: para_text += child.text
+            elif child.tag.endswith('hyperlink'):
+                r_id = child.get(R_ID)
+                if r_id:
+                    try:
+                        rel = doc.part.rels[r_id]
+                        if rel.target_mode == 'External':
+                            url = rel.target_ref
+                            if url:
+                                display_text = ""
+                                for subchild in child:
+                                    if subchild.tag.endswith('r') and subchild.text:
+                                        display_text += subchild.text
+                                para_text += f" [{display_text}]({url}) "
+                    except Exception: pass
+        return para_text.strip()
+
+    for child in doc.element.body:
+        if child.tag.endswith('p'):
+            text = get_para_text(Paragraph(child, doc))
+            if text: full_text.append(text)
+        elif child.tag.endswith('tbl'):
+            table_md = get_markdown_table(Table(child, doc))
+            if table_md: full_text.append(table_md)
+
+    return "\n".join(full_text)
+
+
+def generate(rows: int, columns: int = 6, tables: int = 4) -> bytes:
+    """A DOCX with `tables` tables of `rows` rows in total, separated by paragraphs."""
+    doc = Document()
+    per_table = max(rows // tables, 1)
+    for t in range(tables):
+        doc.add_heading(f"Section {t + 1}", level=1)
+        doc.add_paragraph(f"Table {t + 1} lists {per_table} records, one per row.")
+        table = doc.add_table(rows=per_table, cols=columns)
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                cell.text = f"r{r}c{c} value {r * columns + c}" if r else f"Column {c + 1}"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def best_of(extract, data: bytes, repeat: int):
+    best, text = float("inf"), ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = extract(io.BytesIO(data))
+        best = min(best, time.perf_counter() - started)
+    return best, text
+
+
+def report(label: str, data: bytes, repeat: int):
+    legacy_seconds, expected = best_of(legacy_extract, data, repeat)
+    stream_seconds, text = best_of(extract_docx_text, data, repeat)
+    check = "" if text == expected else "  (TEXT DIFFERS)"
+    print(f"{label:>24}  {len(data) / 1024:9.0f} KB  python-docx {legacy_seconds:7.3f} s  "
+          f"iterparse {stream_seconds:7.3f} s  x{legacy_seconds / stream_seconds:.1f}{check}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", type=Path, nargs="*")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000, 20000],
+                        help="Table rows per generated document (when no paths are given)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.paths:
+        for path in args.paths:
+            report(path.name, path.read_bytes(), args.repeat)
+    else:
+        for rows in args.rows:
+            report(f"{rows} rows", generate(rows), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: embedding throughput with document-order batches vs. length-bucketed batches.
+
+Chunks every PDF in a directory with the same Small-to-Big chunker used for indexing,
+then embeds the child sentences twice with FastEmbed, through the same inference pool
+indexing uses (so INFERENCE_POOL_MODE=thread/process are measured as deployed):
+  1. in document order (previous behaviour)
+  2. sorted by token length, with the original order restored afterwards
+
+Usage (from the api/ directory):
+    python -m scripts.benchmark_embedding_bucketing path/to/pdfs [--batch-size 32] [--repeat 3]
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+import numpy as np
+
+from service.features.file_processing_service import file_processing_service
+from service.rag.embedding_service import embedding_service
+from service.rag.rag_service import rag_service
+
+
+def load_child_texts(pdf_dir: Path):
+    texts = []
+    for pdf_path in sorted(pdf_dir.glob("*.pdf")):
+        content = file_processing_service._extract_from_pdf(str(pdf_path))
+        _, child_chunks = rag_service._chunk_document_small_to_big(content, pdf_path.stem)
+        texts.extend(chunk["content"] for chunk in child_chunks)
+    return texts
+
+
+async def time_embedding(texts, batch_size, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await embedding_service._embed(texts, batch_size)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def run(texts, lengths, batch_size, repeat):
+    # Warm up the ONNX session(s)
+    await embedding_service._embed(texts[:batch_size], batch_size)
+
+    baseline = await time_embedding(texts, batch_size, repeat)
+    order = np.argsort(lengths, kind="stable")
+    bucketed = await time_embedding([texts[i] for i in order], batch_size, repeat)
+
+    # Sanity check: bucketed path (including order restore) matches document order
+    embedding_service.length_bucketing = True
+    restored = await embedding_service._embed_length_bucketed(texts[:256], batch_size)
+    reference = await embedding_service._embed(texts[:256], batch_size)
+    return baseline, bucketed, float(np.abs(restored - reference).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_dir", type=Path)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_child_texts(args.pdf_dir)
+    if not texts:
+        print(f"No child chunks produced from PDFs in {args.pdf_dir}")
+        return
+
+    lengths, truncated = embedding_service._token_lengths(texts)
+    print(f"{len(texts)} child chunks | tokens: median {int(np.median(lengths))}, "
+          f"p95 {int(np.percentile(lengths, 95))}, max {int(lengths.max())} | "
+          f"{truncated} at the {embedding_service.max_tokens}-token limit")
+
+    baseline, bucketed, max_diff = asyncio.run(run(texts, lengths, args.batch_size, args.repeat))
+
+    print(f"document order : {baseline:8.2f}s  {len(texts) / baseline:8.1f} texts/s")
+    print(f"length-bucketed: {bucketed:8.2f}s  {len(texts) / bucketed:8.1f} texts/s  ({baseline / bucketed:.2f}x)")
+    print(f"max |bucketed - document order| on first 256 texts: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
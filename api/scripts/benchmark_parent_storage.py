@@ -0,0 +1,54 @@
+"""
+Benchmark: stored bytes for parent chunks with "full" vs. "offsets" parent storage.
+
+Chunks a text/PDF file with the indexing chunker and reports, for each mode, the
+JSON size of the parent chunk documents written to MongoDB, plus the compressed
+document text stored once in "offsets" mode. Nothing is written to the database.
+
+Usage (from the api/ directory):
+    python -m scripts.benchmark_parent_storage path/to/file.pdf
+"""
+import argparse
+import json
+import zlib
+from pathlib import Path
+
+from service.features.file_processing_service import file_processing_service
+from service.rag.document_text_service import document_text_service
+from service.rag.rag_service import rag_service
+
+
+def load_text(path: Path) -> str:
+    if path.suffix.lower() == ".pdf":
+        return file_processing_service._extract_from_pdf(str(path))
+    return path.read_text(encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    args = parser.parse_args()
+
+    content = document_text_service.normalize(load_text(args.path))
+    parent_chunks, child_chunks = rag_service._chunk_document_small_to_big(content, args.path.stem)
+    child_text_bytes = sum(len(c["content"].encode("utf-8")) for c in child_chunks)
+    print(f"{len(content)} chars -> {len(parent_chunks)} parents, {len(child_chunks)} children "
+          f"({child_text_bytes / 1024:.1f} KiB of child text on full-metadata vectors)")
+
+    full = rag_service._build_parent_records(parent_chunks)
+    full_bytes = sum(len(json.dumps(p)) for p in full)
+    print(f"   full: parents {full_bytes / 1024:9.1f} KiB")
+
+    offsets = rag_service._build_parent_records(parent_chunks, "doc_benchmark")
+    span_bytes = sum(len(json.dumps(p)) for p in offsets)
+    block_chars = document_text_service.block_chars
+    text_bytes = sum(
+        len(zlib.compress(content[i:i + block_chars].encode("utf-8"), 6))
+        for i in range(0, len(content), block_chars)
+    )
+    print(f"offsets: parents {span_bytes / 1024:9.1f} KiB + compressed text {text_bytes / 1024:9.1f} KiB "
+          f"= {(span_bytes + text_bytes) / 1024:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
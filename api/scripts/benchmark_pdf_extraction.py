@@ -0,0 +1,52 @@
+"""
+Benchmark: PDF text extraction in-process vs. the page-parallel extraction pool.
+
+Extracts the same PDF on one thread, then with PdfExtractionPool at each worker
+count, and reports pages/s and speed-up. Worker start-up is excluded (one warm-up
+run per pool); the text must match the in-process result.
+
+Usage (from the api/ directory):
+    python -m scripts.benchmark_pdf_extraction path/to/file.pdf --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from service.features.file_processing_service import file_processing_service
+from service.features.pdf_extraction_pool import PdfExtractionPool, count_pdf_pages
+
+
+async def run(args):
+    path = str(args.path)
+    pages = count_pdf_pages(path)
+
+    started = time.perf_counter()
+    expected = file_processing_service._extract_from_pdf(path)
+    baseline = time.perf_counter() - started
+    print(f"{pages} pages, {len(expected)} chars")
+    print(f"in-process:    {baseline:7.2f} s  {pages / baseline:8.1f} pages/s")
+
+    for workers in args.workers:
+        pool = PdfExtractionPool(size=workers, max_pages=max(pages, 1), timeout_seconds=3600)
+        try:
+            await pool.extract(path)  # warm-up: spawn workers, import pypdf
+            started = time.perf_counter()
+            text = await pool.extract(path)
+            seconds = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+        check = "" if text == expected else "  (TEXT DIFFERS)"
+        print(f"{workers:2d} workers:    {seconds:7.2f} s  {pages / seconds:8.1f} pages/s  "
+              f"x{baseline / seconds:.2f}{check}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
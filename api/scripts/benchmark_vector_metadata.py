@@ -0,0 +1,94 @@
+"""
+Benchmark: vector payload size and query latency with full vs. slim vector metadata.
+
+Chunks a text/PDF file with the indexing chunker and reports, for each metadata mode,
+the JSON size of the metadata per vector and of a 100-vector upsert request.
+With --query, it also upserts both variants under two scratch users in the configured
+vector store (VECTOR_STORE_BACKEND), times repeated queries, and deletes them again.
+
+Usage (from the api/ directory):
+    python -m scripts.benchmark_vector_metadata path/to/file.pdf [--query --repeat 50]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from service.features.file_processing_service import file_processing_service
+from service.rag.rag_service import rag_service
+from service.rag.vector_batch import VectorBatch
+from service.rag.vector_store_service import vector_store_service
+
+
+def load_text(path: Path) -> str:
+    if path.suffix.lower() == ".pdf":
+        return file_processing_service._extract_from_pdf(str(path))
+    return path.read_text(encoding="utf-8")
+
+
+def build_batch(mode: str, child_chunks, username: str, filename: str, dim: int) -> VectorBatch:
+    rag_service.vector_metadata_mode = mode
+    clean_metadata = {"source_filename": filename, "username": username}
+    document = {"title": Path(filename).stem}
+    metadata = [rag_service._build_vector_metadata(c, i, clean_metadata, document) for i, c in enumerate(child_chunks)]
+    # Random unit vectors: payload size and query latency do not depend on the actual embedding
+    values = np.random.default_rng(0).normal(size=(len(child_chunks), dim)).astype(np.float32)
+    return VectorBatch([f"bench_{mode}_{c['id']}" for c in child_chunks], values, metadata)
+
+
+async def time_queries(batch: VectorBatch, username: str, repeat: int):
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        await vector_store_service.query_vectors(batch.values[i % len(batch)].tolist(), top_k=20, username=username)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), float(np.percentile(latencies, 95))
+
+
+async def run(args):
+    content = load_text(args.path)
+    _, child_chunks = rag_service._chunk_document_small_to_big(content, args.path.stem)
+    dim = 384
+    print(f"{len(child_chunks)} child vectors from {args.path.name}")
+
+    batches = {}
+    for mode in ("full", "slim"):
+        batch = build_batch(mode, child_chunks, f"bench-{mode}", args.path.name, dim)
+        batches[mode] = batch
+        meta_bytes = [len(json.dumps(m)) for m in batch.metadata]
+        request_bytes = len(json.dumps({"vectors": batch.slice(0, 100).to_records()}))
+        print(f"{mode:>4}: metadata {statistics.mean(meta_bytes):7.1f} B/vector, "
+              f"{sum(meta_bytes) / 1024:9.1f} KiB total, 100-vector upsert request {request_bytes / 1024:8.1f} KiB")
+
+    if not args.query:
+        return
+
+    if not vector_store_service.initialize():
+        raise SystemExit("Vector store is not configured.")
+    try:
+        for mode, batch in batches.items():
+            await vector_store_service.upsert_vectors(batch)
+        await asyncio.sleep(args.settle)  # allow eventual consistency on managed stores
+        for mode, batch in batches.items():
+            p50, p95 = await time_queries(batch, f"bench-{mode}", args.repeat)
+            print(f"{mode:>4}: query top_k=20 p50 {p50:7.2f} ms, p95 {p95:7.2f} ms")
+    finally:
+        for mode, batch in batches.items():
+            await vector_store_service.delete_vectors_by_chunk_ids(batch.ids, username=f"bench-{mode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--query", action="store_true", help="Also measure query latency against the configured store")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--settle", type=float, default=5.0, help="Seconds to wait after upserting before querying")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Move vectors from Pinecone's default namespace into per-user namespaces.
+
+Streams the default namespace page by page (index.list), fetches each page's
+vectors, re-upserts them into the namespace of their `username` metadata and then
+deletes them from the default namespace. Memory use is bounded by one page.
+Vectors without a `username` are left where they are.
+
+Run once on an existing index, then set PINECONE_USE_NAMESPACES=true (it defaults to false).
+
+Usage (from the api/ directory):
+    python -m scripts.migrate_pinecone_namespaces [--page-size 100] [--dry-run] [--keep-source]
+"""
+import argparse
+import logging
+import time
+from collections import defaultdict
+
+from service.rag.pinecone_service import pinecone_service
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def migrate(page_size: int, dry_run: bool, keep_source: bool):
+    if not pinecone_service.initialize():
+        raise SystemExit("Pinecone is not configured (PINECONE_API_KEY / PINECONE_INDEX_NAME).")
+
+    # Force namespace mapping on regardless of the current setting
+    pinecone_service.use_namespaces = True
+    index = pinecone_service.index
+
+    moved = skipped = pages = 0
+    started = time.perf_counter()
+    for id_page in index.list(namespace="", limit=page_size):
+        ids = list(id_page)
+        if not ids:
+            continue
+        pages += 1
+
+        fetched = index.fetch(ids=ids, namespace="").get("vectors", {})
+        by_namespace = defaultdict(list)
+        for vector_id, vector_data in fetched.items():
+            metadata = vector_data.get("metadata", {}) or {}
+            namespace = pinecone_service.namespace_for(metadata.get("username"))
+            if not namespace:
+                skipped += 1
+                continue
+            by_namespace[namespace].append({
+                "id": vector_id,
+                "values": list(vector_data.get("values", [])),
+                "metadata": metadata,
+            })
+
+        for namespace, vectors in by_namespace.items():
+            if not dry_run:
+                index.upsert(vectors=vectors, namespace=namespace)
+                if not keep_source:
+                    index.delete(ids=[v["id"] for v in vectors], namespace="")
+            moved += len(vectors)
+
+        logger.info(f"Page {pages}: {moved} moved, {skipped} without username ({time.perf_counter() - started:.1f}s)")
+
+    action = "Would move" if dry_run else "Moved"
+    logger.info(f"{action} {moved} vectors into per-user namespaces; {skipped} left in the default namespace.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100, help="IDs listed/fetched per round trip (max 100)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    parser.add_argument("--keep-source", action="store_true", help="Copy instead of move (do not delete from the default namespace)")
+    args = parser.parse_args()
+    migrate(min(args.page_size, 100), args.dry_run, args.keep_source)
+
+
+if __name__ == "__main__":
+    main()
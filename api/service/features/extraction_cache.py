@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from lib.config import settings
+import base64
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Part of every key; bump when an extractor's output changes so stale entries stop matching
+EXTRACTION_CACHE_VERSION = 3
+
+
+class ExtractionCache:
+    """
+    Persistent cache of extraction output (text, MinHash fingerprint) and the generated
+    description, keyed by a hash of the uploaded bytes, so an identical re-upload skips
+    parsing and the description LLM call.
+
+    One gzip'd JSON file per entry under `cache_dir`. File mtimes give the LRU order
+    (hits touch the file); once the entries exceed `max_bytes` the least recently used
+    are deleted. Writes are atomic renames, so processes on one host can share the
+    directory; each process only accounts for the entries it has seen, so the bound
+    is approximate when several write to it.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_index()
+        except Exception as e:
+            logger.error(f"Failed to open extraction cache at '{cache_dir}': {e}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json.gz"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, name[:-len(".json.gz")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._bytes += size
+        logger.info(f"Loaded extraction cache with {len(self._sizes)} entries ({self._bytes} bytes)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached entry ({"content", "fingerprint", "description"}) or None. Blocking."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable extraction cache entry {key}: {e}")
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+        if entry.get("fingerprint"):
+            entry["fingerprint"] = base64.b64decode(entry["fingerprint"])
+        return entry
+
+    def put(self, key: str, content: str, fingerprint: Optional[bytes] = None, description: Optional[str] = None):
+        """Store (or replace) an entry, then evict least recently used ones over the budget. Blocking."""
+        entry = {
+            "content": content,
+            "fingerprint": base64.b64encode(fingerprint).decode("ascii") if fingerprint else None,
+            "description": description,
+        }
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as tmp:
+                with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                    json.dump(entry, f)
+            size = os.path.getsize(tmp.name)
+            os.replace(tmp.name, self._path(key))
+        except Exception as e:
+            logger.warning(f"Failed to write extraction cache entry {key}: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._bytes += size - self._sizes.pop(key, 0)
+            self._sizes[key] = size
+            while self._bytes > self.max_bytes and len(self._sizes) > 1:
+                old_key, old_size = self._sizes.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._unlink(old_key)
+
+    def set_description(self, key: str, description: str):
+        """Add the generated description to an existing entry. Blocking."""
+        entry = self.get(key)
+        if entry is not None and entry.get("description") != description:
+            self.put(key, entry["content"], entry.get("fingerprint"), description)
+
+    def _remove(self, key: str):
+        with self._lock:
+            self._bytes -= self._sizes.pop(key, 0)
+        self._unlink(key)
+
+    def _unlink(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to delete extraction cache entry {key}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._sizes),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# Singleton instance (None when disabled)
+extraction_cache = (
+    ExtractionCache(settings.extraction_cache_dir, settings.extraction_cache_max_mb * 1024 * 1024)
+    if settings.extraction_cache_enabled else None
+)
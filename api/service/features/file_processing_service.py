@@ -1,12 +1,22 @@
+import asyncio
+import codecs
+import contextlib
+import hashlib
 import io
-import markdown
+import os
+import shutil
+import tempfile
 from pathlib import Path
-from typing import Dict
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator
 
 from bs4 import BeautifulSoup
-from docx import Document
 from fastapi import UploadFile, HTTPException, status
-from pypdf import PdfReader
+from lib.config import settings
+from service.features.docx_extraction import extract_docx_text
+from service.features.markdown_extraction import extract_markdown_text
+from service.features.extraction_cache import extraction_cache, EXTRACTION_CACHE_VERSION
+from service.features.near_duplicate_service import near_duplicate_service
+from service.features.pdf_extraction_pool import pdf_extraction_pool, PdfPageLimitError, count_pdf_pages, extract_pdf_pages
 import logging
 
 import re
@@ -19,43 +29,93 @@ logger = logging.getLogger(__name__)
 # Negative lookbehind (?<!\]\() ensures we don't match (http...) part of existing [text](http...)
 URL_PATTERN = re.compile(r'(?<!\]\()(https?://[^\s<>"]+|www\.[^\s<>"]+)')
 
+# File types extract_text_from_file() understands
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".html", ".md", ".txt"}
+
+# Bytes read per step when streaming a plain-text upload
+TEXT_STREAM_CHUNK_BYTES = 1024 * 1024
+
 class FileProcessingService:
     """A service dedicated to extracting text content from various file formats."""
 
-    async def extract_text_from_file(self, file: UploadFile) -> Dict[str, str]:
+    async def extract_text_from_file(self, file: UploadFile) -> Dict[str, Any]:
         """
         Extracts text content from an uploaded file based on its extension.
-        Returns a dictionary containing the title and content.
+        Returns a dictionary containing the title, content and the content's MinHash
+        fingerprint (None when near-duplicate detection is off or there is no text).
+        Extractors parse from the spooled upload's file handle (PDF workers from its path);
+        the raw bytes are never read into memory as a whole.
+
+        Also returns `content_hash` (the extraction cache key) and `description`: an identical
+        earlier upload's cached description, else None. Cache hits skip parsing entirely.
+        `section_markers` is True when the text came from the Markdown extractor, whose
+        headings and code fences may end parent chunks (other formats never do).
         """
-        contents = await file.read()
         filename = file.filename
         file_ext = Path(filename).suffix.lower()
+        self.check_upload_size(file)
+        # Use the filename (without extension) as the default title
+        title = Path(filename).stem
+        section_markers = file_ext == ".md"
+
+        content_hash = None
+        if extraction_cache is not None and file_ext in SUPPORTED_EXTENSIONS:
+            content_hash = await asyncio.to_thread(self.hash_upload, file)
+            cached = await asyncio.to_thread(extraction_cache.get, content_hash)
+            if cached is not None:
+                logger.info(f"Extraction cache hit for '{filename}'")
+                fingerprint = cached.get("fingerprint")
+                if fingerprint is None and near_duplicate_service.enabled:
+                    fingerprint = await asyncio.to_thread(near_duplicate_service.fingerprint, cached["content"])
+                return {"title": title, "content": cached["content"], "fingerprint": fingerprint,
+                        "content_hash": content_hash, "description": cached.get("description"),
+                        "section_markers": section_markers}
 
         try:
             if file_ext == ".pdf":
-                text = self._extract_from_pdf(contents)
+                # Parsed page-parallel in worker processes, off the event loop
+                async with self._local_path(file) as path:
+                    text = await pdf_extraction_pool.extract(path)
             elif file_ext == ".docx":
-                text = self._extract_from_docx(contents)
+                text = await self._extract_off_loop(self._extract_from_docx, file)
             elif file_ext == ".html":
-                text = self._extract_from_html(contents)
+                text = await self._extract_off_loop(self._extract_from_html, file)
             elif file_ext == ".md":
-                text = self._extract_from_md(contents)
+                text = await self._extract_off_loop(self._extract_from_md, file)
             elif file_ext == ".txt":
-                text = self._extract_from_txt(contents)
+                text = await self._extract_off_loop(self._extract_from_txt, file)
             else:
                 raise HTTPException(
                     status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
                     detail=f"Unsupported file type: {file_ext}",
                 )
             
-            # Use the filename (without extension) as the default title
-            title = Path(filename).stem
-            
             # Post-process: ensure all links are properly formatted for RAG
             text = self._post_process_text(text)
 
-            return {"title": title, "content": text}
+            fingerprint = None
+            if near_duplicate_service.enabled:
+                fingerprint = await asyncio.to_thread(near_duplicate_service.fingerprint, text)
 
+            if content_hash is not None:
+                await asyncio.to_thread(extraction_cache.put, content_hash, text, fingerprint)
+
+            return {"title": title, "content": text, "fingerprint": fingerprint,
+                    "content_hash": content_hash, "description": None,
+                    "section_markers": section_markers}
+
+        except HTTPException:
+            raise
+        except PdfPageLimitError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Failed to process file: {filename}. {e}",
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Failed to process file: {filename}. Text extraction timed out after {pdf_extraction_pool.timeout_seconds}s",
+            )
         except Exception as e:
             logger.error(f"Error processing file {filename}: {e}")
             raise HTTPException(
@@ -63,6 +123,98 @@ class FileProcessingService:
                 detail=f"Failed to process file: {filename}. Error: {str(e)}",
             )
 
+    def hash_upload(self, file: UploadFile) -> str:
+        """
+        Extraction cache key: SHA-256 of the extractor version, file type and the uploaded
+        bytes, read from the spooled file in 1 MB steps. Blocking.
+        """
+        file_ext = Path(file.filename or "").suffix.lower()
+        digest = hashlib.sha256(f"v{EXTRACTION_CACHE_VERSION}\x00{file_ext}\x00".encode("utf-8"))
+        file.file.seek(0)
+        while True:
+            block = file.file.read(TEXT_STREAM_CHUNK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+        file.file.seek(0)
+        return digest.hexdigest()
+
+    def check_upload_size(self, file: UploadFile):
+        """Reject an upload over MAX_UPLOAD_MB with 413 (uploads are spooled, so this reads nothing)."""
+        size = self.upload_size(file)
+        if size > settings.max_upload_mb * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File '{file.filename}' is {size / (1024 * 1024):.1f} MB (max {settings.max_upload_mb} MB)",
+            )
+
+    async def _extract_off_loop(self, extractor, file: UploadFile) -> str:
+        """Run a blocking extractor on the upload's file handle in a thread."""
+        def _run():
+            file.file.seek(0)
+            return extractor(file.file)
+        return await asyncio.to_thread(_run)
+
+    @contextlib.asynccontextmanager
+    async def _local_path(self, file: UploadFile) -> AsyncIterator[str]:
+        """
+        A filesystem path holding the upload, for extractors in other processes: the file
+        itself when it is already on disk under a name (spooled ingestion jobs), otherwise
+        a temporary copy made in 1 MB steps.
+        """
+        name = getattr(file.file, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            yield name
+            return
+
+        def _copy() -> str:
+            file.file.seek(0)
+            with tempfile.NamedTemporaryFile(suffix=Path(file.filename or "").suffix, delete=False) as copy:
+                shutil.copyfileobj(file.file, copy, TEXT_STREAM_CHUNK_BYTES)
+                return copy.name
+
+        path = await asyncio.to_thread(_copy)
+        try:
+            yield path
+        finally:
+            os.unlink(path)
+
+    def can_stream(self, file: UploadFile) -> bool:
+        """Plain-text uploads can be decoded incrementally with iter_text_stream()."""
+        return Path(file.filename or "").suffix.lower() == ".txt"
+
+    def upload_size(self, file: UploadFile) -> int:
+        """Size in bytes of the spooled upload, without reading it."""
+        position = file.file.tell()
+        file.file.seek(0, io.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(position)
+        return size
+
+    def iter_text_stream(self, file: UploadFile, chunk_bytes: int = TEXT_STREAM_CHUNK_BYTES) -> Iterator[str]:
+        """
+        Decodes a plain-text upload piece by piece from its spooled file, applying the
+        same post-processing as extract_text_from_file. Pieces end on whitespace so a
+        URL is never split between two pieces. Blocking: run it off the event loop.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        file.file.seek(0)
+        carry = ""
+        while True:
+            raw = file.file.read(chunk_bytes)
+            text = carry + decoder.decode(raw, final=not raw)
+            if not raw:
+                if text:
+                    yield self._post_process_text(text)
+                return
+            cut = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"))
+            if cut < 0 and len(text) < 4 * chunk_bytes:
+                carry = text
+                continue
+            cut = cut if cut >= 0 else len(text) - 1
+            carry = text[cut + 1:]
+            yield self._post_process_text(text[:cut + 1])
+
     def _post_process_text(self, text: str) -> str:
         """
         Global clean-up and formatting for extracted text.
@@ -82,145 +234,17 @@ class FileProcessingService:
         text = URL_PATTERN.sub(replace_link, text)
         return text
 
-    def _resolve_pdf_object(self, obj):
-        """Resolves indirect objects to their actual value."""
-        if hasattr(obj, "get_object"):
-            return obj.get_object()
-        return obj
-
-    def _extract_from_pdf(self, contents: bytes) -> str:
-        """Extracts text from PDF file contents, including embedded links."""
-        with io.BytesIO(contents) as pdf_file:
-            reader = PdfReader(pdf_file)
-            full_text = []
-            
-            for page in reader.pages:
-                text = page.extract_text()
-                
-                # Extract links from annotations
-                links = []
-                if "/Annots" in page:
-                    for annot in page["/Annots"]:
-                        try:
-                            annot_obj = self._resolve_pdf_object(annot)
-                            
-                            # Ensure it's a Link annotation
-                            if annot_obj.get("/Subtype") == "/Link":
-                                # Check for Action (URL)
-                                if "/A" in annot_obj:
-                                    action = self._resolve_pdf_object(annot_obj["/A"])
-                                    if "/URI" in action:
-                                        links.append(action["/URI"])
-                        except Exception as e:
-                            logger.warning(f"Failed to process annotation: {e}")
-                            continue
-                
-                # Append links to the bottom of the page text if found
-                if links:
-                    # Filter out non-string links and deduplicate
-                    valid_links = {link for link in links if isinstance(link, str)}
-                    
-                    # Regex fallback: Find links in plain text that might not have annotations
-                    text_links = set(re.findall(r'https?://[^\s<>"]+|www\.[^\s<>"]+', text))
-                    valid_links.update(text_links)
-                    
-                    if valid_links:
-                        text += "\n\n**Links found on this page:**\n"
-                        for link in valid_links:
-                            text += f"- [{link}]({link})\n"
-                
-                full_text.append(text)
-                
-        return "\n".join(full_text)
-
-    def _extract_from_docx(self, contents: bytes) -> str:
+    def _extract_from_pdf(self, path: str) -> str:
+        """Extracts text from a PDF file in this thread (scripts; uploads use pdf_extraction_pool)."""
+        return "\n".join(extract_pdf_pages(path, 0, count_pdf_pages(path)))
+
+    def _extract_from_docx(self, source: BinaryIO) -> str:
         """Extracts text from DOCX file contents, including embedded links and TABLES as Markdown."""
-        from docx import Document as DocxDocument
-        from docx.document import Document
-        from docx.table import Table
-        from docx.text.paragraph import Paragraph
-        
-        with io.BytesIO(contents) as docx_file:
-            doc = DocxDocument(docx_file)
-            full_text = []
-
-            # Use iter_inner_content to process elements (Paragraphs and Tables) in order
-            # Note: iter_inner_content() is not standard in all python-docx versions using Document object directly
-            # We iterate through the body elements directly
-            for element in doc.element.body:
-                if element.tag.endswith('p'):  # Paragraph
-                    # Find the paragraph object corresponding to this element
-                    # We have to search for it or wrap it
-                    # Optimization: It's faster to just iterate paragraphs and tables if order wasn't critical
-                    # But order IS critical.
-                    
-                    # Alternative safer approach: Iterate doc.iter_inner_content() if available, 
-                    # but since it might not be, we'll try a simpler approach of iterating paragraphs and tables 
-                    # based on their xml order.
-                    pass
-            
-            # SIMPLER ROBUST APPROACH:
-            # We will use the fact that doc.paragraphs and doc.tables are separate lists.
-            # But we want combined order.
-            # reliable way: iterate over doc.element.body and match with objects.
-            
-            def get_markdown_table(table):
-                md_lines = []
-                # extracting headers (assuming first row is header)
-                if not table.rows: 
-                    return ""
-                    
-                headers = [cell.text.strip() for cell in table.rows[0].cells]
-                md_lines.append("| " + " | ".join(headers) + " |")
-                md_lines.append("| " + " | ".join(["---"] * len(headers)) + " |")
-                
-                for row in table.rows[1:]:
-                    cells = [cell.text.strip() for cell in row.cells]
-                    md_lines.append("| " + " | ".join(cells) + " |")
-                    
-                return "\n" + "\n".join(md_lines) + "\n"
-
-            # Helper to extract text+links from a paragraph object
-            def get_para_text(para):
-                para_text = ""
-                for child in para._element:
-                    if child.tag.endswith('r'): # Run
-                        if child.text: para_text += child.text
-                    elif child.tag.endswith('hyperlink'): # Hyperlink
-                        r_id = child.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id')
-                        if r_id:
-                            try:
-                                rel = doc.part.rels[r_id]
-                                if rel.target_mode == 'External':
-                                    url = rel.target_ref
-                                    if url:
-                                        display_text = ""
-                                        for subchild in child:
-                                            if subchild.tag.endswith('r') and subchild.text:
-                                                display_text += subchild.text
-                                        para_text += f" [{display_text}]({url}) "
-                            except Exception: pass
-                return para_text.strip()
-
-            # Main iteration over document body elements
-            for child in doc.element.body:
-                if child.tag.endswith('p'):
-                    # Create a Paragraph object from the element
-                    para = Paragraph(child, doc)
-                    text = get_para_text(para)
-                    if text: full_text.append(text)
-                
-                elif child.tag.endswith('tbl'):
-                    # Create a Table object from the element
-                    table = Table(child, doc)
-                    table_md = get_markdown_table(table)
-                    if table_md: full_text.append(table_md)
-
-        return "\n".join(full_text)
-
-    def _extract_from_html(self, contents: bytes) -> str:
-        """Extracts text from HTML file contents, preserving links as Markdown."""
-        soup = BeautifulSoup(contents, "html.parser")
+        return extract_docx_text(source)
+
+    def _extract_from_html(self, source) -> str:
+        """Extracts text from HTML (a file handle, bytes or str), preserving links as Markdown."""
+        soup = BeautifulSoup(source, "html.parser")
         
         # Convert tags to Markdown links: [text](href)
         for a in soup.find_all('a', href=True):
@@ -229,14 +253,13 @@ class FileProcessingService:
             
         return soup.get_text(separator="\n", strip=True)
 
-    def _extract_from_md(self, contents: bytes) -> str:
-        """Extracts text from Markdown file contents by converting to HTML first."""
-        html = markdown.markdown(contents.decode("utf-8"))
-        return self._extract_from_html(html.encode("utf-8"))
+    def _extract_from_md(self, source: BinaryIO) -> str:
+        """Extracts text from a Markdown file in one pass, keeping headings and code fences as section markers."""
+        return extract_markdown_text(source)
 
-    def _extract_from_txt(self, contents: bytes) -> str:
+    def _extract_from_txt(self, source: BinaryIO) -> str:
         """Extracts text from a plain text file."""
-        return contents.decode("utf-8")
+        return source.read().decode("utf-8")
 
 
 # Singleton instance
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from pymongo import ReturnDocument
+from fastapi import UploadFile
+from lib.config import settings
+from service.infrastructure.database_service import database_service
+from service.rag.inference_pool import inference_pool
+
+logger = logging.getLogger(__name__)
+
+# Seconds an idle worker waits before polling MongoDB for claimable jobs again
+# (submissions in this process wake workers immediately)
+JOB_POLL_SECONDS = 5
+
+# Job statuses; a job is "running" only while a worker holds a fresh lease on it
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+
+# Called as report(stage, **progress) by the job handler
+ProgressReporter = Callable[..., Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressReporter], Awaitable[Dict[str, Any]]]
+
+
+class IngestionJobService:
+    """
+    Background ingestion queue persisted in MongoDB (`ingestion_jobs`).
+
+    Uploads are spooled to `ingestion_spool_dir` and recorded as queued jobs; a bounded
+    pool of `ingestion_workers` asyncio workers per process claims them by lease. A
+    running job refreshes its heartbeat, so a job whose process died (restart, crash)
+    is claimed again once its lease expires, up to `ingestion_job_max_attempts` times.
+    Indexing uses content-addressed chunk IDs, so re-running an interrupted job is safe.
+    Unless the spool directory is shared, a job is only claimed on the host that spooled it.
+    A batch upload is a single job (kind "batch") holding all of its spooled files.
+    """
+
+    def __init__(self):
+        self.num_workers = max(1, settings.ingestion_workers)
+        self.spool_dir = settings.ingestion_spool_dir
+        self.lease = timedelta(seconds=settings.ingestion_job_lease_seconds)
+        self.max_attempts = settings.ingestion_job_max_attempts
+        self.host = socket.gethostname()
+        self.worker_id = f"{self.host}:{os.getpid()}"
+        self.spool_shared = settings.ingestion_spool_shared
+        self._handler: Optional[JobHandler] = None
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # Jobs for the same document run one at a time in this process
+        self._document_locks: Dict[tuple, Dict[str, Any]] = {}
+
+    async def get_collection(self):
+        if database_service.db is None:
+            await database_service.connect()
+        return database_service.db.ingestion_jobs
+
+    def start(self, handler: JobHandler):
+        """Start the worker pool. `handler(job, report)` does the actual ingestion."""
+        if self._workers:
+            return
+        self._handler = handler
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._workers = [asyncio.create_task(self._worker_loop(n)) for n in range(self.num_workers)]
+        logger.info(f"Started {self.num_workers} ingestion workers ({self.worker_id})")
+
+    async def stop(self):
+        """
+        Stop the workers and hand this process's unfinished jobs back to the queue. A clean
+        shutdown does not count as an interrupted attempt, so the claim's increment is undone.
+        """
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        try:
+            collection = await self.get_collection()
+            result = await collection.update_many(
+                {"status": RUNNING, "worker_id": self.worker_id},
+                {"$set": {"status": QUEUED, "stage": "queued", "worker_id": None, "updated_at": datetime.now(timezone.utc)},
+                 "$inc": {"attempts": -1}},
+            )
+            if result.modified_count:
+                logger.info(f"Re-queued {result.modified_count} interrupted ingestion jobs")
+        except Exception as e:
+            logger.error(f"Error re-queueing ingestion jobs: {e}")
+
+    def _spool(self, file: UploadFile, spool_path: str) -> int:
+        """Copy an upload to the spool directory (blocking). Returns its size in bytes."""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        file.file.seek(0)
+        with open(spool_path, "wb") as out:
+            shutil.copyfileobj(file.file, out, 1024 * 1024)
+            return out.tell()
+
+    async def submit(self, file: UploadFile, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Spool an upload to disk and queue it. Returns the public job record."""
+        job_id = uuid.uuid4().hex
+        spool_path = os.path.join(self.spool_dir, job_id)
+        size = await asyncio.to_thread(self._spool, file, spool_path)
+        job = self._new_job(job_id, user, filename=file.filename, size_bytes=size, spool_path=spool_path)
+        return await self._enqueue(job, [spool_path])
+
+    async def submit_batch(self, files: List[UploadFile], user: Dict[str, Any]) -> Dict[str, Any]:
+        """Spool several uploads and queue them as one job, indexed through the batch pipeline."""
+        job_id = uuid.uuid4().hex
+        spool_paths = [os.path.join(self.spool_dir, f"{job_id}-{i}") for i in range(len(files))]
+        try:
+            sizes = await asyncio.to_thread(lambda: [self._spool(f, p) for f, p in zip(files, spool_paths)])
+        except Exception:
+            self._remove_spooled(spool_paths)
+            raise
+        job = self._new_job(
+            job_id, user, kind="batch", filename=None, filenames=[f.filename for f in files],
+            size_bytes=sum(sizes), spool_paths=spool_paths,
+        )
+        return await self._enqueue(job, spool_paths)
+
+    def _new_job(self, job_id: str, user: Dict[str, Any], kind: str = "file", **fields) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "username": user.get("username"),
+            "user_id": user.get("user_id"),
+            "spool_host": self.host,
+            **fields,
+            "status": QUEUED,
+            "stage": "queued",
+            "progress": {},
+            "attempts": 0,
+            "worker_id": None,
+            "error": None,
+            "result": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def _enqueue(self, job: Dict[str, Any], spool_paths: List[str]) -> Dict[str, Any]:
+        try:
+            collection = await self.get_collection()
+            await collection.insert_one(job)
+        except Exception:
+            self._remove_spooled(spool_paths)
+            raise
+
+        described = job["filename"] if job["kind"] == "file" else f"{len(job['filenames'])} files"
+        logger.info(f"Queued ingestion job {job['job_id']} for '{described}' ({job['size_bytes']} bytes, user {job['username']})")
+        self._wakeup.set()
+        return self._public(job)
+
+    @staticmethod
+    def _remove_spooled(spool_paths: List[str]):
+        for path in spool_paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Could not remove spooled upload {path}: {e}")
+
+    async def get_job(self, job_id: str, username: str) -> Optional[Dict[str, Any]]:
+        """A job's status and progress, if it belongs to the user."""
+        try:
+            collection = await self.get_collection()
+            job = await collection.find_one({"job_id": job_id, "username": username})
+            return self._public(job) if job else None
+        except Exception as e:
+            logger.error(f"Error fetching ingestion job {job_id}: {e}")
+            return None
+
+    async def list_jobs(self, username: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """The user's most recent jobs, newest first."""
+        try:
+            collection = await self.get_collection()
+            cursor = collection.find({"username": username}).sort("created_at", -1).limit(limit)
+            return [self._public(job) async for job in cursor]
+        except Exception as e:
+            logger.error(f"Error listing ingestion jobs for {username}: {e}")
+            return []
+
+    async def get_queue_stats(self) -> Dict[str, Any]:
+        """Job counts by status, plus this process's worker pool size."""
+        try:
+            collection = await self.get_collection()
+            counts = {row["_id"]: row["count"] async for row in collection.aggregate(
+                [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+            )}
+        except Exception as e:
+            logger.error(f"Error reading ingestion queue stats: {e}")
+            counts = {}
+        return {
+            "workers": len(self._workers),
+            **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, COMPLETED, FAILED)},
+        }
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Job record as returned by the API (no internal fields, ISO timestamps)."""
+        hidden = {"_id", "spool_path", "spool_paths", "spool_host", "user_id", "worker_id", "heartbeat_at"}
+        return {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in job.items() if key not in hidden
+        }
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the oldest queued job, or a running job whose lease expired, among
+        those whose spooled files this host can read.
+        """
+        now = datetime.now(timezone.utc)
+        collection = await self.get_collection()
+        claimable = {"$or": [
+            {"status": QUEUED},
+            {"status": RUNNING, "heartbeat_at": {"$lt": now - self.lease}},
+        ]}
+        if not self.spool_shared:
+            # Jobs queued before spool_host was recorded stay claimable anywhere
+            claimable["spool_host"] = {"$in": [self.host, None]}
+        return await collection.find_one_and_update(
+            claimable,
+            {
+                "$set": {"status": RUNNING, "worker_id": self.worker_id, "heartbeat_at": now, "updated_at": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker_loop(self, worker_number: int):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_number} could not claim a job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        collection = await self.get_collection()
+
+        if job["attempts"] > self.max_attempts:
+            await self._finish(job, FAILED, error=f"Gave up after {self.max_attempts} interrupted attempts")
+            return
+        if job["attempts"] > 1:
+            logger.info(f"Resuming ingestion job {job_id} (attempt {job['attempts']})")
+
+        # This claim of the job: a worker that lost its lease must not touch the job any more
+        # (attempts tells apart a re-claim by another worker coroutine of this process)
+        owned = self._claim_filter(job)
+
+        async def report(stage: str, **progress):
+            now = datetime.now(timezone.utc)
+            update = {"stage": stage, "heartbeat_at": now, "updated_at": now}
+            update.update({f"progress.{key}": value for key, value in progress.items()})
+            await collection.update_one(owned, {"$set": update})
+
+        async def heartbeat():
+            # Keeps the lease while a long stage (e.g. PDF extraction) reports nothing
+            while True:
+                await asyncio.sleep(self.lease.total_seconds() / 3)
+                now = datetime.now(timezone.utc)
+                await collection.update_one(owned, {"$set": {"heartbeat_at": now}})
+
+        heartbeat_task = asyncio.create_task(heartbeat())
+        # Batch jobs lock nothing beyond themselves; duplicate names are rejected per batch
+        key = (job["username"], job["filename"] or job["job_id"])
+        entry = self._document_locks.setdefault(key, {"lock": asyncio.Lock(), "jobs": 0})
+        entry["jobs"] += 1
+        try:
+            async with entry["lock"]:
+                # Embedding runs on the background inference lane so queries keep their threads
+                with inference_pool.background():
+                    result = await self._handler(job, report)
+            await self._finish(job, COMPLETED, result=result)
+        except asyncio.CancelledError:
+            # Shutdown: leave the job to stop() / lease expiry so it is resumed
+            raise
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            logger.error(f"Ingestion job {job_id} failed: {error}")
+            await self._finish(job, FAILED, error=error)
+        finally:
+            heartbeat_task.cancel()
+            entry["jobs"] -= 1
+            if not entry["jobs"]:
+                self._document_locks.pop(key, None)
+
+    def _claim_filter(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {"job_id": job["job_id"], "worker_id": self.worker_id, "attempts": job["attempts"]}
+
+    async def _finish(self, job: Dict[str, Any], status: str, result: Dict[str, Any] = None, error: str = None):
+        """
+        Record the outcome, unless the job was reclaimed after this worker lost its lease;
+        the spooled files are removed only when the outcome was recorded.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            collection = await self.get_collection()
+            outcome = await collection.update_one(
+                self._claim_filter(job),
+                {"$set": {"status": status, "stage": "done" if status == COMPLETED else status,
+                          "result": result, "error": error, "finished_at": now, "updated_at": now}},
+            )
+        except Exception as e:
+            logger.error(f"Error recording outcome of ingestion job {job['job_id']}: {e}")
+            return
+        if outcome.matched_count != 1:
+            logger.warning(f"Ingestion job {job['job_id']} was reclaimed by another worker; dropping this worker's outcome ({status})")
+            return
+        self._remove_spooled(job.get("spool_paths") or [job["spool_path"]])
+        logger.info(f"Ingestion job {job['job_id']} {status}")
+
+
+# Singleton instance
+ingestion_job_service = IngestionJobService()
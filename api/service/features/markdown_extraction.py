@@ -0,0 +1,122 @@
+import io
+import re
+from typing import BinaryIO, Iterable, List, Optional
+
+# Block-level syntax, matched against one line at a time
+_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})(.*)$')
+_ATX_HEADING = re.compile(r'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$')
+_SETEXT_UNDERLINE = re.compile(r'^ {0,3}(=+|-+)[ \t]*$')
+_THEMATIC_BREAK = re.compile(r'^ {0,3}(?:(?:\*[ \t]*){3,}|(?:-[ \t]*){3,}|(?:_[ \t]*){3,})$')
+_BLOCK_QUOTE = re.compile(r'^ {0,3}(?:>[ \t]?)+')
+_NOT_PARAGRAPH = re.compile(r'^(?:[|\[]|[-*+] |\d+[.)] )')
+
+# Inline syntax
+_IMAGE = re.compile(r'!\[([^\]]*)\]\([^)]*\)')
+_LINK = re.compile(r'\[([^\]]+)\]\(\s*<?([^)\s>]+)>?(?:\s+"[^"]*")?\s*\)')
+_REFERENCE_LINK = re.compile(r'\[([^\]]+)\]\[[^\]]*\]')
+_AUTOLINK = re.compile(r'<((?:https?://|www\.)[^>\s]+)>')
+# Code spans and backslash escapes are literal text
+_LITERAL = re.compile(r'(`+)(.+?)\1|\\([\\`*_{}\[\]()#+\-.!|>~])')
+_STASHED = re.compile(r'\x00(\d+)\x00')
+_STRONG = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+_EMPHASIS = re.compile(r'(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?!\*)|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)')
+_HTML_TAG = re.compile(r'</?[A-Za-z][^>]*>')
+
+
+def _inline(text: str) -> str:
+    """Plain text of one line of Markdown, keeping links as [text](url)."""
+    # Set literals aside so the other rules cannot touch them
+    literals: List[str] = []
+
+    def _stash(match):
+        literals.append(match.group(2).strip() if match.group(1) else match.group(3))
+        return f"\x00{len(literals) - 1}\x00"
+
+    text = _LITERAL.sub(_stash, text)
+    text = _IMAGE.sub(r'\1', text)
+    text = _AUTOLINK.sub(r'\1', text)
+    text = _HTML_TAG.sub('', text)
+    text = _STRONG.sub(r'\2', text)
+    text = _EMPHASIS.sub(lambda m: m.group(1) or m.group(2), text)
+    text = _REFERENCE_LINK.sub(r'\1', text)
+    text = _LINK.sub(lambda m: f"[{m.group(1).strip()}]({m.group(2)})", text)
+    if literals:
+        text = _STASHED.sub(lambda m: literals[int(m.group(1))], text)
+    return text.strip()
+
+
+def markdown_to_text(lines: Iterable[str]) -> str:
+    """
+    Text of a Markdown document in one pass over its lines, for indexing.
+
+    Inline markup is reduced to plain text (links stay [text](url)) and blank lines are
+    dropped, but two kinds of structure are kept as markers for the chunker: headings
+    become ATX lines ("## Title", setext headings included) and fenced code blocks keep
+    their fences with the code verbatim. Tables, list markers and reference definitions
+    pass through as text.
+    """
+    out: List[str] = []
+    fence: Optional[str] = None  # Opening fence of the code block we are in
+    paragraph_line = False  # The previous line was paragraph text (setext headings underline it)
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+
+        if fence is not None:
+            match = _FENCE.match(line)
+            if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) and not match.group(2).strip():
+                out.append(fence)
+                fence = None
+            else:
+                out.append(line)
+            continue
+
+        match = _FENCE.match(line)
+        if match and not (match.group(1)[0] == "`" and "`" in match.group(2)):
+            fence = match.group(1)
+            out.append(fence + match.group(2).strip())
+            paragraph_line = False
+            continue
+
+        if not line.strip():
+            paragraph_line = False
+            continue
+
+        line = _BLOCK_QUOTE.sub("", line)
+
+        match = _SETEXT_UNDERLINE.match(line)
+        if match and paragraph_line:
+            out[-1] = ("# " if match.group(1)[0] == "=" else "## ") + out[-1]
+            paragraph_line = False
+            continue
+
+        if _THEMATIC_BREAK.match(line):
+            paragraph_line = False
+            continue
+
+        match = _ATX_HEADING.match(line)
+        if match:
+            title = _inline(match.group(2) or "")
+            if title:
+                out.append(f"{match.group(1)} {title}")
+            paragraph_line = False
+            continue
+
+        text = _inline(line)
+        if text:
+            out.append(text)
+        # Only plain paragraph lines can become setext headings
+        paragraph_line = bool(text) and not _NOT_PARAGRAPH.match(text)
+
+    if fence is not None:
+        out.append(fence)
+    return "\n".join(out)
+
+
+def extract_markdown_text(source: BinaryIO) -> str:
+    """markdown_to_text over a UTF-8 file handle, read line by line. The handle is left open."""
+    reader = io.TextIOWrapper(source, encoding="utf-8", newline="")
+    try:
+        return markdown_to_text(reader)
+    finally:
+        reader.detach()
@@ -0,0 +1,112 @@
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from lib.config import settings
+from lib.lru_cache import ByteLRUCache
+from lib.minhash import MinHasher, MinHashLSH
+from service.features.user_documents_service import user_documents_service
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUPLICATE_ACTIONS = ("off", "flag", "skip")
+
+# Signature value of a text with no words
+_EMPTY_SIGNATURE_VALUE = np.uint32(0xFFFFFFFF)
+
+
+class NearDuplicateService:
+    """
+    Spots uploads that are near-copies of a document the user already has (the same
+    report under another filename, a re-exported PDF) before they are chunked and embedded.
+
+    Documents carry a MinHash fingerprint of their extracted text. Each user's fingerprints
+    are loaded once per process into an in-memory LSH index (only filename and fingerprint
+    are read), which is then kept current as this process claims and deletes documents.
+    Lookups touch a handful of band buckets rather than the user's document list.
+    """
+
+    def __init__(self):
+        self.action = settings.near_duplicate_action if settings.near_duplicate_action in NEAR_DUPLICATE_ACTIONS else "flag"
+        self.threshold = settings.near_duplicate_threshold
+        self.ttl_seconds = settings.near_duplicate_index_ttl_seconds
+        self.hasher = MinHasher()
+        # username -> {"index": MinHashLSH, "loaded_at": float}
+        self._indexes = ByteLRUCache(
+            max_bytes=settings.near_duplicate_index_memory_mb * 1024 * 1024,
+            sizeof=lambda entry: entry["index"].nbytes + 64,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.action != "off"
+
+    def _encode(self, signature: np.ndarray) -> Optional[bytes]:
+        if np.all(signature == _EMPTY_SIGNATURE_VALUE):
+            return None
+        return MinHasher.to_bytes(signature)
+
+    def fingerprint(self, text: str) -> Optional[bytes]:
+        """Compact (512-byte) fingerprint of a text, or None if it has no words. Blocking."""
+        return self._encode(self.hasher.signature(text))
+
+    def fingerprint_stream(self, pieces: Iterable[str]) -> Optional[bytes]:
+        """fingerprint() of a text given as pieces split at whitespace. Blocking."""
+        return self._encode(self.hasher.signature_of_stream(pieces))
+
+    async def _get_entry(self, username: str) -> Dict[str, Any]:
+        entry = self._indexes.get(username)
+        if entry is not None and time.monotonic() - entry["loaded_at"] < self.ttl_seconds:
+            return entry
+
+        index = MinHashLSH()
+        for doc in await user_documents_service.get_fingerprints(username):
+            index.add(doc["filename"], MinHasher.from_bytes(doc["fingerprint"]))
+        entry = {"index": index, "loaded_at": time.monotonic()}
+        self._indexes.put(username, entry)
+        logger.info(f"Loaded near-duplicate index for user '{username}' ({len(index)} documents)")
+        return entry
+
+    async def check_and_register(self, username: str, filename: str, fingerprint: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"filename", "similarity"} of the user's most similar other document at or
+        above the threshold, else None. The upload is added to the index right away so
+        concurrent uploads of the same content see each other, unless it is about to be
+        skipped; call unregister() if it then fails to index.
+        """
+        if not self.enabled or fingerprint is None:
+            return None
+        try:
+            entry = await self._get_entry(username)
+            index = entry["index"]
+            signature = MinHasher.from_bytes(fingerprint)
+            matches = index.query(signature, self.threshold, exclude=filename)
+            match = {"filename": matches[0][0], "similarity": round(matches[0][1], 3)} if matches else None
+            if match is None or self.action != "skip":
+                index.add(filename, signature)
+                # Re-put so the cache accounts for the grown index
+                self._indexes.put(username, entry)
+            if match:
+                logger.info(f"Upload '{filename}' of user '{username}' is a near-duplicate of '{match['filename']}' "
+                            f"(similarity {match['similarity']})")
+            return match
+        except Exception as e:
+            logger.error(f"Near-duplicate check failed for '{filename}': {e}")
+            return None
+
+    def unregister(self, username: str, filenames: List[str]):
+        """Forget documents that were deleted or failed to index."""
+        entry = self._indexes.get(username)
+        if entry is None:
+            return
+        for filename in filenames:
+            entry["index"].remove(filename)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"action": self.action, "threshold": self.threshold, **self._indexes.stats()}
+
+
+# Singleton instance
+near_duplicate_service = NearDuplicateService()
@@ -0,0 +1,229 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+from lib.config import settings
+import asyncio
+import logging
+import multiprocessing
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- Worker-process side ---
+# Kept free of app imports so spawned workers start quickly; pypdf is imported on first use.
+
+
+def _resolve_pdf_object(obj):
+    """Resolves indirect objects to their actual value."""
+    if hasattr(obj, "get_object"):
+        return obj.get_object()
+    return obj
+
+
+def _extract_page_text(page) -> str:
+    """Text of one page, with the URLs of its link annotations appended."""
+    text = page.extract_text()
+
+    # Extract links from annotations
+    links = []
+    if "/Annots" in page:
+        for annot in page["/Annots"]:
+            try:
+                annot_obj = _resolve_pdf_object(annot)
+
+                # Ensure it's a Link annotation
+                if annot_obj.get("/Subtype") == "/Link":
+                    # Check for Action (URL)
+                    if "/A" in annot_obj:
+                        action = _resolve_pdf_object(annot_obj["/A"])
+                        if "/URI" in action:
+                            links.append(action["/URI"])
+            except Exception as e:
+                logger.warning(f"Failed to process annotation: {e}")
+                continue
+
+    # Append links to the bottom of the page text if found
+    if links:
+        # Filter out non-string links and deduplicate
+        valid_links = {link for link in links if isinstance(link, str)}
+
+        # Regex fallback: Find links in plain text that might not have annotations
+        text_links = set(re.findall(r'https?://[^\s<>"]+|www\.[^\s<>"]+', text))
+        valid_links.update(text_links)
+
+        if valid_links:
+            text += "\n\n**Links found on this page:**\n"
+            for link in valid_links:
+                text += f"- [{link}]({link})\n"
+
+    return text
+
+
+def count_pdf_pages(path: str) -> int:
+    from pypdf import PdfReader
+    with open(path, "rb") as pdf_file:
+        return len(PdfReader(pdf_file).pages)
+
+
+def extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """
+    Texts of pages [start, end). Each task parses the file itself from an open handle
+    (pypdf seeks to the objects it needs rather than loading the file); only the path
+    and the page texts cross the process boundary.
+    """
+    from pypdf import PdfReader
+    with open(path, "rb") as pdf_file:
+        reader = PdfReader(pdf_file)
+        return [_extract_page_text(reader.pages[i]) for i in range(start, end)]
+
+
+# --- Parent side ---
+
+
+class PdfPageLimitError(Exception):
+    """The PDF has more pages than PDF_MAX_PAGES."""
+
+
+class PdfExtractionPool:
+    """
+    Extracts PDF text in a ProcessPoolExecutor, off the event loop and outside the GIL,
+    so a large upload neither blocks the worker nor slows other users' queries.
+    The page range is split into contiguous slices that run on different processes and
+    are reassembled in page order. With `size` 0 extraction runs on one thread instead.
+
+    Files over `max_pages` are rejected after counting. A file that takes longer than
+    `timeout_seconds` is abandoned, and so is the pool it ran on: new files go to a fresh
+    pool, while the old one finishes the other files it is extracting and is then
+    terminated (a pathological page cannot be interrupted otherwise). A pool broken by a
+    crashed worker is replaced the same way.
+    """
+
+    def __init__(self, size: int = 2, max_pages: int = 2000, timeout_seconds: float = 120,
+                 min_pages_per_task: int = 8):
+        self.size = max(0, size)
+        self.max_pages = max_pages
+        self.timeout_seconds = timeout_seconds
+        self.min_pages_per_task = max(1, min_pages_per_task)
+        self._executor = None
+        # Files being extracted per pool, and abandoned pools to terminate once they are idle
+        self._in_flight: Dict[Any, int] = {}
+        self._retired = set()
+        self.files = 0
+        self.pages = 0
+        self.timeouts = 0
+        self.seconds = 0.0
+
+    def _get_executor(self):
+        if self.size == 0:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Started PDF extraction pool with {self.size} workers")
+        return self._executor
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        # Two slices per worker evens out pages of uneven cost
+        slices = max(1, self.size * 2)
+        step = max(self.min_pages_per_task, -(-page_count // slices))
+        return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+    async def _extract(self, path: str, executor) -> Tuple[str, int]:
+        loop = asyncio.get_running_loop()
+        if executor is None:
+            def _extract_inline():
+                page_count = count_pdf_pages(path)
+                if page_count > self.max_pages:
+                    raise PdfPageLimitError(f"PDF has {page_count} pages (max {self.max_pages})")
+                return extract_pdf_pages(path, 0, page_count), page_count
+            pages, page_count = await asyncio.to_thread(_extract_inline)
+            return "\n".join(pages), page_count
+
+        page_count = await loop.run_in_executor(executor, count_pdf_pages, path)
+        if page_count > self.max_pages:
+            raise PdfPageLimitError(f"PDF has {page_count} pages (max {self.max_pages})")
+
+        slices = await asyncio.gather(*[
+            loop.run_in_executor(executor, extract_pdf_pages, path, start, end)
+            for start, end in self._page_ranges(page_count)
+        ])
+        return "\n".join(text for pages in slices for text in pages), page_count
+
+    async def extract(self, path: str) -> str:
+        """Full text of the PDF at `path`, pages joined by newlines."""
+        started = time.perf_counter()
+        # Captured once: by the time this file fails, another may already have replaced the pool
+        executor = self._get_executor()
+        if executor is not None:
+            self._in_flight[executor] = self._in_flight.get(executor, 0) + 1
+        try:
+            text, page_count = await asyncio.wait_for(self._extract(path, executor), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"PDF extraction timed out after {self.timeout_seconds}s; retiring its extraction workers")
+            self._retire(executor)
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory on a hostile file); start a fresh pool next time
+            logger.error("A PDF extraction worker exited abruptly; restarting extraction workers")
+            self._retire(executor)
+            raise
+        finally:
+            self._release(executor)
+        self.files += 1
+        self.pages += page_count
+        self.seconds += time.perf_counter() - started
+        return text
+
+    def _retire(self, executor):
+        """Send new files to a fresh pool; `executor` is terminated once its other files finish."""
+        if executor is None:
+            return
+        if self._executor is executor:
+            self._executor = None
+        self._retired.add(executor)
+
+    def _release(self, executor):
+        if executor is None:
+            return
+        self._in_flight[executor] -= 1
+        if self._in_flight[executor] == 0:
+            del self._in_flight[executor]
+            if executor in self._retired:
+                self._retired.discard(executor)
+                self._terminate(executor)
+
+    @staticmethod
+    def _terminate(executor):
+        # No public API stops a running task; kill the workers so they do not stay busy
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.size,
+            "files": self.files,
+            "pages": self.pages,
+            "timeouts": self.timeouts,
+            "pages_per_second": round(self.pages / self.seconds, 2) if self.seconds else None,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for executor in self._retired:
+            self._terminate(executor)
+        self._retired.clear()
+
+
+# Singleton instance
+pdf_extraction_pool = PdfExtractionPool(
+    size=settings.pdf_extract_workers,
+    max_pages=settings.pdf_max_pages,
+    timeout_seconds=settings.pdf_extract_timeout_seconds,
+)
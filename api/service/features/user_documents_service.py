@@ -45,8 +45,11 @@ class UserDocumentsService:
             logger.error(f"Error deleting documents: {e}")
             return 0
     
-    async def add_document(self, username: str, title: str, filename: str, chunk_ids: List[str], parent_ids: List[str] = None, description: str = None) -> Dict[str, Any]:
-        """Add a document entry for a specific user."""
+    async def add_document(self, username: str, title: str, filename: str, chunk_ids: List[str], parent_ids: List[str] = None, description: str = None, text_doc_id: str = None, fingerprint: bytes = None, near_duplicate_of: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Add a document entry for a specific user, replacing any entry with the same filename.
+        `fingerprint` (the MinHash of its text) is stored but not returned.
+        """
         try:
             collection = await self.get_collection()
             
@@ -62,11 +65,18 @@ class UserDocumentsService:
             }
             if description:
                 document["description"] = description
+            if text_doc_id:
+                document["text_doc_id"] = text_doc_id
+            if near_duplicate_of:
+                document["near_duplicate_of"] = near_duplicate_of
+            if fingerprint:
+                document["fingerprint"] = fingerprint
 
-            await collection.insert_one(document)
+            await collection.replace_one({"username": username, "filename": filename}, document, upsert=True)
             
-            # Remove _id for return
+            # Remove _id and binary fields for return
             document.pop("_id", None)
+            document.pop("fingerprint", None)
             
             logger.info(f"Added document '{title}' for user {username} to MongoDB")
             return document
@@ -78,7 +88,7 @@ class UserDocumentsService:
         """Get all documents for a specific user."""
         try:
             collection = await self.get_collection()
-            cursor = collection.find({"username": username}).sort("uploaded_at", -1)
+            cursor = collection.find({"username": username}, {"fingerprint": 0}).sort("uploaded_at", -1)
             
             documents = []
             async for doc in cursor:
@@ -90,6 +100,33 @@ class UserDocumentsService:
             logger.error(f"Error getting documents for {username}: {e}")
             return []
     
+    async def find_documents(self, username: str, filenames: List[str], projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        Get only the named documents of a user. Pass a projection to skip large fields
+        (e.g. {"filename": 1}) when chunk and parent ID lists are not needed.
+        """
+        try:
+            collection = await self.get_collection()
+            fields = {**projection, "_id": 0} if projection else {"_id": 0}
+            cursor = collection.find({"username": username, "filename": {"$in": list(filenames)}}, fields)
+            return [doc async for doc in cursor]
+        except Exception as e:
+            logger.error(f"Error finding documents {filenames} for {username}: {e}")
+            return []
+
+    async def get_fingerprints(self, username: str) -> List[Dict[str, Any]]:
+        """Filename and text fingerprint of every fingerprinted document of a user."""
+        try:
+            collection = await self.get_collection()
+            cursor = collection.find(
+                {"username": username, "fingerprint": {"$exists": True}},
+                {"_id": 0, "filename": 1, "fingerprint": 1}
+            )
+            return [doc async for doc in cursor]
+        except Exception as e:
+            logger.error(f"Error getting fingerprints for {username}: {e}")
+            return []
+
     async def get_all_user_chunk_ids(self, username: str) -> List[str]:
         """Get all chunk IDs for a user's documents."""
         try:
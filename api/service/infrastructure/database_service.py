@@ -57,6 +57,17 @@ class DatabaseService:
             # Parent Chunks - Index by id
             await self.db.parent_chunks.create_index("id", unique=True)
             
+            # Document Texts - compressed blocks addressed by (doc_id, block)
+            await self.db.document_texts.create_index([("doc_id", 1), ("block", 1)], unique=True)
+            
+            # Ingestion Jobs - lookup by id, claim order, per-user listing; finished jobs expire
+            await self.db.ingestion_jobs.create_index("job_id", unique=True)
+            await self.db.ingestion_jobs.create_index([("status", 1), ("created_at", 1)])
+            await self.db.ingestion_jobs.create_index([("username", 1), ("created_at", -1)])
+            await self.db.ingestion_jobs.create_index(
+                "finished_at", expireAfterSeconds=settings.ingestion_job_retention_hours * 3600
+            )
+            
 
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
@@ -0,0 +1,36 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Any, Sequence
+
+
+class Histogram:
+    """
+    Minimal fixed-bucket histogram for in-process metrics.
+    Each bucket counts observations <= its upper bound; the last bucket is +Inf.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"le_{b:g}" for b in self.buckets] + ["le_inf"]
+            return {
+                "count": self._count,
+                "mean": round(self._sum / self._count, 4) if self._count else 0.0,
+                "max": round(self._max, 4),
+                "buckets": dict(zip(labels, self._counts)),
+            }
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import unicodedata
+import zlib
+from typing import List, Dict, Any, Tuple, Iterable, Iterator
+from lib.config import settings
+from lib.lru_cache import ByteLRUCache
+from pymongo import InsertOne, ReplaceOne
+from service.infrastructure.database_service import database_service
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentTextWriter:
+    """
+    Incrementally writes one document's text as fixed-size compressed blocks.
+    Only the current partial block is buffered; full blocks are flushed on write().
+    commit() also stores the partial block, which is then replaced in place as it fills up.
+    """
+
+    def __init__(self, service: "DocumentTextService", doc_id: str, username: str = None):
+        self.service = service
+        self.doc_id = doc_id
+        self.username = username
+        self.next_block = 0
+        self.chars_written = 0
+        self._buffer = ""
+        # Characters of the partial block already stored by commit() (0 = not stored)
+        self._stored_partial_chars = 0
+        self._pending: List[str] = []
+
+    def tee(self, text_stream: Iterable[str]) -> Iterator[str]:
+        """Pass a text stream through, remembering each piece until take_pending()."""
+        for piece in text_stream:
+            self._pending.append(piece)
+            yield piece
+
+    def take_pending(self) -> str:
+        """Text seen by tee() since the last call."""
+        text = "".join(self._pending)
+        self._pending.clear()
+        return text
+
+    async def write(self, text: str, commit: bool = False):
+        """Append text, flushing full blocks (and, with `commit`, the partial one too)."""
+        self._buffer += text
+        full = len(self._buffer) - len(self._buffer) % self.service.block_chars
+        if full:
+            await self._flush(self._buffer[:full])
+            self._buffer = self._buffer[full:]
+        if commit:
+            await self.commit()
+
+    async def commit(self):
+        """Store the partial block as well, so every span into the text written so far resolves."""
+        if self._buffer and len(self._buffer) != self._stored_partial_chars:
+            await self._flush(self._buffer, partial=True)
+
+    async def close(self):
+        """Flush the final partial block."""
+        if self._buffer:
+            await self.commit()
+            self.next_block += 1
+            self.chars_written += len(self._buffer)
+            self._buffer = ""
+            self._stored_partial_chars = 0
+
+    async def _flush(self, text: str, partial: bool = False):
+        block_chars = self.service.block_chars
+        first_block = self.next_block
+
+        def _compress() -> List[Dict[str, Any]]:
+            return [
+                {
+                    "doc_id": self.doc_id,
+                    "username": self.username,
+                    "block": first_block + i,
+                    "chars": len(text[start:start + block_chars]),
+                    "data": zlib.compress(text[start:start + block_chars].encode("utf-8"), 6),
+                }
+                for i, start in enumerate(range(0, len(text), block_chars))
+            ]
+
+        blocks = await asyncio.to_thread(_compress)
+        ops = [InsertOne(block) for block in blocks]
+        if self._stored_partial_chars:
+            # The first block was stored partially by an earlier commit()
+            ops[0] = ReplaceOne({"doc_id": self.doc_id, "block": first_block}, blocks[0], upsert=True)
+        collection = await self.service.get_collection()
+        await collection.bulk_write(ops, ordered=False)
+        if partial:
+            self._stored_partial_chars = len(text)
+        else:
+            self._stored_partial_chars = 0
+            self.next_block += len(blocks)
+            self.chars_written += len(text)
+
+
+class DocumentTextService:
+    """
+    Keeps one normalized, zlib-compressed copy of each indexed document's text.
+
+    Text is split into fixed-size blocks of `block_chars` characters, one MongoDB
+    document per block, so a span lookup only fetches and decompresses the blocks
+    it overlaps. Decompressed blocks are kept in a byte-budgeted LRU.
+    Parent chunks stored in "offsets" mode are (doc_id, start, end) spans into this text.
+    """
+
+    def __init__(self):
+        self.block_chars = settings.document_text_block_chars
+        # Keys are (doc_id, block_number); values are decompressed block strings
+        self.cache = ByteLRUCache(
+            max_bytes=settings.document_text_cache_memory_mb * 1024 * 1024,
+            sizeof=lambda text: len(text) + 64,
+        )
+
+    async def get_collection(self):
+        if database_service.db is None:
+            await database_service.connect()
+        return database_service.db.document_texts
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Canonical form stored and chunked in offsets mode (NFC, '\\n' line endings)."""
+        return unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+
+    def iter_normalized(self, text_stream: Iterable[str]) -> Iterator[str]:
+        """
+        normalize() applied to a stream of pieces. The tail of each piece, from its last
+        base character (and a preceding '\r'), is held back so combining sequences and
+        CRLF pairs split across pieces normalize as in the concatenated text.
+        """
+        carry = ""
+        for piece in text_stream:
+            piece = carry + piece
+            if not piece:
+                continue
+            cut = len(piece) - 1
+            while cut > 0 and unicodedata.combining(piece[cut]):
+                cut -= 1
+            if cut > 0 and piece[cut - 1] == "\r":
+                cut -= 1
+            carry = piece[cut:]
+            if cut:
+                yield self.normalize(piece[:cut])
+        if carry:
+            yield self.normalize(carry)
+
+    def open_writer(self, doc_id: str, username: str = None) -> DocumentTextWriter:
+        """Writer for storing a document's (already normalized) text incrementally."""
+        return DocumentTextWriter(self, doc_id, username=username)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Returns hit ratio and bytes held by the decompressed block cache."""
+        return self.cache.stats()
+
+    async def store_text(self, doc_id: str, text: str, username: str = None) -> bool:
+        """Compress and store a document's text. `text` should already be normalized."""
+        try:
+            writer = self.open_writer(doc_id, username=username)
+            await writer.write(text)
+            await writer.close()
+            logger.info(f"Stored text for {doc_id}: {len(text)} chars in {writer.next_block} blocks")
+            return True
+        except Exception as e:
+            logger.error(f"Error storing document text {doc_id}: {e}")
+            return False
+
+    async def get_spans(self, spans: List[Tuple[str, int, int]]) -> List[str]:
+        """
+        Resolve (doc_id, start, end) spans to text, in order.
+        Blocks missing from the cache are fetched in a single query.
+        Spans whose blocks cannot be found resolve to ''.
+        """
+        if not spans:
+            return []
+
+        # Characters each block must hold: a block cached while its document was still
+        # being written may be a shorter, partial version of it
+        needed: Dict[Tuple[str, int], int] = {}
+        for doc_id, start, end in spans:
+            last = max(start, end - 1) // self.block_chars
+            for block in range(start // self.block_chars, last + 1):
+                chars = end - block * self.block_chars if block == last else self.block_chars
+                needed[(doc_id, block)] = max(needed.get((doc_id, block), 0), chars)
+
+        blocks = {}
+        missing: Dict[str, List[int]] = {}
+        for key, chars in needed.items():
+            cached = self.cache.get(key)
+            if cached is not None and len(cached) >= chars:
+                blocks[key] = cached
+            else:
+                missing.setdefault(key[0], []).append(key[1])
+
+        if missing:
+            try:
+                collection = await self.get_collection()
+                cursor = collection.find(
+                    {"$or": [{"doc_id": doc_id, "block": {"$in": numbers}} for doc_id, numbers in missing.items()]},
+                    {"_id": 0, "doc_id": 1, "block": 1, "data": 1},
+                )
+                raw = [(row["doc_id"], row["block"], row["data"]) async for row in cursor]
+                decompressed = await asyncio.to_thread(
+                    lambda: [((doc_id, block), zlib.decompress(data).decode("utf-8")) for doc_id, block, data in raw]
+                )
+                for key, text in decompressed:
+                    blocks[key] = text
+                    self.cache.put(key, text)
+            except Exception as e:
+                logger.error(f"Error fetching document text blocks: {e}")
+
+        results = []
+        for doc_id, start, end in spans:
+            first, last = start // self.block_chars, max(start, end - 1) // self.block_chars
+            parts = [blocks.get((doc_id, block)) for block in range(first, last + 1)]
+            if any(part is None for part in parts):
+                logger.warning(f"Missing text blocks for span {doc_id}[{start}:{end}]")
+                results.append("")
+                continue
+            offset = first * self.block_chars
+            results.append("".join(parts)[start - offset:end - offset])
+        return results
+
+    async def delete_texts(self, doc_ids: List[str]) -> int:
+        """Delete stored text for the given documents. Returns the number of blocks deleted."""
+        try:
+            if not doc_ids:
+                return 0
+            targets = set(doc_ids)
+            self.cache.invalidate_where(lambda key: key[0] in targets)
+
+            collection = await self.get_collection()
+            result = await collection.delete_many({"doc_id": {"$in": list(targets)}})
+            logger.info(f"Deleted {result.deleted_count} text blocks for {len(targets)} documents")
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Error deleting document texts: {e}")
+            return 0
+
+
+# Singleton instance
+document_text_service = DocumentTextService()
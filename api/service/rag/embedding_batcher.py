@@ -0,0 +1,93 @@
+from typing import List, Callable, Optional, Dict, Any
+from service.monitoring.histogram import Histogram
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingMicroBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into one model call.
+
+    Callers await `submit(text)`. A background task waits for the first request,
+    keeps collecting for up to `window_ms` (or until `max_batch_size` texts are
+    queued), runs `embed_fn` once on the executor (or awaits it, if it is a
+    coroutine function) and resolves every caller's future with its own vector.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], Any], window_ms: float = 3.0, max_batch_size: int = 32):
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Tuning metrics: how full batches get vs. how long callers wait for them
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait_ms_histogram = Histogram([0.5, 1, 2, 5, 10, 25, 50, 100])
+
+    async def submit(self, text: str):
+        """Queue one text and wait for its embedding."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "batch_size": self.batch_size_histogram.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms_histogram.snapshot(),
+        }
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window
+
+            # Collect more requests until the window closes or the batch is full
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._process(batch)
+
+    async def _process(self, batch):
+        dispatched_at = time.perf_counter()
+        self.batch_size_histogram.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self.queue_wait_ms_histogram.observe((dispatched_at - enqueued_at) * 1000.0)
+
+        texts = [text for text, _, _ in batch]
+        try:
+            if asyncio.iscoroutinefunction(self.embed_fn):
+                embeddings = list(await self.embed_fn(texts))
+            else:
+                embeddings = await self._loop.run_in_executor(None, lambda: list(self.embed_fn(texts)))
+            if len(embeddings) != len(batch):
+                raise ValueError(f"expected {len(batch)} embeddings, got {len(embeddings)}")
+            for (_, future, _), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            logger.error(f"Micro-batched embedding of {len(texts)} texts failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,238 @@
+from typing import List, Dict, Optional, Tuple
+from contextlib import contextmanager
+from lib.lru_cache import ByteLRUCache
+import numpy as np
+import hashlib
+import logging
+import threading
+import os
+import re
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so the disk tier must not be shared
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed cache for embedding vectors.
+
+    - Memory tier: LRU of float32 vectors bounded by a byte budget.
+    - Disk tier: append-only float32 matrix (memory-mapped for reads) plus an
+      index file holding one hex key per row, in row order. Appends to both files
+      happen under an exclusive file lock, so processes can share the directory;
+      each picks up the rows the others appended the next time it writes.
+
+    Keys are a hash of the model name and the whitespace-normalized text, so the
+    same sentence re-uploaded in another file resolves to the same vector.
+    """
+
+    def __init__(self, model_name: str, dim: int, cache_dir: Optional[str] = None,
+                 max_memory_bytes: int = 64 * 1024 * 1024, max_disk_entries: int = 2_000_000):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_entries = max_disk_entries
+
+        self._lock = threading.Lock()
+        self._memory = ByteLRUCache(max_memory_bytes, sizeof=lambda vector: vector.nbytes)
+        self._vector_bytes = dim * np.dtype(np.float32).itemsize
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # Disk tier state
+        self._disk_index: Dict[str, int] = {}
+        self._disk_rows = 0      # Rows in the files as of the last load / catch-up
+        self._index_offset = 0   # Bytes of the index file already read
+        self._disk_map: Optional[np.memmap] = None
+        self._vectors_path = None
+        self._index_path = None
+        self._lock_path = None
+
+        if cache_dir:
+            try:
+                model_slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+                store_dir = os.path.join(cache_dir, model_slug)
+                os.makedirs(store_dir, exist_ok=True)
+                self._vectors_path = os.path.join(store_dir, "vectors.f32")
+                self._index_path = os.path.join(store_dir, "index.txt")
+                self._lock_path = os.path.join(store_dir, "lock")
+                self._load_disk_index()
+            except Exception as e:
+                logger.error(f"Failed to open on-disk embedding cache at '{cache_dir}': {e}")
+                self._vectors_path = None
+                self._index_path = None
+
+    def make_key(self, text: str) -> str:
+        """Hash of the model name and the whitespace-normalized text."""
+        normalized = _WHITESPACE_PATTERN.sub(' ', text).strip()
+        return hashlib.sha1(f"{self.model_name}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Look up a vector by key, promoting disk hits into the memory tier."""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+
+            row = self._disk_index.get(key)
+            if row is not None:
+                vector = self._read_disk_row(row)
+                if vector is not None:
+                    self._memory.put(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def get_many(self, keys: List[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """
+        Look up several keys at once.
+        Returns the per-key results (None for misses) and the positions of the misses.
+        """
+        results = [self.get(key) for key in keys]
+        miss_positions = [i for i, vector in enumerate(results) if vector is None]
+        return results, miss_positions
+
+    def put(self, key: str, vector) -> None:
+        """Store a vector in the memory tier and append it to the disk tier if new."""
+        self.put_many([key], [vector])
+
+    def put_many(self, keys: List[str], vectors) -> None:
+        """Store several vectors, appending the new ones to disk in a single write."""
+        new_keys = []
+        new_vectors = []
+        pending = set()
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+                if vector.shape[0] != self.dim:
+                    continue
+                self._memory.put(key, vector)
+                if self._vectors_path and key not in self._disk_index and key not in pending:
+                    pending.add(key)
+                    new_keys.append(key)
+                    new_vectors.append(vector)
+
+            if new_keys:
+                self._append_disk_rows(new_keys, new_vectors)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current footprint of both tiers."""
+        memory = self._memory.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": memory["entries"],
+                "memory_bytes": memory["bytes"],
+                "disk_entries": len(self._disk_index),
+            }
+
+    # --- Internal helpers (callers hold self._lock) ---
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive advisory lock on the disk tier, held across the two appends."""
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_disk_index(self) -> None:
+        with self._file_lock():
+            if not os.path.exists(self._index_path):
+                return
+
+            with open(self._index_path, "rb") as f:
+                keys = [line.strip().decode("ascii") for line in f if line.strip()]
+
+            # A crash between the two appends can leave the index ahead of the data;
+            # only trust rows that are fully present in the vectors file.
+            stored_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+            valid_rows = min(len(keys), stored_bytes // self._vector_bytes)
+            for row, key in enumerate(keys[:valid_rows]):
+                self._disk_index.setdefault(key, row)
+
+            if valid_rows != len(keys) or valid_rows * self._vector_bytes != stored_bytes:
+                # Rewrite both files so row numbers and keys line up again
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(valid_rows * self._vector_bytes)
+                with open(self._index_path, "w", encoding="ascii") as f:
+                    f.writelines(f"{key}\n" for key in keys[:valid_rows])
+
+            self._disk_rows = valid_rows
+            self._index_offset = os.path.getsize(self._index_path)
+
+        logger.info(f"Loaded on-disk embedding cache with {valid_rows} vectors for {self.model_name}")
+
+    def _catch_up(self) -> None:
+        """Index the rows other processes appended since we last looked (file lock held)."""
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "rb") as f:
+            f.seek(self._index_offset)
+            appended = f.read()
+        # Appends are whole lines written under the lock
+        for line in appended.splitlines():
+            if line:
+                self._disk_index.setdefault(line.decode("ascii"), self._disk_rows)
+                self._disk_rows += 1
+        self._index_offset += len(appended)
+
+    def _read_disk_row(self, row: int) -> Optional[np.ndarray]:
+        try:
+            if self._disk_map is None or row >= self._disk_map.shape[0]:
+                rows = os.path.getsize(self._vectors_path) // self._vector_bytes
+                if row >= rows:
+                    return None
+                self._disk_map = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            return np.array(self._disk_map[row])
+        except Exception as e:
+            logger.warning(f"Failed to read cached embedding row {row}: {e}")
+            return None
+
+    def _append_disk_rows(self, keys: List[str], vectors: List[np.ndarray]) -> None:
+        try:
+            with self._file_lock():
+                self._catch_up()
+                # Another process may have stored some of these meanwhile
+                new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._disk_index]
+                new = new[:max(0, self.max_disk_entries - self._disk_rows)]
+                if not new:
+                    return
+
+                stored_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+                if stored_bytes != self._disk_rows * self._vector_bytes:
+                    logger.warning("On-disk embedding cache files are out of step; not appending")
+                    return
+
+                with open(self._vectors_path, "ab") as f:
+                    f.write(np.stack([vector for _, vector in new]).astype(np.float32, copy=False).tobytes())
+                lines = "".join(f"{key}\n" for key, _ in new).encode("ascii")
+                with open(self._index_path, "ab") as f:
+                    f.write(lines)
+
+                for offset, (key, _) in enumerate(new):
+                    self._disk_index[key] = self._disk_rows + offset
+                self._disk_rows += len(new)
+                self._index_offset += len(lines)
+        except Exception as e:
+            logger.warning(f"Failed to persist embeddings to disk cache: {e}")
@@ -1,51 +1,201 @@
-from typing import List
+from typing import List, Dict, Any, Optional, Tuple
 from fastembed import TextEmbedding
 from lib.config import settings
+from service.rag.embedding_cache import EmbeddingCache
+from service.rag.embedding_batcher import EmbeddingMicroBatcher
+from service.rag.inference_pool import inference_pool
+import numpy as np
 import logging
-import asyncio
+import copy
 import time
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+EMBEDDING_MAX_TOKENS = 512  # bge-small context window; longer inputs are truncated by the model
+
 class EmbeddingService:
     def __init__(self):
         """
         Initializes the FastEmbed model (BAAI/bge-small-en-v1.5).
         Produces 384-dimensional vectors.
         """
-        try:
-            logger.info("Initializing FastEmbed Service (BAAI/bge-small-en-v1.5)...")
-            # This will download the model if not present (~something small, <1GB)
-            self.model = TextEmbedding(model_name="BAAI/bge-small-en-v1.5")
-            self.output_dim = 384
-            logger.info("FastEmbed Service initialized successfully.")
-        except Exception as e:
-            logger.error(f"Failed to initialize FastEmbed Service: {e}")
-            self.model = None
+        self.model_name = EMBEDDING_MODEL_NAME
+        self.output_dim = 384
+        self.max_tokens = EMBEDDING_MAX_TOKENS
+        self.length_bucketing = settings.embedding_length_bucketing
+        self.truncated_texts = 0
+        # Texts sent to the model (documents and queries) and the inference calls that carried them
+        self.embedded_texts = 0
+        self.inference_calls = 0
+        self._length_tokenizer = None
+        self.model = None
+        self._standalone_tokenizer = None
+        if inference_pool.is_process_mode:
+            # The worker processes hold the model; loading it here too would double its memory.
+            # Only the tokenizer is needed in this process (token counts for chunking/bucketing).
+            try:
+                from tokenizers import Tokenizer
+                self._standalone_tokenizer = Tokenizer.from_pretrained(self.model_name)
+            except Exception as e:
+                logger.warning(f"Failed to load the {self.model_name} tokenizer; token counts will be estimated: {e}")
+            logger.info("FastEmbed Service initialized; inference runs in the process pool.")
+        else:
+            try:
+                logger.info("Initializing FastEmbed Service (BAAI/bge-small-en-v1.5)...")
+                # This will download the model if not present (~something small, <1GB)
+                self.model = TextEmbedding(model_name=self.model_name, threads=settings.inference_onnx_threads or None)
+                logger.info("FastEmbed Service initialized successfully.")
+            except Exception as e:
+                logger.error(f"Failed to initialize FastEmbed Service: {e}")
+
+        # Content-hash cache so re-indexed documents and repeated queries skip inference
+        self.cache = None
+        if settings.embedding_cache_enabled:
+            self.cache = EmbeddingCache(
+                model_name=self.model_name,
+                dim=self.output_dim,
+                cache_dir=settings.embedding_cache_dir,
+                max_memory_bytes=settings.embedding_cache_memory_mb * 1024 * 1024,
+                max_disk_entries=settings.embedding_cache_max_disk_entries,
+            )
+
+        # Coalesces concurrent single-query embeddings into one model call
+        self.batcher = None
+        if (self.model or inference_pool.is_process_mode) and settings.embedding_microbatch_enabled:
+            self.batcher = EmbeddingMicroBatcher(
+                embed_fn=self._embed_queries,
+                window_ms=settings.embedding_microbatch_window_ms,
+                max_batch_size=settings.embedding_microbatch_max_size,
+            )
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters for the embedding cache."""
+        if not self.cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def get_batcher_stats(self) -> Dict[str, Any]:
+        """Returns batch-size and queue-wait histograms for query micro-batching."""
+        if not self.batcher:
+            return {"enabled": False}
+        return {"enabled": True, **self.batcher.stats()}
+
+    def get_inference_stats(self) -> Dict[str, Any]:
+        """Returns batching configuration, inference volume and how many texts exceeded the model's token window."""
+        return {
+            "length_bucketing": self.length_bucketing,
+            "max_tokens": self.max_tokens,
+            "truncated_texts": self.truncated_texts,
+            "embedded_texts": self.embedded_texts,
+            "inference_calls": self.inference_calls,
+            "pool_mode": inference_pool.mode,
+        }
+
+    def _get_tokenizer(self):
+        """The Hugging Face tokenizer behind the FastEmbed model, if this fastembed version exposes it."""
+        if self._standalone_tokenizer is not None:
+            return self._standalone_tokenizer
+        inner_model = getattr(self.model, "model", None)
+        return getattr(inner_model, "tokenizer", None)
+
+    def get_length_tokenizer(self):
+        """
+        A private copy of the model's tokenizer with padding and truncation disabled, for
+        exact per-text token counts (the model's own tokenizer pads every batch to its
+        longest text and truncates at the context window). None if not reachable.
+        """
+        if self._length_tokenizer is None:
+            tokenizer = self._get_tokenizer()
+            if tokenizer is None:
+                return None
+            try:
+                length_tokenizer = copy.deepcopy(tokenizer)
+                length_tokenizer.no_padding()
+                length_tokenizer.no_truncation()
+                self._length_tokenizer = length_tokenizer
+            except Exception as e:
+                logger.warning(f"Could not copy tokenizer for length measurement: {e}")
+                return None
+        return self._length_tokenizer
+
+    def _token_lengths(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        """
+        Token length of each text and the number of texts that exceed the model's token limit.
+        Falls back to a ~4 chars/token estimate when the tokenizer is not reachable.
+        """
+        tokenizer = self.get_length_tokenizer()
+        if tokenizer is not None:
+            try:
+                encodings = tokenizer.encode_batch(texts)
+                lengths = np.fromiter((len(enc.ids) for enc in encodings), dtype=np.int32, count=len(texts))
+                return lengths, int(np.count_nonzero(lengths > self.max_tokens))
+            except Exception as e:
+                logger.warning(f"Tokenizer length estimate failed, using character lengths: {e}")
+
+        lengths = np.fromiter((len(text) // 4 for text in texts), dtype=np.int32, count=len(texts))
+        return lengths, int(np.count_nonzero(lengths > self.max_tokens))
+
+    async def _embed_length_bucketed(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """
+        Embed texts sorted by token length so each model batch holds similar-length
+        inputs (less padding), then restore the caller's order.
+        """
+        if not self.length_bucketing or len(texts) <= 1:
+            return await self._embed(texts, batch_size)
+
+        lengths, truncated = await inference_pool.run_local(lambda: self._token_lengths(texts))
+        if truncated:
+            self.truncated_texts += truncated
+            logger.warning(f"{truncated} of {len(texts)} texts exceed the {self.max_tokens}-token limit and will be truncated by the model")
+
+        order = np.argsort(lengths, kind="stable")
+        sorted_embeddings = await self._embed([texts[i] for i in order], batch_size)
+
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        return embeddings
+
+    async def _embed(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """The one path to the model: the inference pool (dedicated threads, processes or default executor)."""
+        self.inference_calls += 1
+        self.embedded_texts += len(texts)
+        return await inference_pool.embed(texts, batch_size, local_model=self.model)
+
+    async def _embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Query embeddings, as one model batch."""
+        return await self._embed(texts, batch_size=len(texts))
 
     async def get_embedding(self, text: str) -> List[float]:
         """
         Generates a 384-dimensional vector embedding for the given text using local FastEmbed model.
-        Running in a thread executor to ensure async compatibility.
+        Runs on the inference pool to ensure async compatibility.
         """
         if not text or not isinstance(text, str):
             logger.warning("get_embedding called with empty or invalid text.")
             return []
-        
-        if not self.model:
+
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.make_key(text)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached.tolist()
+
+        if not self.model and not inference_pool.is_process_mode:
             logger.error("Embedding model not initialized.")
             return []
 
         try:
-            loop = asyncio.get_running_loop()
-            # fastembed's embed method returns a generator, so we list() it.
-            # We pass a list of ONE text.
-            # run_in_executor prevents blocking the event loop with CPU-bound model inference.
-            embeddings = await loop.run_in_executor(
-                None, 
-                lambda: list(self.model.embed([text]))
-            )
-            return embeddings[0].tolist() if hasattr(embeddings[0], 'tolist') else list(embeddings[0])
+            if self.batcher:
+                # Shares one embed() call with other requests arriving in the same window
+                embedding = await self.batcher.submit(text)
+            else:
+                # The inference pool keeps CPU-bound model inference off the event loop
+                embedding = (await self._embed_queries([text]))[0]
+            if self.cache:
+                self.cache.put(cache_key, embedding)
+            return embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding)
         except Exception as e:
             logger.error(f"Failed to generate embedding: {e}")
             return []
@@ -53,39 +203,69 @@ class EmbeddingService:
     async def get_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         """
         Generate 384-dimensional embeddings for multiple texts using local FastEmbed.
+        List-of-floats wrapper around get_embeddings_matrix for callers that need plain lists.
         """
         if not texts:
             return []
-            
-        if not self.model:
+
+        matrix = await self.get_embeddings_matrix(texts, batch_size=batch_size)
+        if matrix is None:
+            # Return empty list matching input length to avoid misalignments upstream
+            return [[] for _ in texts]
+        return matrix.tolist()
+
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 32) -> Optional[np.ndarray]:
+        """
+        Generate embeddings for multiple texts as one contiguous (n, 384) float32 matrix.
+        Cached vectors are reused; only the misses go through the model.
+        Returns None if embedding fails.
+        """
+        if not texts:
+            return np.zeros((0, self.output_dim), dtype=np.float32)
+
+        matrix = np.empty((len(texts), self.output_dim), dtype=np.float32)
+
+        # Resolve what we can from the cache, keeping each text's position
+        miss_positions = list(range(len(texts)))
+        cache_keys = []
+        if self.cache:
+            cache_keys = [self.cache.make_key(text) for text in texts]
+            cached_results, miss_positions = self.cache.get_many(cache_keys)
+            for position, vector in enumerate(cached_results):
+                if vector is not None:
+                    matrix[position] = vector
+            if not miss_positions:
+                logger.info(f"All {len(texts)} embeddings served from cache")
+                return matrix
+
+        if not self.model and not inference_pool.is_process_mode:
             logger.error("Embedding model not initialized.")
-            return []
+            return None
+
+        logger.info(f"Processing {len(miss_positions)} of {len(texts)} texts with FastEmbed ({len(texts) - len(miss_positions)} cached)")
 
-        logger.info(f"Processing {len(texts)} texts with FastEmbed")
-        
         try:
-            loop = asyncio.get_running_loop()
-            
-            # fastembed handles batching internally efficiently, 
-            # but we run the whole operation in executor to be safe async-wise.
-            def _process_batch():
-                # fastembed generator -> list
-                return list(self.model.embed(texts, batch_size=batch_size))
-            
-            embeddings = await loop.run_in_executor(None, _process_batch)
-            
-            # Convert numpy arrays to lists if necessary
-            result = [e.tolist() if hasattr(e, 'tolist') else list(e) for e in embeddings]
-            
-            logger.info(f"Successfully generated {len(result)} embeddings locally")
-            return result
+            miss_texts = [texts[i] for i in miss_positions]
+
+            # Length-bucketed batches cut padding; the inference pool keeps the
+            # CPU-bound work off the event loop (dedicated threads or processes).
+            embeddings = await self._embed_length_bucketed(miss_texts, batch_size)
+            if embeddings.shape != (len(miss_texts), self.output_dim):
+                logger.error(f"Unexpected embedding matrix shape {embeddings.shape} for {len(miss_texts)} texts")
+                return None
+
+            if self.cache:
+                self.cache.put_many([cache_keys[i] for i in miss_positions], embeddings)
+
+            # Merge freshly computed vectors back into their original positions
+            matrix[miss_positions] = embeddings
+
+            logger.info(f"Successfully generated {len(miss_texts)} embeddings locally")
+            return matrix
 
         except Exception as e:
             logger.error(f"Failed to generate batch embeddings: {e}")
-            # Return empty list matching input length to avoid misalignments upstream? 
-            # Or just empty list. The original code returned empty lists for failed items 
-            # but that was per-batch. Here let's fail safe.
-            return [[] for _ in texts]
+            return None
 
 
 # Singleton instance
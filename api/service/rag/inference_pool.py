@@ -0,0 +1,248 @@
+from typing import List, Dict, Any, Callable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from lib.config import settings
+import contextvars
+import multiprocessing
+import numpy as np
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Worker-process side ---
+# Models are loaded lazily, once per worker process, on first use.
+
+_worker_config: Dict[str, Any] = {}
+_worker_embedder = None
+_worker_ranker = None
+
+
+def _init_worker(config: Dict[str, Any]):
+    global _worker_config
+    _worker_config = config
+
+
+def _get_worker_embedder():
+    global _worker_embedder
+    if _worker_embedder is None:
+        from fastembed import TextEmbedding
+        threads = _worker_config.get("onnx_threads") or None
+        _worker_embedder = TextEmbedding(model_name=_worker_config["embedding_model"], threads=threads)
+    return _worker_embedder
+
+
+def _get_worker_ranker():
+    global _worker_ranker
+    if _worker_ranker is None:
+        from flashrank import Ranker
+        _worker_ranker = Ranker(model_name=_worker_config["rerank_model"], cache_dir=_worker_config["rerank_cache_dir"])
+    return _worker_ranker
+
+
+def _embed_into_shared_memory(texts: List[str], batch_size: int):
+    """
+    Embeds texts inside the worker and writes the (n, dim) float32 matrix into a
+    new shared-memory block. Only the block name and shape cross the process
+    boundary; the parent copies the matrix out and unlinks the block.
+    """
+    vectors = np.asarray(list(_get_worker_embedder().embed(texts, batch_size=batch_size)), dtype=np.float32)
+    if vectors.size == 0:
+        return None, vectors.shape
+
+    shm = shared_memory.SharedMemory(create=True, size=vectors.nbytes)
+    try:
+        np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)[:] = vectors
+        return shm.name, vectors.shape
+    finally:
+        shm.close()
+
+
+def _rerank_in_worker(query: str, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    from flashrank import RerankRequest
+    results = _get_worker_ranker().rerank(RerankRequest(query=query, passages=passages))
+    # Scores come back as numpy floats; send plain Python values across the boundary
+    return [{**res, "score": float(res.get("score", 0.0))} for res in results]
+
+
+# --- Parent side ---
+
+# Set inside background work (ingestion jobs); see InferencePool.background()
+_background = contextvars.ContextVar("inference_background", default=False)
+
+class InferencePool:
+    """
+    Opt-in dedicated executor for CPU-bound model inference (embedding, reranking).
+
+    Modes (settings.inference_pool_mode):
+    - "default": run on the event loop's shared default executor (previous behaviour).
+    - "thread":  run on a dedicated ThreadPoolExecutor so bulk inference does not
+                 starve the default executor used by other blocking calls.
+    - "process": run in a ProcessPoolExecutor; each worker loads its own models
+                 once, and embedding matrices come back through shared memory.
+                 The parent then loads no models of its own (only the embedding
+                 tokenizer, for token counts), and query embeddings use the pool too.
+
+    Inference issued inside `background()` (bulk ingestion) is confined to
+    `background_size` threads, or worker processes in process mode, so it cannot
+    occupy every slot that interactive queries need.
+    """
+
+    def __init__(self, mode: str = "default", size: int = 2, onnx_threads: int = 0,
+                 background_size: int = 1,
+                 embedding_model: str = "BAAI/bge-small-en-v1.5",
+                 rerank_model: str = "ms-marco-MiniLM-L-12-v2",
+                 rerank_cache_dir: str = ".cache/flashrank"):
+        self.mode = mode if mode in ("default", "thread", "process") else "default"
+        self.size = max(1, size)
+        self.onnx_threads = onnx_threads
+        self.background_size = max(1, background_size)
+        self._worker_config = {
+            "onnx_threads": onnx_threads,
+            "embedding_model": embedding_model,
+            "rerank_model": rerank_model,
+            "rerank_cache_dir": rerank_cache_dir,
+        }
+        self._executor = None
+        self._background_executor = None
+        # Bounds background calls into the shared process pool
+        self._background_slots = asyncio.Semaphore(self.background_size)
+
+    @property
+    def is_process_mode(self) -> bool:
+        return self.mode == "process"
+
+    def _get_executor(self):
+        if self.mode == "default":
+            return None
+        if self._executor is None:
+            if self.mode == "process":
+                # spawn avoids forking a parent that already holds ONNX sessions and threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self._worker_config,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="inference")
+            logger.info(f"Started {self.mode} inference pool with {self.size} workers")
+        return self._executor
+
+    def _get_background_executor(self):
+        if self._background_executor is None:
+            self._background_executor = ThreadPoolExecutor(
+                max_workers=self.background_size, thread_name_prefix="inference-background"
+            )
+        return self._background_executor
+
+    @contextmanager
+    def background(self):
+        """Route inference started in this context (and tasks it spawns) to the background lane."""
+        token = _background.set(True)
+        try:
+            yield
+        finally:
+            _background.reset(token)
+
+    async def run_local(self, fn: Callable[[], Any]) -> Any:
+        """Run an in-process callable off the event loop (dedicated threads or default executor)."""
+        loop = asyncio.get_running_loop()
+        if _background.get():
+            executor = self._get_background_executor()
+        else:
+            executor = None if self.is_process_mode else self._get_executor()
+        return await loop.run_in_executor(executor, fn)
+
+    async def embed(self, texts: List[str], batch_size: int, local_model=None) -> np.ndarray:
+        """
+        Embed texts and return an (n, dim) float32 matrix.
+        Uses worker processes in process mode, otherwise `local_model` on a thread.
+        """
+        if not self.is_process_mode:
+            return await self.run_local(
+                lambda: np.asarray(list(local_model.embed(texts, batch_size=batch_size)), dtype=np.float32)
+            )
+
+        submitted = []
+
+        async def _run_slice(part):
+            future = self._get_executor().submit(_embed_into_shared_memory, part, batch_size)
+            submitted.append(future)
+            return await asyncio.wrap_future(future)
+
+        if _background.get():
+            # One slice at a time per background slot; the other workers stay free for queries
+            async def _embed_slice(part):
+                async with self._background_slots:
+                    return await _run_slice(part)
+            slice_size = max(batch_size, -(-len(texts) // self.background_size))
+        else:
+            _embed_slice = _run_slice
+            # Split large inputs across workers so bulk indexing uses every core
+            slice_size = max(batch_size, -(-len(texts) // self.size))
+        slices = [texts[i:i + slice_size] for i in range(0, len(texts), slice_size)]
+        try:
+            handles = await asyncio.gather(*[_embed_slice(part) for part in slices], return_exceptions=True)
+            errors = [handle for handle in handles if isinstance(handle, BaseException)]
+            if errors:
+                raise errors[0]
+            matrices = [self._copy_shared_matrix(name, shape) for name, shape in handles if name is not None]
+        finally:
+            # Every block a worker created is unlinked, including those of sibling slices when
+            # one fails and of slices still running if we are cancelled (once they finish)
+            for future in submitted:
+                future.add_done_callback(self._release_shared_block)
+        return np.concatenate(matrices, axis=0) if matrices else np.zeros((0, 0), dtype=np.float32)
+
+    async def rerank(self, query: str, passages: List[Dict[str, Any]], local_ranker=None) -> List[Dict[str, Any]]:
+        """Rerank passages with FlashRank off the event loop."""
+        if not self.is_process_mode:
+            from flashrank import RerankRequest
+            return await self.run_local(lambda: local_ranker.rerank(RerankRequest(query=query, passages=passages)))
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), _rerank_in_worker, query, passages)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._background_executor is not None:
+            self._background_executor.shutdown(wait=False, cancel_futures=True)
+            self._background_executor = None
+
+    @staticmethod
+    def _copy_shared_matrix(name: str, shape) -> np.ndarray:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+
+    @staticmethod
+    def _release_shared_block(future) -> None:
+        """Unlink the shared-memory block a finished _embed_into_shared_memory call created."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        name, _ = future.result()
+        if name is None:
+            return
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to release shared-memory block {name}: {e}")
+
+
+# Singleton instance
+inference_pool = InferencePool(
+    mode=settings.inference_pool_mode,
+    size=settings.inference_pool_size,
+    onnx_threads=settings.inference_onnx_threads,
+    background_size=settings.ingestion_inference_threads,
+)
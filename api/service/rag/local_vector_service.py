@@ -0,0 +1,464 @@
+from typing import List, Dict, Any, Optional, Tuple, Union
+import numpy as np
+import hashlib
+import asyncio
+import logging
+import threading
+import json
+import os
+import re
+import time
+
+from service.rag.vector_batch import VectorBatch
+from service.rag.vector_store import VectorStore, matches_filter
+
+logger = logging.getLogger(__name__)
+
+SHARED_TENANT = "_shared"
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+class _Segment:
+    """
+    One immutable, append-only slab of vectors on disk.
+
+    Files (written to temp names, then renamed; the .meta.jsonl file is the commit marker):
+    - seg_<n>.vec.npy    (rows, dim) unit-normalized vectors in the storage dtype, mmap'd on load
+    - seg_<n>.scale.npy  per-row dequantization scale (int8 storage only)
+    - seg_<n>.meta.jsonl one {"id", "metadata", "written"} object per row; "written" is the
+                         upsert time (ns), which decides between copies of an id in two tenants
+    """
+
+    def __init__(self, number: int, values: np.ndarray, scales: Optional[np.ndarray],
+                 ids: List[str], metadata: List[Dict[str, Any]], doc_codes: np.ndarray,
+                 written: np.ndarray):
+        self.number = number
+        self.values = values
+        self.scales = scales
+        self.ids = ids
+        self.metadata = metadata
+        self.doc_codes = doc_codes
+        self.written = written
+        self.alive = np.ones(len(ids), dtype=bool)
+
+    def scores(self, query: np.ndarray, block_rows: int = 16384) -> np.ndarray:
+        """Cosine similarity of every row against a unit-normalized float32 query."""
+        if self.values.dtype == np.float32:
+            return self.values @ query
+
+        # float16/int8 have no BLAS path; upcast in bounded blocks
+        out = np.empty(self.values.shape[0], dtype=np.float32)
+        for start in range(0, self.values.shape[0], block_rows):
+            block = np.asarray(self.values[start:start + block_rows], dtype=np.float32)
+            out[start:start + block_rows] = block @ query
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def row_values(self, row: int) -> np.ndarray:
+        vector = np.asarray(self.values[row], dtype=np.float32)
+        if self.scales is not None:
+            vector = vector * self.scales[row]
+        return vector
+
+
+class _TenantIndex:
+    """All segments for one tenant, plus the id -> (segment, row) lookup."""
+
+    def __init__(self, path: str, dim: int, dtype: str):
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        self.segments: List[_Segment] = []
+        self.locations: Dict[str, Tuple[_Segment, int]] = {}
+        self.doc_codes: Dict[str, int] = {}
+        self.dead_rows = 0
+
+    @property
+    def total_rows(self) -> int:
+        return sum(len(seg.ids) for seg in self.segments)
+
+    @property
+    def last_segment_number(self) -> int:
+        return self.segments[-1].number if self.segments else 0
+
+    def written(self, vector_id: str) -> int:
+        segment, row = self.locations[vector_id]
+        return int(segment.written[row])
+
+    def doc_code(self, source_filename: Optional[str]) -> int:
+        key = source_filename or ""
+        if key not in self.doc_codes:
+            self.doc_codes[key] = len(self.doc_codes)
+        return self.doc_codes[key]
+
+    # --- Loading ---
+
+    def load(self):
+        if not os.path.isdir(self.path):
+            return
+        numbers = sorted(
+            int(m.group(1)) for m in (re.match(r"seg_(\d+)\.meta\.jsonl$", name) for name in os.listdir(self.path)) if m
+        )
+        for number in numbers:
+            try:
+                self._attach(self._read_segment(number))
+            except Exception as e:
+                logger.error(f"Skipping unreadable vector segment {number} in {self.path}: {e}")
+
+        tombstones_path = os.path.join(self.path, "tombstones.txt")
+        if os.path.exists(tombstones_path):
+            with open(tombstones_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    segment_number, _, vector_id = line.rstrip("\n").partition("\t")
+                    location = self.locations.get(vector_id)
+                    if location and location[0].number <= int(segment_number):
+                        self._kill(vector_id)
+
+    def _read_segment(self, number: int) -> _Segment:
+        base = os.path.join(self.path, f"seg_{number:06d}")
+        values = np.load(f"{base}.vec.npy", mmap_mode="r")
+        scales = np.load(f"{base}.scale.npy") if os.path.exists(f"{base}.scale.npy") else None
+        ids, metadata, written = [], [], []
+        # Rows written before upsert times were recorded date from their segment file
+        file_written = os.stat(f"{base}.meta.jsonl").st_mtime_ns
+        with open(f"{base}.meta.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                ids.append(record["id"])
+                metadata.append(record.get("metadata", {}))
+                written.append(record.get("written", file_written))
+        doc_codes = np.fromiter((self.doc_code(m.get("source_filename")) for m in metadata), dtype=np.int32, count=len(ids))
+        return _Segment(number, values, scales, ids, metadata, doc_codes, np.asarray(written, dtype=np.int64))
+
+    def _attach(self, segment: _Segment):
+        """Register a segment; rows whose ids reappear supersede older rows."""
+        self.segments.append(segment)
+        for row, vector_id in enumerate(segment.ids):
+            if vector_id in self.locations:
+                self._kill(vector_id)
+            self.locations[vector_id] = (segment, row)
+
+    def _kill(self, vector_id: str) -> bool:
+        location = self.locations.pop(vector_id, None)
+        if location is None:
+            return False
+        segment, row = location
+        segment.alive[row] = False
+        self.dead_rows += 1
+        return True
+
+    # --- Mutations ---
+
+    def append(self, ids: List[str], values: np.ndarray, metadata: List[Dict[str, Any]]):
+        # Keep only the last occurrence of an id within the batch
+        last = {vector_id: i for i, vector_id in enumerate(ids)}
+        if len(last) != len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            values = values[keep]
+            metadata = [metadata[i] for i in keep]
+
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        unit = values / np.maximum(norms, 1e-12)
+        stored, scales = self._encode(unit)
+
+        number = self.last_segment_number + 1
+        self._write_segment(number, stored, scales, ids, metadata, np.full(len(ids), time.time_ns(), dtype=np.int64))
+        self._attach(self._read_segment(number))
+
+    def delete(self, ids: List[str]) -> int:
+        deleted = [vector_id for vector_id in ids if self._kill(vector_id)]
+        if deleted:
+            with open(os.path.join(self.path, "tombstones.txt"), "a", encoding="utf-8") as f:
+                f.writelines(f"{self.last_segment_number}\t{vector_id}\n" for vector_id in deleted)
+        return len(deleted)
+
+    def compact(self):
+        """Rewrite all live rows into a single segment and drop old segments and tombstones."""
+        old_segments = list(self.segments)
+        number = self.last_segment_number + 1
+
+        ids, metadata, stored_parts, scale_parts, written_parts = [], [], [], [], []
+        for seg in old_segments:
+            rows = np.flatnonzero(seg.alive)
+            if rows.size == 0:
+                continue
+            ids.extend(seg.ids[row] for row in rows)
+            metadata.extend(seg.metadata[row] for row in rows)
+            written_parts.append(seg.written[rows])
+            stored_parts.append(np.asarray(seg.values[rows]))
+            if seg.scales is not None:
+                scale_parts.append(seg.scales[rows])
+
+        live = len(ids)
+        if live:
+            scales = np.concatenate(scale_parts) if scale_parts else None
+            self._write_segment(number, np.concatenate(stored_parts), scales, ids, metadata, np.concatenate(written_parts))
+
+        self.segments = []
+        self.locations = {}
+        self.dead_rows = 0
+        if live:
+            self._attach(self._read_segment(number))
+
+        for seg in old_segments:
+            base = os.path.join(self.path, f"seg_{seg.number:06d}")
+            for suffix in (".meta.jsonl", ".vec.npy", ".scale.npy"):
+                if os.path.exists(base + suffix):
+                    os.remove(base + suffix)
+        tombstones_path = os.path.join(self.path, "tombstones.txt")
+        if os.path.exists(tombstones_path):
+            os.remove(tombstones_path)
+
+        logger.info(f"Compacted vector index {self.path}: {len(old_segments)} segments -> {1 if live else 0}, {live} live rows")
+
+    # --- Queries ---
+
+    def search(self, query: np.ndarray, top_k: int, documents: Optional[List[str]]) -> List[Tuple[float, _Segment, int]]:
+        wanted_codes = None
+        if documents:
+            wanted_codes = np.asarray([self.doc_codes[d] for d in documents if d in self.doc_codes], dtype=np.int32)
+            if wanted_codes.size == 0:
+                return []
+
+        candidates = []
+        for segment in self.segments:
+            mask = segment.alive
+            if wanted_codes is not None:
+                mask = mask & np.isin(segment.doc_codes, wanted_codes)
+            rows = np.flatnonzero(mask)
+            if rows.size == 0:
+                continue
+
+            scores = segment.scores(query)[rows]
+            if rows.size > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                rows, scores = rows[best], scores[best]
+            candidates.extend(zip(scores.tolist(), [segment] * rows.size, rows.tolist()))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return candidates[:top_k]
+
+    # --- Encoding / IO helpers ---
+
+    def _encode(self, unit: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "float16":
+            return unit.astype(np.float16), None
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(unit).max(axis=1), 1e-12) / 127.0
+            quantized = np.clip(np.rint(unit / scales[:, None]), -127, 127).astype(np.int8)
+            return quantized, scales.astype(np.float32)
+        return unit.astype(np.float32), None
+
+    def _write_segment(self, number: int, stored: np.ndarray, scales: Optional[np.ndarray],
+                       ids: List[str], metadata: List[Dict[str, Any]], written: np.ndarray):
+        os.makedirs(self.path, exist_ok=True)
+        base = os.path.join(self.path, f"seg_{number:06d}")
+        with open(f"{base}.vec.npy.tmp", "wb") as f:
+            np.save(f, stored)
+        os.replace(f"{base}.vec.npy.tmp", f"{base}.vec.npy")
+        if scales is not None:
+            with open(f"{base}.scale.npy.tmp", "wb") as f:
+                np.save(f, scales)
+            os.replace(f"{base}.scale.npy.tmp", f"{base}.scale.npy")
+        with open(f"{base}.meta.jsonl.tmp", "w", encoding="utf-8") as f:
+            f.writelines(
+                json.dumps({"id": vector_id, "metadata": meta, "written": int(stamp)}) + "\n"
+                for vector_id, meta, stamp in zip(ids, metadata, written)
+            )
+        os.replace(f"{base}.meta.jsonl.tmp", f"{base}.meta.jsonl")
+
+
+class LocalVectorService(VectorStore):
+    """
+    In-process vector index: exact cosine search over per-tenant matrices.
+
+    Each tenant (username) has its own directory of append-only, memory-mapped
+    segments. Deletes are recorded as tombstones and reclaimed by compaction once
+    dead rows exceed `compaction_ratio` of the tenant's rows (or too many segments
+    pile up). Vectors are stored unit-normalized as float32, float16 or int8.
+
+    An upsert that moves an id to another tenant tombstones it in the tenants loaded
+    at the time. Copies left in tenants that were not loaded are resolved when they
+    load: the most recently written copy wins, and the others are tombstoned.
+    """
+
+    def __init__(self, root_dir: str, dimension: int, dtype: str = "float32",
+                 compaction_ratio: float = 0.3, max_segments: int = 32):
+        self.root_dir = root_dir
+        self.dimension = dimension
+        self.dtype = dtype if dtype in SUPPORTED_DTYPES else "float32"
+        self.compaction_ratio = compaction_ratio
+        self.max_segments = max_segments
+        self._tenants: Dict[str, _TenantIndex] = {}
+        self._lock = threading.RLock()
+
+    def initialize(self) -> bool:
+        try:
+            os.makedirs(self.root_dir, exist_ok=True)
+            logger.info(f"Using local vector index at '{self.root_dir}' ({self.dtype} storage)")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to initialize local vector index: {e}")
+            return False
+
+    async def upsert_vectors(self, vectors: Union[VectorBatch, List[Dict[str, Any]]]) -> bool:
+        try:
+            batch = vectors if isinstance(vectors, VectorBatch) else VectorBatch.from_records(vectors, self.dimension)
+            if len(batch) == 0:
+                return True
+            await asyncio.to_thread(self._upsert_sync, batch)
+            logger.info(f"Upserted {len(batch)} vectors to local index.")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to upsert vectors to local index: {e}")
+            return False
+
+    async def query_vectors(self, query_vector: List[float], top_k: int = 5, username: str = None, documents: List[str] = None) -> List[Dict[str, Any]]:
+        try:
+            return await asyncio.to_thread(self._query_sync, query_vector, top_k, username, documents)
+        except Exception as e:
+            logger.error(f"Failed to query local index: {e}")
+            return []
+
+    async def fetch(self, ids: List[str], username: str = None) -> Dict[str, Dict[str, Any]]:
+        try:
+            return await asyncio.to_thread(self._fetch_sync, ids, username)
+        except Exception as e:
+            logger.error(f"Failed to fetch vectors from local index: {e}")
+            return {}
+
+    async def delete_vectors_by_chunk_ids(self, chunk_ids: list, username: str = None) -> int:
+        if not chunk_ids:
+            return 0
+        try:
+            await asyncio.to_thread(self._delete_ids_sync, chunk_ids, username)
+            logger.info(f"Deleted {len(chunk_ids)} vectors from local index.")
+            return len(chunk_ids)
+        except Exception as e:
+            logger.error(f"Failed to delete vectors from local index: {e}")
+            return 0
+
+    async def delete_vectors_by_filter(self, filter_dict: Dict[str, Any]) -> bool:
+        try:
+            logger.info(f"Deleting vectors with filter: {filter_dict}")
+            await asyncio.to_thread(self._delete_filter_sync, filter_dict)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete vectors by filter: {e}")
+            return False
+
+    # --- Synchronous implementations (run on worker threads, serialized by the lock) ---
+
+    def _tenant(self, tenant: str) -> _TenantIndex:
+        index = self._tenants.get(tenant)
+        if index is None:
+            slug = re.sub(r"[^A-Za-z0-9_-]+", "_", tenant)[:40]
+            digest = hashlib.sha1(tenant.encode("utf-8")).hexdigest()[:10]
+            index = _TenantIndex(os.path.join(self.root_dir, f"{slug}-{digest}"), self.dimension, self.dtype)
+            index.load()
+            self._resolve_moved_ids(index)
+            self._tenants[tenant] = index
+        return index
+
+    def _resolve_moved_ids(self, index: _TenantIndex):
+        """Keep only the newest copy of ids that `index` shares with already loaded tenants."""
+        for other in self._tenants.values():
+            shared = index.locations.keys() & other.locations.keys()
+            if not shared:
+                continue
+            stale_here = [vector_id for vector_id in shared if index.written(vector_id) < other.written(vector_id)]
+            stale_there = [vector_id for vector_id in shared if index.written(vector_id) >= other.written(vector_id)]
+            index.delete(stale_here)
+            other.delete(stale_there)
+            logger.info(f"Resolved {len(shared)} vector ids present in both {index.path} and {other.path}")
+            self._maybe_compact(other)
+        self._maybe_compact(index)
+
+    def _all_tenants(self) -> List[_TenantIndex]:
+        # Load tenants that exist on disk but have not been touched in this process yet
+        if os.path.isdir(self.root_dir):
+            for name in os.listdir(self.root_dir):
+                manifest = os.path.join(self.root_dir, name, "tenant.txt")
+                if os.path.exists(manifest):
+                    with open(manifest, "r", encoding="utf-8") as f:
+                        self._tenant(f.read())
+        return list(self._tenants.values())
+
+    def _register_tenant(self, tenant: str, index: _TenantIndex):
+        manifest = os.path.join(index.path, "tenant.txt")
+        if not os.path.exists(manifest):
+            with open(manifest, "w", encoding="utf-8") as f:
+                f.write(tenant)
+
+    def _upsert_sync(self, batch: VectorBatch):
+        with self._lock:
+            groups: Dict[str, List[int]] = {}
+            for i, meta in enumerate(batch.metadata):
+                groups.setdefault(meta.get("username") or SHARED_TENANT, []).append(i)
+
+            for tenant, rows in groups.items():
+                index = self._tenant(tenant)
+                ids = [batch.ids[i] for i in rows]
+                # An id moving between tenants must not linger in the old one
+                for other in self._tenants.values():
+                    if other is not index:
+                        other.delete([vector_id for vector_id in ids if vector_id in other.locations])
+                index.append(ids, batch.values[rows], [batch.metadata[i] for i in rows])
+                self._register_tenant(tenant, index)
+                self._maybe_compact(index)
+
+    def _query_sync(self, query_vector, top_k: int, username: Optional[str], documents: Optional[List[str]]) -> List[Dict[str, Any]]:
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        with self._lock:
+            tenants = [self._tenant(username)] if username else self._all_tenants()
+            candidates = []
+            for index in tenants:
+                candidates.extend(index.search(query, top_k, documents))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return [
+            {"id": segment.ids[row], "score": score, "metadata": dict(segment.metadata[row])}
+            for score, segment, row in candidates[:top_k]
+        ]
+
+    def _fetch_sync(self, ids: List[str], username: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        with self._lock:
+            for index in ([self._tenant(username)] if username else self._all_tenants()):
+                for vector_id in ids:
+                    location = index.locations.get(vector_id)
+                    if location:
+                        segment, row = location
+                        found[vector_id] = {
+                            "id": vector_id,
+                            "values": segment.row_values(row).tolist(),
+                            "metadata": dict(segment.metadata[row]),
+                        }
+        return found
+
+    def _delete_ids_sync(self, ids: List[str], username: Optional[str] = None):
+        with self._lock:
+            for index in ([self._tenant(username)] if username else self._all_tenants()):
+                if index.delete([vector_id for vector_id in ids if vector_id in index.locations]):
+                    self._maybe_compact(index)
+
+    def _delete_filter_sync(self, filter_dict: Dict[str, Any]):
+        with self._lock:
+            username = filter_dict.get("username")
+            tenants = [self._tenant(username)] if isinstance(username, str) else self._all_tenants()
+            for index in tenants:
+                doomed = [
+                    vector_id for vector_id, (segment, row) in index.locations.items()
+                    if matches_filter(segment.metadata[row], filter_dict)
+                ]
+                if index.delete(doomed):
+                    self._maybe_compact(index)
+
+    def _maybe_compact(self, index: _TenantIndex):
+        total = index.total_rows
+        if total and (index.dead_rows / total > self.compaction_ratio or len(index.segments) > self.max_segments):
+            index.compact()
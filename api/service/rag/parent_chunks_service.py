@@ -1,14 +1,56 @@
+import asyncio
 import logging
 from typing import List, Dict, Any, Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from lib.config import settings
+from lib.lru_cache import ByteLRUCache
 from service.infrastructure.database_service import database_service
+from service.rag.document_text_service import document_text_service
 
 logger = logging.getLogger(__name__)
 
+
+def _parent_chunk_size(chunk: Dict[str, Any]) -> int:
+    """Approximate in-memory footprint of a parent chunk document."""
+    size = 256  # dict + key overhead
+    for value in chunk.values():
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, dict):
+            size += 64 + sum(len(str(k)) + len(str(v)) for k, v in value.items())
+        else:
+            size += 32
+    return size
+
+
 class ParentChunksService:
     """Service for managing parent chunks using MongoDB."""
     
     def __init__(self):
-        pass
+        # Bulk write tuning: ops per bulk_write / $in delete, and batches in flight
+        self.write_batch_size = settings.parent_chunks_write_batch_size
+        self.write_concurrency = settings.parent_chunks_write_concurrency
+
+        # Per-process LRU of hot parents, so repeat retrievals skip the Mongo round trip
+        self.cache = None
+        if settings.parent_chunks_cache_enabled:
+            self.cache = ByteLRUCache(
+                max_bytes=settings.parent_chunks_cache_memory_mb * 1024 * 1024,
+                sizeof=_parent_chunk_size,
+            )
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Returns hit ratio and bytes held by the parent chunk cache."""
+        if not self.cache:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def invalidate_cache(self, parent_ids: List[str]) -> int:
+        """Drop cached copies of the given parents. Returns how many were cached."""
+        if not self.cache or not parent_ids:
+            return 0
+        return self.cache.invalidate(parent_ids)
 
     async def get_collection(self):
         if database_service.db is None:
@@ -16,69 +58,141 @@ class ParentChunksService:
         return database_service.db.parent_chunks
     
     async def store_parent_chunks(self, parent_chunks: List[Dict[str, Any]]) -> bool:
-        """Store parent chunks in MongoDB."""
+        """
+        Store parent chunks in MongoDB.
+        Upserts are sent as unordered bulk_write batches of `write_batch_size`,
+        with up to `write_concurrency` batches in flight. Returns False if any
+        chunk failed to write (failures are logged per batch).
+        """
         try:
             if not parent_chunks:
                 return True
                 
             collection = await self.get_collection()
             
-            # Use chunks id as _id for deduplication
-            ops = []
-            for chunk in parent_chunks:
-                # Ensure we don't duplicate
-                chunk_data = chunk.copy()
-                chunk_id = chunk_data.get("id")
-                if not chunk_id:
-                    continue
-                    
-                # We can use update_one with upsert=True to avoid duplicates
-                # Or insert_many with ordered=False and ignore duplicate key errors
-                # Given the scale, loop with explicit upsert is safer for now.
-                # For bulk performance, we could use bulk_write, but let's keep it simple for now.
-                
-                # Check if exists first? No, upsert is better.
-                await collection.update_one(
-                    {"id": chunk_id},
-                    {"$set": chunk_data},
-                    upsert=True
-                )
+            # Use chunk id as the upsert key for deduplication
+            chunks = [chunk for chunk in parent_chunks if chunk.get("id")]
+            # Upserts replace content, so any cached copy is stale
+            self.invalidate_cache([chunk["id"] for chunk in chunks])
+            ops = [UpdateOne({"id": chunk["id"]}, {"$set": chunk}, upsert=True) for chunk in chunks]
+            
+            semaphore = asyncio.Semaphore(self.write_concurrency)
+            
+            async def _write_batch(start: int) -> int:
+                batch = ops[start:start + self.write_batch_size]
+                async with semaphore:
+                    try:
+                        await collection.bulk_write(batch, ordered=False)
+                        return 0
+                    except BulkWriteError as bwe:
+                        write_errors = bwe.details.get("writeErrors", [])
+                        failed_ids = [chunks[start + err["index"]]["id"] for err in write_errors[:5]]
+                        logger.error(f"Bulk write partially failed: {len(write_errors)}/{len(batch)} parent chunks not stored (e.g. {failed_ids})")
+                        return len(write_errors)
+                    except Exception as e:
+                        logger.error(f"Bulk write of {len(batch)} parent chunks failed: {e}")
+                        return len(batch)
+            
+            failures = await asyncio.gather(*[
+                _write_batch(i) for i in range(0, len(ops), self.write_batch_size)
+            ])
+            failed = sum(failures)
+            
+            if failed:
+                logger.error(f"Stored {len(ops) - failed}/{len(ops)} parent chunks in MongoDB ({failed} failed)")
+                return False
                 
-            logger.info(f"Stored {len(parent_chunks)} parent chunks in MongoDB")
+            logger.info(f"Stored {len(ops)} parent chunks in MongoDB")
             return True
         except Exception as e:
             logger.error(f"Error storing parent chunks: {e}")
             return False
 
     async def fetch_parent_chunks(self, parent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
-        """Retrieve parent chunks from MongoDB by their IDs."""
+        """
+        Retrieve parent chunks by their IDs.
+        Cached parents are served from memory; only the misses are queried in MongoDB.
+        Parents stored as spans ("offsets" mode) get their text from document_text_service.
+        """
         try:
             if not parent_ids:
                 return {}
+            
+            chunks = {}
+            missing_ids = list(dict.fromkeys(parent_ids))
+            if self.cache:
+                missing_ids = []
+                for parent_id in dict.fromkeys(parent_ids):
+                    cached = self.cache.get(parent_id)
+                    if cached is not None:
+                        chunks[parent_id] = cached
+                    else:
+                        missing_ids.append(parent_id)
+                if not missing_ids:
+                    return await self._hydrate_spans(chunks)
                 
             collection = await self.get_collection()
-            cursor = collection.find({"id": {"$in": parent_ids}})
+            cursor = collection.find({"id": {"$in": missing_ids}})
             
-            chunks = {}
             async for chunk in cursor:
                 chunk.pop("_id", None)
                 chunks[chunk["id"]] = chunk
+                if self.cache:
+                    self.cache.put(chunk["id"], chunk)
             
-            return chunks
+            return await self._hydrate_spans(chunks)
         except Exception as e:
             logger.error(f"Error fetching parent chunks: {e}")
             return {}
     
+    async def _hydrate_spans(self, chunks: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fill in metadata.content for parents stored as (doc_id, start, end) spans.
+        Returns copies; the cached span records stay text-free.
+        """
+        span_ids = [pid for pid, chunk in chunks.items() if "doc_id" in chunk and "content" not in chunk.get("metadata", {})]
+        if not span_ids:
+            return chunks
+        
+        texts = await document_text_service.get_spans(
+            [(chunks[pid]["doc_id"], chunks[pid]["start"], chunks[pid]["end"]) for pid in span_ids]
+        )
+        hydrated = dict(chunks)
+        for pid, text in zip(span_ids, texts):
+            chunk = chunks[pid]
+            hydrated[pid] = {**chunk, "metadata": {**chunk.get("metadata", {}), "content": text}}
+        return hydrated
+    
     async def delete_parent_chunks(self, parent_ids: List[str]) -> int:
-        """Delete parent chunks from MongoDB by their IDs."""
+        """
+        Delete parent chunks from MongoDB by their IDs.
+        Large ID lists are split into `write_batch_size` $in deletes sent concurrently.
+        """
         try:
             if not parent_ids:
                 return 0
-                
+            
+            self.invalidate_cache(parent_ids)
             collection = await self.get_collection()
-            result = await collection.delete_many({"id": {"$in": parent_ids}})
+            semaphore = asyncio.Semaphore(self.write_concurrency)
+            
+            async def _delete_batch(batch: List[str]) -> int:
+                async with semaphore:
+                    try:
+                        result = await collection.delete_many({"id": {"$in": batch}})
+                        return result.deleted_count
+                    except Exception as e:
+                        logger.error(f"Failed to delete batch of {len(batch)} parent chunks: {e}")
+                        return 0
+            
+            counts = await asyncio.gather(*[
+                _delete_batch(parent_ids[i:i + self.write_batch_size])
+                for i in range(0, len(parent_ids), self.write_batch_size)
+            ])
             
-            deleted_count = result.deleted_count
+            deleted_count = sum(counts)
+            # Again after the delete, in case a concurrent fetch re-cached a parent meanwhile
+            self.invalidate_cache(parent_ids)
             logger.info(f"Deleted {deleted_count} parent chunks from MongoDB")
             return deleted_count
         except Exception as e:
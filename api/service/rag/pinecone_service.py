@@ -1,14 +1,18 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from lib.config import settings
+from service.rag.vector_batch import VectorBatch
+from service.rag.vector_store import VectorStore
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import asyncio
+import functools
 import pinecone
 from pinecone import Pinecone, ServerlessSpec
 import os
-import os
 
 logger = logging.getLogger(__name__)
 
-class PineconeService:
+class PineconeService(VectorStore):
     """
     Service for interacting with Pinecone Vector Database.
     """
@@ -18,7 +22,34 @@ class PineconeService:
         self.dimension = settings.embedding_dim
         self.pc = None
         
+        # The Pinecone SDK is synchronous; run its calls on a bounded, dedicated
+        # executor so a slow round trip never blocks the event loop.
+        self.max_workers = settings.pinecone_max_workers
+        self.upsert_concurrency = settings.pinecone_upsert_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        
+        # Tenant isolation: one namespace per user instead of a username metadata filter
+        self.use_namespaces = settings.pinecone_use_namespaces
+        
         # Parent chunks are now managed by ParentChunksService (MongoDB)
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking Pinecone SDK call on the dedicated executor."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pinecone")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def namespace_for(self, username: Optional[str]) -> str:
+        """Namespace holding a user's vectors ("" is Pinecone's default namespace)."""
+        if not self.use_namespaces or not username:
+            return ""
+        return f"user-{username}"
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         
     def initialize(self):
         """Initialize Pinecone client and connect to index."""
@@ -62,10 +93,12 @@ class PineconeService:
             logger.error(f"Failed to initialize Pinecone client: {e}")
             return False
 
-    async def upsert_vectors(self, vectors: List[Dict[str, Any]]) -> bool:
+    async def upsert_vectors(self, vectors: Union[VectorBatch, List[Dict[str, Any]]]) -> bool:
         """
         Upserts vectors to Pinecone.
-        vectors format: [{'id': 'vec1', 'values': [0.1, ...], 'metadata': {...}}, ...]
+        vectors format: a VectorBatch, or [{'id': 'vec1', 'values': [0.1, ...], 'metadata': {...}}, ...]
+        A VectorBatch is serialized one request batch at a time (on the worker thread),
+        and up to `upsert_concurrency` batches are in flight at once.
         """
         if not self.index:
             logger.error("Pinecone index not initialized.")
@@ -73,11 +106,37 @@ class PineconeService:
             
         try:
             # Pinecone upsert accepts list of tuples or dicts
-            # We already have the correct structure, but let's be safe via batching
+            # Split by tenant namespace, then send 100-vector batches concurrently
             batch_size = 100
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i:i + batch_size]
-                self.index.upsert(vectors=batch)
+            semaphore = asyncio.Semaphore(self.upsert_concurrency)
+
+            metadata = vectors.metadata if isinstance(vectors, VectorBatch) else [v.get('metadata', {}) for v in vectors]
+            groups: Dict[str, List[int]] = {}
+            for i, meta in enumerate(metadata):
+                groups.setdefault(self.namespace_for(meta.get('username')), []).append(i)
+
+            def _upsert_batch(group, start: int, namespace: str):
+                if isinstance(group, VectorBatch):
+                    batch = group.slice(start, start + batch_size).to_records()
+                else:
+                    batch = group[start:start + batch_size]
+                self.index.upsert(vectors=batch, namespace=namespace)
+
+            async def _bounded_upsert(group, start: int, namespace: str):
+                async with semaphore:
+                    await self._run(_upsert_batch, group, start, namespace)
+
+            tasks = []
+            for namespace, rows in groups.items():
+                if len(groups) == 1:
+                    group = vectors
+                elif isinstance(vectors, VectorBatch):
+                    group = vectors.take(rows)
+                else:
+                    group = [vectors[i] for i in rows]
+                tasks.extend(_bounded_upsert(group, i, namespace) for i in range(0, len(group), batch_size))
+
+            await asyncio.gather(*tasks)
             
             logger.info(f"Upserted {len(vectors)} vectors to Pinecone.")
             return True
@@ -88,6 +147,9 @@ class PineconeService:
     async def query_vectors(self, query_vector: List[float], top_k: int = 5, username: str = None, documents: List[str] = None) -> List[Dict[str, Any]]:
         """
         Query Pinecone index.
+        With namespaces enabled the user's namespace scopes the search, so the
+        metadata filter only selects documents and latency does not grow with
+        other tenants' data.
         """
         if not self.index:
             logger.warning("Pinecone index not initialized.")
@@ -96,7 +158,7 @@ class PineconeService:
         try:
             # Build filter
             filter_dict = {}
-            if username:
+            if username and not self.use_namespaces:
                 filter_dict['username'] = username
             if documents:
                 filter_dict['source_filename'] = {"$in": documents}
@@ -104,11 +166,13 @@ class PineconeService:
             # If no filters, pass None (Pinecone client handles empty dict, but explicit is better)
             metadata_filter = filter_dict if filter_dict else None
 
-            results = self.index.query(
+            results = await self._run(
+                self.index.query,
                 vector=query_vector,
                 top_k=top_k,
                 include_metadata=True,
-                filter=metadata_filter
+                filter=metadata_filter,
+                namespace=self.namespace_for(username)
             )
             
             # Identify matches
@@ -129,39 +193,31 @@ class PineconeService:
             logger.error(f"Failed to query Pinecone: {e}")
             return []
 
-    async def get_parent_ids_from_chunks(self, chunk_ids: list) -> list:
-        """Fetch parent IDs from chunk vectors before deletion."""
-        if not self.index:
-            return []
-        
-        if not chunk_ids:
-            return []
-        
+    async def fetch(self, ids: List[str], username: str = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch vectors (values and metadata) by ID from the user's namespace."""
+        if not self.index or not ids:
+            return {}
+
         try:
-            parent_ids = set()
-            # Fetch vectors in batches to get their metadata
+            found = {}
             batch_size = 100
-            for i in range(0, len(chunk_ids), batch_size):
-                batch = chunk_ids[i:i + batch_size]
-                
-                # Fetch vectors by ID
-                fetch_response = self.index.fetch(ids=batch)
-                
-                # Extract parent_id from metadata
+            for i in range(0, len(ids), batch_size):
+                fetch_response = await self._run(
+                    self.index.fetch, ids=ids[i:i + batch_size], namespace=self.namespace_for(username)
+                )
                 for vector_id, vector_data in fetch_response.get('vectors', {}).items():
-                    metadata = vector_data.get('metadata', {})
-                    parent_id = metadata.get('parent_id')
-                    if parent_id:
-                        parent_ids.add(parent_id)
-            
-            logger.info(f"Found {len(parent_ids)} unique parent IDs from {len(chunk_ids)} chunks")
-            return list(parent_ids)
+                    found[vector_id] = {
+                        'id': vector_id,
+                        'values': vector_data.get('values', []),
+                        'metadata': vector_data.get('metadata', {})
+                    }
+            return found
         except Exception as e:
-            logger.error(f"Failed to fetch parent IDs from Pinecone: {e}")
-            return []
+            logger.error(f"Failed to fetch vectors from Pinecone: {e}")
+            return {}
 
-    async def delete_vectors_by_chunk_ids(self, chunk_ids: list) -> int:
-        """Delete vectors by their IDs."""
+    async def delete_vectors_by_chunk_ids(self, chunk_ids: list, username: str = None) -> int:
+        """Delete vectors by their IDs from the user's namespace."""
         if not self.index:
             return 0
         
@@ -172,9 +228,11 @@ class PineconeService:
             # Pinecone delete by ids
             # Batching deletes if necessary (Pinecone handles large lists well, but 1000 limit is safe)
             batch_size = 1000
-            for i in range(0, len(chunk_ids), batch_size):
-                batch = chunk_ids[i:i + batch_size]
-                self.index.delete(ids=batch)
+            namespace = self.namespace_for(username)
+            await asyncio.gather(*[
+                self._run(self.index.delete, ids=chunk_ids[i:i + batch_size], namespace=namespace)
+                for i in range(0, len(chunk_ids), batch_size)
+            ])
                 
             logger.info(f"Deleted {len(chunk_ids)} vectors from Pinecone.")
             return len(chunk_ids)
@@ -183,13 +241,17 @@ class PineconeService:
             return 0
 
     async def delete_vectors_by_filter(self, filter_dict: Dict[str, Any]) -> bool:
-        """Delete vectors using a metadata filter."""
+        """
+        Delete vectors using a metadata filter.
+        A plain 'username' condition selects the user's namespace.
+        """
         if not self.index:
             return False
             
         try:
             logger.info(f"Deleting vectors with filter: {filter_dict}")
-            self.index.delete(filter=filter_dict)
+            username = filter_dict.get('username') if isinstance(filter_dict.get('username'), str) else None
+            await self._run(self.index.delete, filter=filter_dict, namespace=self.namespace_for(username))
             return True
         except Exception as e:
             logger.error(f"Failed to delete vectors by filter: {e}")
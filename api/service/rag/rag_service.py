@@ -1,17 +1,155 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Optional, Awaitable
 from service.rag.gemini_service import gemini_service
 from service.rag.groq_service import groq_service
 from service.rag.embedding_service import embedding_service
-from service.rag.pinecone_service import pinecone_service
+from service.rag.vector_store_service import vector_store_service
 from service.rag.parent_chunks_service import parent_chunks_service
+from service.rag.document_text_service import document_text_service
 from service.rag.rerank_service import rerank_service
+from service.rag.vector_batch import VectorBatch
+from service.rag.token_chunker import TokenChunker
+from service.rag.section_boundaries import SectionBoundaryScanner, MARKER_PREFIX_CHARS
+from lib.config import settings
+import numpy as np
 import logging
+import hashlib
 import uuid
 import re
+import zlib
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 logger = logging.getLogger(__name__)
 
+class IndexRun:
+    """
+    One document's indexing state, split into the steps indexing_module runs per window:
+    next_window() (read and chunk), embed(), store(), then finish() or rollback().
+    The batch upload pipeline drives the same steps from separate stages; steps for
+    one run must be called in window order.
+    """
+
+    def __init__(self, service: "RAGService", document: Dict[str, Any]):
+        self.service = service
+        self.document = document
+        self.title = document.get("title", "")
+        self.username = document.get("metadata", {}).get("username")
+        self.previous = document.get("previous") or {}
+        self.previous_chunk_ids = set(self.previous.get("chunk_ids", []))
+        self.previous_parent_ids = set(self.previous.get("parent_ids", []))
+        self.chunk_ids: List[str] = []
+        self.parent_ids: List[str] = []
+        # IDs this run created (as opposed to reused); only these are rolled back on failure
+        self.written_chunk_ids: List[str] = []
+        self.written_parent_ids: List[str] = []
+        # Offsets mode: records that move the previous version's parents onto this run's text.
+        # Returned as "retarget_parents" and only written once the new version is recorded,
+        # so a rollback leaves the previous version exactly as it was
+        self.retargeted_parents: List[Dict[str, Any]] = []
+        self.reused_chunks = 0
+        self._chunks_read = 0
+        
+        # Prepare metadata for vectors, excluding description to save space
+        self.clean_metadata = document.get("metadata", {}).copy()
+        self.clean_metadata.pop('description', None)
+        
+        text_stream = document.get("content_stream") or [document["content"]]
+        self.text_doc_id = None
+        self.text_writer = None
+        if service.parent_storage_mode == "offsets":
+            # Spans are offsets into the stored text, so chunk exactly what gets stored
+            self.text_doc_id = f"doc_{uuid.uuid4().hex}"
+            self.text_writer = document_text_service.open_writer(self.text_doc_id, username=self.username)
+            text_stream = self.text_writer.tee(document_text_service.iter_normalized(text_stream))
+        self._groups = service.iter_small_to_big(
+            text_stream, self.title, doc_key=document.get("doc_key"),
+            section_markers=document.get("section_markers", False)
+        )
+
+    @staticmethod
+    def empty_result() -> Dict[str, Any]:
+        return {"chunk_ids": [], "parent_ids": [], "text_doc_id": None}
+
+    def read_window(self) -> Optional[Dict[str, Any]]:
+        """Read and chunk the next window (blocking). None once the document is exhausted."""
+        groups = self.service._next_index_window(self._groups)
+        if not groups:
+            return None
+        parent_chunks = [parent for parent, _ in groups]
+        child_chunks = [child for _, children in groups for child in children]
+        index_offset = self._chunks_read
+        self._chunks_read += len(child_chunks)
+        if self.text_doc_id:
+            self.retargeted_parents.extend(self.service._build_parent_records(
+                [p for p in parent_chunks if p["id"] in self.previous_parent_ids], self.text_doc_id
+            ))
+        return {
+            "parents": parent_chunks,
+            # Parents of the previous version are already stored (and retargeted on finish)
+            "parents_to_store": [p for p in parent_chunks if p["id"] not in self.previous_parent_ids],
+            # Unchanged chunks of the previous version are already embedded and stored
+            "new_children": [c for c in child_chunks if c["id"] not in self.previous_chunk_ids],
+            "reused_ids": [c["id"] for c in child_chunks if c["id"] in self.previous_chunk_ids],
+            "index_offset": index_offset,
+            "text_piece": self.text_writer.take_pending() if self.text_writer else None,
+        }
+
+    async def next_window(self) -> Optional[Dict[str, Any]]:
+        # Reading the stream and chunking are synchronous; keep them off the event loop
+        return await asyncio.to_thread(self.read_window)
+
+    async def embed(self, window: Dict[str, Any]) -> VectorBatch:
+        vectors = await self.service._generate_embeddings_batch(
+            window["new_children"], self.clean_metadata, self.document, index_offset=window["index_offset"]
+        )
+        if window["new_children"] and not vectors:
+            raise Exception("No embeddings were generated successfully")
+        return vectors
+
+    def store(self, window: Dict[str, Any], vectors: VectorBatch) -> Awaitable[None]:
+        """
+        Record the window's IDs (so a later rollback covers them) and return the
+        coroutine that writes it.
+        """
+        self.reused_chunks += len(window["reused_ids"])
+        self.chunk_ids.extend(window["reused_ids"])
+        self.chunk_ids.extend(vectors.ids)
+        self.parent_ids.extend(p["id"] for p in window["parents"])
+        self.written_chunk_ids.extend(vectors.ids)
+        self.written_parent_ids.extend(p["id"] for p in window["parents_to_store"])
+        return self.service._store_index_window(
+            vectors, window["parents_to_store"], self.text_doc_id, self.text_writer, window["text_piece"]
+        )
+
+    async def finish(self) -> Dict[str, Any]:
+        """Flush the document text and return the index result (rolling back if nothing was indexed)."""
+        if self.text_writer:
+            await self.text_writer.write(self.text_writer.take_pending())
+            await self.text_writer.close()
+        
+        if not self.chunk_ids:
+            logger.error("No embeddings were generated successfully")
+            await self.rollback()
+            return self.empty_result()
+        
+        logger.info(f"Successfully indexed {len(self.chunk_ids)} child chunks and {len(self.parent_ids)} parent chunks for document '{self.title or 'Unknown'}'")
+        if self.previous:
+            logger.info(f"Incremental re-index: reused {self.reused_chunks}/{len(self.chunk_ids)} child chunks, embedded {len(self.written_chunk_ids)}")
+        
+        # Return both child chunk IDs and parent chunk IDs for better tracking
+        return {
+            "chunk_ids": self.chunk_ids,
+            "parent_ids": self.parent_ids,
+            "text_doc_id": self.text_doc_id,
+            "reused_chunks": self.reused_chunks,
+            "retarget_parents": self.retargeted_parents
+        }
+
+    async def rollback(self):
+        await self.service._rollback_partial_index(
+            self.written_chunk_ids, self.written_parent_ids, self.text_doc_id, self.username
+        )
+
+
 class RAGService:
     """
     Implements the core modules of a Modular RAG system, based on advanced
@@ -22,10 +160,44 @@ class RAGService:
         self.child_chunk_size = 300  # Smaller chunks for better retrieval accuracy
         self.parent_chunk_size = 1000 # Larger parent chunks for better context
         self.chunk_overlap = 100
+        # "fixed": parents every (size - overlap) chars; "content": content-defined cut points,
+        # so an edit only changes the parents around it (pairs with incremental re-indexing)
+        self.parent_boundary_mode = settings.parent_boundary_mode
+        if settings.incremental_indexing and self.parent_boundary_mode == "fixed":
+            logger.warning("INCREMENTAL_INDEXING is on with PARENT_BOUNDARY_MODE=fixed: an insert shifts every "
+                           "later parent, so re-uploads reuse almost nothing. Use PARENT_BOUNDARY_MODE=content.")
+        # Cut a parent early at a heading or code block start (markers kept by the Markdown
+        # extractor; only for documents it produced), unless that would leave it under
+        # min_section_parent_size chars
+        self.parent_section_boundaries = settings.parent_section_boundaries
+        self.min_section_parent_size = self.parent_chunk_size // 4
+        
+        # "chars" keeps regex sentences over 20 chars as children; "tokens" merges and splits
+        # sentences by embedding-model tokens (fewer, denser vectors; nothing truncated)
+        self.chunking_mode = settings.chunking_mode
+        self.token_chunker = None
+        if self.chunking_mode == "tokens":
+            self.token_chunker = TokenChunker(
+                tokenizer_provider=embedding_service.get_length_tokenizer,
+                target_tokens=settings.chunk_target_tokens,
+                max_tokens=settings.chunk_max_tokens,
+                min_tokens=settings.chunk_min_tokens,
+            )
         
         # Async processing configuration
         self.max_concurrent_embeddings = 10  # Process up to 10 embeddings concurrently (Increased for speed)
         self.batch_size = 50  # Process embeddings in larger batches (Increased for speed)
+        
+        # Child chunks embedded and stored per indexing window (bounds memory for large documents)
+        self.index_window_chunks = settings.index_window_chunks
+        
+        # "full" stores child text + document metadata on every vector; "slim" stores only
+        # compact keys and resolves child text from the parent chunk store when needed
+        self.vector_metadata_mode = settings.vector_metadata_mode
+        
+        # "full" stores parent text on every parent chunk; "offsets" stores the document text
+        # once (compressed) and parents as (doc_id, start, end) spans into it
+        self.parent_storage_mode = settings.parent_storage_mode
 
     async def indexing_module(self, document: Dict[str, Any]) -> List[str]:
         """
@@ -36,52 +208,114 @@ class RAGService:
         Concept from Paper: Chunk Optimization -> Small-to-Big
         
         OPTIMIZED: Uses async batch processing for embeddings to significantly improve speed.
+        STREAMING: The document is chunked, embedded and stored in windows of at most
+        `index_window_chunks` child chunks, so peak memory does not grow with document size.
+        Pass `content_stream` (an iterable of text pieces) instead of `content` to index
+        text that never needs to be held in memory as a whole.
+        INCREMENTAL: With a `doc_key`, chunk IDs are content-addressed. If `previous`
+        ({'chunk_ids', 'parent_ids'} of the version being replaced) is given, chunks whose
+        IDs already exist are reused instead of being embedded and upserted again.
+        PROGRESS: An optional async `on_progress(chunks_indexed)` is awaited after each window.
         """
+        run = None
+        pending_store = None
         try:
-            # Prepare metadata for vectors, excluding description to save space
-            clean_metadata = document.get("metadata", {}).copy()
-            clean_metadata.pop('description', None)
-            
-            # 1. Chunk the document into parent and child chunks
-            parent_chunks, child_chunks = self._chunk_document_small_to_big(
-                document["content"], document.get("title", "")
-            )
-            
-            logger.info(f"Created {len(parent_chunks)} parent chunks and {len(child_chunks)} child chunks")
-            
-            # 2. Generate embeddings for child chunks using async batch processing
-            vectors = await self._generate_embeddings_batch(child_chunks, clean_metadata, document)
+            run = self.start_index_run(document)
             
-            if not vectors:
-                logger.error("No embeddings were generated successfully")
-                return {"chunk_ids": [], "parent_ids": []}
-            
-            # 3. Store child vectors and parent chunks concurrently
-            # We use gather to run them in parallel for speed
-            results = await asyncio.gather(
-                pinecone_service.upsert_vectors(vectors),
-                parent_chunks_service.store_parent_chunks(parent_chunks),
-                return_exceptions=True
-            )
-            
-            # Check for failures in storage
-            for i, result in enumerate(results):
-                if isinstance(result, Exception) or result is False:
-                    error_msg = f"Failed to store {'vectors' if i == 0 else 'parent chunks'}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
+            # 1. Chunk the document into parent and child chunks, one window at a time
+            while True:
+                window = await run.next_window()
+                if window is None:
+                    break
+                
+                # 2. Generate embeddings for child chunks using async batch processing
+                vectors = await run.embed(window)
+                
+                # 3. Store child vectors and parent chunks concurrently. The previous window's
+                # writes must finish first; they overlapped with this window's embedding.
+                if pending_store:
+                    await pending_store
+                pending_store = asyncio.create_task(run.store(window, vectors))
+                if document.get("on_progress"):
+                    await document["on_progress"](len(run.chunk_ids))
             
-            logger.info(f"Successfully indexed {len(vectors)} child chunks for document '{document.get('title', 'Unknown')}'")
-            
-            # Return both child chunk IDs and parent chunk IDs for better tracking
-            return {
-                "chunk_ids": [v["id"] for v in vectors],
-                "parent_ids": [p["id"] for p in parent_chunks]
-            }
+            if pending_store:
+                await pending_store
+                pending_store = None
+            return await run.finish()
             
         except Exception as e:
             logger.error(f"Error in indexing module: {e}")
-            return {"chunk_ids": [], "parent_ids": []}
+            if pending_store:
+                await asyncio.gather(pending_store, return_exceptions=True)
+            # Earlier windows may already be stored; don't leave them orphaned
+            if run:
+                await run.rollback()
+            return IndexRun.empty_result()
+
+    def start_index_run(self, document: Dict[str, Any]) -> "IndexRun":
+        """Per-document indexing state for callers that drive the window steps themselves."""
+        return IndexRun(self, document)
+
+    def _next_index_window(self, groups: Iterator[Tuple[Dict, List[Dict]]]) -> List[Tuple[Dict, List[Dict]]]:
+        """Pull (parent, children) groups until the window holds `index_window_chunks` children (or parents)."""
+        window = []
+        child_count = 0
+        for parent, children in groups:
+            window.append((parent, children))
+            child_count += len(children)
+            if child_count >= self.index_window_chunks or len(window) >= self.index_window_chunks:
+                break
+        return window
+
+    async def _store_index_window(self, vectors: VectorBatch, parent_chunks: List[Dict], text_doc_id: str = None, text_writer=None, text_piece: str = None):
+        """
+        Write one indexing window: vectors, parent chunks and (offsets mode) document text.
+        The text, including its partial last block, is stored first, so the window's
+        parent spans resolve as soon as they are visible.
+        """
+        if text_writer:
+            try:
+                await text_writer.write(text_piece or "", commit=True)
+            except Exception as e:
+                logger.error(f"Failed to store document text: {e}")
+                raise Exception("Failed to store document text")
+        
+        storage_steps = {
+            "parent chunks": parent_chunks_service.store_parent_chunks(
+                self._build_parent_records(parent_chunks, text_doc_id)
+            ),
+        }
+        if len(vectors):
+            storage_steps["vectors"] = vector_store_service.upsert_vectors(vectors)
+        results = await asyncio.gather(*storage_steps.values(), return_exceptions=True)
+        
+        # Check for failures in storage
+        for step, result in zip(storage_steps, results):
+            if isinstance(result, Exception) or result is False:
+                error_msg = f"Failed to store {step}"
+                logger.error(error_msg)
+                raise Exception(error_msg)
+
+    async def _rollback_partial_index(self, chunk_ids: List[str], parent_ids: List[str], text_doc_id: str = None, username: str = None):
+        """Best-effort removal of whatever an aborted indexing run already stored."""
+        try:
+            if chunk_ids:
+                await vector_store_service.delete_vectors_by_chunk_ids(chunk_ids, username=username)
+            if parent_ids:
+                await parent_chunks_service.delete_parent_chunks(parent_ids)
+            if text_doc_id:
+                await document_text_service.delete_texts([text_doc_id])
+            if chunk_ids or parent_ids:
+                logger.info(f"Rolled back partial index: {len(chunk_ids)} vectors, {len(parent_ids)} parent chunks")
+        except Exception as e:
+            logger.error(f"Failed to roll back partial index: {e}")
+
+    def get_chunking_stats(self) -> Dict[str, Any]:
+        """Returns the chunking mode and, in token mode, chunk size statistics."""
+        if not self.token_chunker:
+            return {"mode": self.chunking_mode}
+        return {"mode": self.chunking_mode, **self.token_chunker.stats()}
 
     async def pre_retrieval_module(self, query: str, api_keys: Dict[str, str] = {}) -> str:
         """
@@ -131,7 +365,7 @@ class RAGService:
 
             # 1. Retrieve more child chunks for better coverage (we'll filter later)
             retrieval_size = min(top_k * 2, 50)  # Cast wider net, but cap at reasonable size
-            child_results = await pinecone_service.query_vectors(query_embedding, retrieval_size, username=username, documents=documents)
+            child_results = await vector_store_service.query_vectors(query_embedding, retrieval_size, username=username, documents=documents)
             
             if not child_results:
                 if username:
@@ -166,6 +400,18 @@ class RAGService:
             
             logger.info(f"Filtered {len(child_results)} to {len(filtered_results)} chunks above similarity threshold")
             
+            # Slim vectors carry no text: fetch candidate parents once and slice child text from them
+            prefetched_parents = None
+            if any('content' not in res.get('metadata', {}) for res in filtered_results):
+                candidate_parent_ids = list(dict.fromkeys(
+                    res['metadata']['parent_id'] for res in filtered_results if 'parent_id' in res.get('metadata', {})
+                ))
+                prefetched_parents = await parent_chunks_service.fetch_parent_chunks(candidate_parent_ids)
+                for res in filtered_results:
+                    metadata = res.get('metadata', {})
+                    if 'content' not in metadata:
+                        metadata['content'] = self._resolve_child_content(metadata, prefetched_parents)
+
             # 3. Get unique parent chunks with diversity filtering
             parent_ids = []
             parent_scores = {}
@@ -194,7 +440,10 @@ class RAGService:
             logger.info(f"Selected {len(parent_ids)} diverse parent chunks from {len(filtered_results)} candidates")
 
             # 4. Fetch the full PARENT chunks from the document store
-            parent_chunks = await parent_chunks_service.fetch_parent_chunks(parent_ids)
+            if prefetched_parents is not None:
+                parent_chunks = {pid: prefetched_parents[pid] for pid in parent_ids if pid in prefetched_parents}
+            else:
+                parent_chunks = await parent_chunks_service.fetch_parent_chunks(parent_ids)
             
             if not parent_chunks:
                 logger.warning("No parent chunks found in document store")
@@ -246,9 +495,9 @@ class RAGService:
             
             logger.info(f"Reranking {len(chunks)} chunks, will keep up to {keep_count} after quality filtering")
             
-            # Use FlashRank to rerank documents locally
+            # Use FlashRank to rerank documents locally (off the event loop via the inference pool)
             # This implements the Post-Retrieval Mechanism (Section 4.1) from Modular RAG docs
-            reranked_chunks = rerank_service.rerank_documents(query=query, documents=chunks, top_n=keep_count)
+            reranked_chunks = await rerank_service.rerank_documents_async(query=query, documents=chunks, top_n=keep_count)
             
             # Apply relevance scoring and filtering
             # Note: FlashRank provides normalized scores
@@ -557,21 +806,80 @@ Answer:
         
         return text.strip()
 
-    async def _generate_embeddings_batch(self, child_chunks: List[Dict], clean_metadata: Dict, document: Dict) -> List[Dict]:
+    # Keys kept on every vector in "slim" mode: tenant, document selection, parent link and span
+    SLIM_METADATA_KEYS = ("username", "source_filename")
+
+    def _build_vector_metadata(self, child_chunk: Dict, chunk_index: int, clean_metadata: Dict, document: Dict) -> Dict[str, Any]:
+        """
+        Metadata stored alongside a child vector.
+        Slim mode drops the child text and document metadata; the text can be recovered
+        from the parent chunk via the (child_start, child_end) span.
+        """
+        if self.vector_metadata_mode == "slim":
+            metadata = {key: clean_metadata[key] for key in self.SLIM_METADATA_KEYS if key in clean_metadata}
+            metadata.update({
+                "parent_id": child_chunk["parent_id"],
+                "chunk_index": chunk_index,
+                "child_start": child_chunk["start"],
+                "child_end": child_chunk["end"],
+            })
+            return metadata
+
+        return {
+            "content": child_chunk["content"],
+            "parent_id": child_chunk["parent_id"],
+            "title": document.get("title", ""),
+            "chunk_index": chunk_index,
+            "is_fallback": False,
+            **clean_metadata
+        }
+
+    @staticmethod
+    def _resolve_child_content(metadata: Dict[str, Any], parent_chunks: Dict[str, Dict[str, Any]]) -> str:
+        """Child text for a vector match: stored content, or a slice of its parent chunk (slim mode)."""
+        if 'content' in metadata:
+            return metadata['content']
+        parent = parent_chunks.get(metadata.get('parent_id'))
+        if not parent or 'child_start' not in metadata:
+            return ''
+        parent_content = parent.get('metadata', {}).get('content', '')
+        return parent_content[int(metadata['child_start']):int(metadata['child_end'])]
+
+    def _build_parent_records(self, parent_chunks: List[Dict], text_doc_id: str = None) -> List[Dict[str, Any]]:
+        """
+        Parent chunk documents as stored in MongoDB.
+        With a text_doc_id ("offsets" mode) parents carry only their span into the
+        stored document text; the content is filled back in on fetch.
+        """
+        if not text_doc_id:
+            return [{"id": p["id"], "metadata": p["metadata"]} for p in parent_chunks]
+        return [
+            {
+                "id": p["id"],
+                "doc_id": text_doc_id,
+                "start": p["start"],
+                "end": p["end"],
+                "metadata": {"title": p["metadata"].get("title", "")},
+            }
+            for p in parent_chunks
+        ]
+
+    async def _generate_embeddings_batch(self, child_chunks: List[Dict], clean_metadata: Dict, document: Dict, index_offset: int = 0) -> VectorBatch:
         """
         Generate embeddings for child chunks using async batch processing for improved performance.
-        Uses the new batch embedding method for maximum efficiency.
+        Embeddings stay in a single float32 matrix (VectorBatch) until the vector-store boundary.
         
         Args:
             child_chunks: List of child chunk dictionaries
             clean_metadata: Cleaned metadata for vectors
             document: Original document dictionary
+            index_offset: chunk_index of the first child (when indexing in windows)
             
         Returns:
-            List of vector dictionaries ready for Pinecone upsert
+            VectorBatch ready for Pinecone upsert
         """
         if not child_chunks:
-            return []
+            return VectorBatch([], np.zeros((0, embedding_service.output_dim), dtype=np.float32), [])
             
         logger.info(f"Starting batch embedding generation for {len(child_chunks)} chunks")
         
@@ -580,31 +888,18 @@ Answer:
         
         # Generate all embeddings in one batch call for maximum efficiency
         try:
-            embeddings = await embedding_service.get_embeddings_batch(texts)
+            embeddings = await embedding_service.get_embeddings_matrix(texts)
             
-            if not embeddings or len(embeddings) != len(child_chunks):
-                logger.error(f"Batch embedding failed: expected {len(child_chunks)}, got {len(embeddings) if embeddings else 0}")
+            if embeddings is None or embeddings.shape[0] != len(child_chunks):
+                logger.error(f"Batch embedding failed: expected {len(child_chunks)}, got {0 if embeddings is None else embeddings.shape[0]}")
                 # Fallback to individual processing
-                return await self._generate_embeddings_individual_fallback(child_chunks, clean_metadata, document)
+                return await self._generate_embeddings_individual_fallback(child_chunks, clean_metadata, document, index_offset)
             
-            # Create vectors from successful embeddings
-            vectors = []
-            for i, (child_chunk, embedding) in enumerate(zip(child_chunks, embeddings)):
-                if embedding and len(embedding) > 0:
-                    vectors.append({
-                        "id": child_chunk["id"],
-                        "values": embedding,
-                        "metadata": {
-                            "content": child_chunk["content"],
-                            "parent_id": child_chunk["parent_id"],
-                            "title": document.get("title", ""),
-                            "chunk_index": i,
-                            "is_fallback": False,
-                            **clean_metadata
-                        }
-                    })
-                else:
-                    logger.warning(f"Empty embedding for chunk {i + 1}")
+            metadata = [
+                self._build_vector_metadata(child_chunk, i, clean_metadata, document)
+                for i, child_chunk in enumerate(child_chunks, start=index_offset)
+            ]
+            vectors = VectorBatch([chunk["id"] for chunk in child_chunks], embeddings, metadata)
             
             logger.info(f"Successfully generated {len(vectors)} embeddings out of {len(child_chunks)} chunks using batch processing")
             return vectors
@@ -612,9 +907,9 @@ Answer:
         except Exception as e:
             logger.error(f"Batch embedding generation failed: {e}")
             # Fallback to individual processing
-            return await self._generate_embeddings_individual_fallback(child_chunks, clean_metadata, document)
+            return await self._generate_embeddings_individual_fallback(child_chunks, clean_metadata, document, index_offset)
 
-    async def _generate_embeddings_individual_fallback(self, child_chunks: List[Dict], clean_metadata: Dict, document: Dict) -> List[Dict]:
+    async def _generate_embeddings_individual_fallback(self, child_chunks: List[Dict], clean_metadata: Dict, document: Dict, index_offset: int = 0) -> VectorBatch:
         """
         Fallback method for individual embedding generation when batch processing fails.
         """
@@ -627,7 +922,7 @@ Answer:
         
         # Create tasks for concurrent embedding generation
         tasks = []
-        for i, child_chunk in enumerate(child_chunks):
+        for i, child_chunk in enumerate(child_chunks, start=index_offset):
             task = self._generate_single_embedding(
                 semaphore, child_chunk, i, clean_metadata, document
             )
@@ -650,7 +945,7 @@ Answer:
             logger.warning(f"Failed to generate embeddings for {failed_embeddings}/{len(child_chunks)} chunks")
         
         logger.info(f"Fallback processing generated {len(vectors)} embeddings")
-        return vectors
+        return VectorBatch.from_records(vectors, embedding_service.output_dim)
 
     async def _generate_single_embedding(self, semaphore: asyncio.Semaphore, child_chunk: Dict, 
                                        chunk_index: int, clean_metadata: Dict, document: Dict) -> Dict:
@@ -675,14 +970,7 @@ Answer:
                     return {
                         "id": child_chunk["id"],
                         "values": embedding,
-                        "metadata": {
-                            "content": child_chunk["content"],
-                            "parent_id": child_chunk["parent_id"],
-                            "title": document.get("title", ""),
-                            "chunk_index": chunk_index,
-                            "is_fallback": False,
-                            **clean_metadata
-                        }
+                        "metadata": self._build_vector_metadata(child_chunk, chunk_index, clean_metadata, document)
                     }
                 else:
                     logger.warning(f"Failed to get embedding for chunk {chunk_index + 1}")
@@ -692,59 +980,202 @@ Answer:
                 logger.error(f"Error generating embedding for chunk {chunk_index + 1}: {e}")
                 return None
 
-    def _chunk_document_small_to_big(self, content: str, title: str) -> Tuple[List[Dict], List[Dict]]:
+    def _chunk_document_small_to_big(self, content: str, title: str, doc_key: str = None) -> Tuple[List[Dict], List[Dict]]:
         """
         Private helper for the "Small-to-Big" chunking strategy.
         - Parent Chunks: Larger, overlapping segments for context.
         - Child Chunks: Smaller sentences within each parent chunk for retrieval.
         
-        OPTIMIZED: Improved sentence splitting and chunk creation for better performance.
+        Materializes iter_small_to_big() for callers that want complete lists.
         """
         parent_chunks = []
         child_chunks = []
+        for parent, children in self.iter_small_to_big([content], title, doc_key=doc_key):
+            parent_chunks.append(parent)
+            child_chunks.extend(children)
+            
+        logger.info(f"Chunking complete: {len(parent_chunks)} parent chunks, {len(child_chunks)} child chunks")
+        return parent_chunks, child_chunks
+
+    def iter_small_to_big(self, text_stream: Iterable[str], title: str, doc_key: str = None, section_markers: bool = False) -> Iterator[Tuple[Dict, List[Dict]]]:
+        """
+        Streaming "Small-to-Big" chunker: yields (parent_chunk, child_chunks) groups
+        as soon as each parent window of text has arrived from `text_stream`.
+        Only the current parent window plus one stream piece is held in memory, and
+        the chunks are the same as chunking the concatenated stream in one go.
+        Parent "start"/"end" are absolute offsets of the stripped parent in the document.
+        With section boundaries on and `section_markers` (text from the Markdown extractor),
+        a parent that would run into a new section (a heading or code block start) ends
+        there instead, and the next parent starts at it. Other text is never cut at lines
+        that merely look like Markdown.
         
+        With a `doc_key`, chunk IDs are derived from it and the chunk content, so
+        re-chunking unchanged text yields the same IDs; otherwise IDs are random.
+        """
         # Pre-compile regex for better performance
         sentence_pattern = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s+')
+        step = self.parent_chunk_size - self.chunk_overlap
+        content_defined = self.parent_boundary_mode == "content"
+        # Text needed ahead of the window start before a parent can be cut
+        lookahead = self.chunk_overlap + step * 5 // 4 if content_defined else self.parent_chunk_size
+        sections = SectionBoundaryScanner() if self.parent_section_boundaries and section_markers else None
+        if sections:
+            lookahead += MARKER_PREFIX_CHARS
+        occurrences: Dict[str, int] = {}
         
-        # Create parent chunks with optimized processing
-        start = 0
-        parent_index = 0
+        pieces = iter(text_stream)
+        buffer = ""
+        buffer_start = 0  # Document offset of buffer[0]
+        exhausted = False
+        start = 0     # Start of the current parent window
+        boundary = 0  # Content-defined mode: end of the previous parent (before overlap)
         
-        while start < len(content):
-            end = start + self.parent_chunk_size
-            parent_content = content[start:end].strip()
+        while True:
+            # Read until the parent window is complete
+            while not exhausted and buffer_start + len(buffer) < start + lookahead:
+                piece = next(pieces, None)
+                if piece is None:
+                    exhausted = True
+                else:
+                    buffer += piece
             
-            if parent_content:
-                parent_id = f"parent_{uuid.uuid4().hex}"
-                parent_chunks.append({
-                    "id": parent_id,
-                    "metadata": {"content": parent_content, "title": title}
-                })
-                
-                # Create child chunks from this parent chunk using optimized sentence splitting
-                sentences = sentence_pattern.split(parent_content)
-                
-                # Filter and process sentences more efficiently
-                valid_sentences = [
-                    sentence.strip() 
-                    for sentence in sentences 
-                    if len(sentence.strip()) > 20  # Filter out very short sentences
-                ]
-                
-                # Create child chunks for valid sentences
-                for sentence in valid_sentences:
-                    child_chunks.append({
-                        "id": f"child_{uuid.uuid4().hex}",
-                        "content": sentence,
-                        "parent_id": parent_id
-                    })
-                
-                parent_index += 1
+            buffer_end = buffer_start + len(buffer)
+            if content_defined:
+                if boundary >= buffer_end:
+                    break
+                end = boundary = self._next_content_boundary(buffer, buffer_start, boundary, step, exhausted)
+                next_start = max(0, boundary - self.chunk_overlap)
+            else:
+                if start >= buffer_end:
+                    break
+                end = min(start + self.parent_chunk_size, buffer_end)
+                next_start = start + step
+            
+            if sections:
+                sections.feed(buffer, buffer_start, exhausted)
+                section_start = sections.next_marker(start + self.min_section_parent_size, end)
+                if section_start is not None:
+                    # No overlap across a section start
+                    end = next_start = section_start
+                    if content_defined:
+                        boundary = section_start
+            raw_content = buffer[start - buffer_start:end - buffer_start]
+            
+            group = self._make_parent_group(raw_content, start, title, sentence_pattern, doc_key, occurrences)
+            if group:
+                yield group
+            
+            start = next_start
+            # Drop consumed text; only when it is most of the buffer, to keep trimming O(n)
+            consumed = start - buffer_start
+            if consumed > 0 and consumed * 2 >= len(buffer):
+                buffer = buffer[consumed:]
+                buffer_start = start
 
-            start += self.parent_chunk_size - self.chunk_overlap
+    # Content-defined boundaries: a word start whose preceding 16 chars hash to 0 mod this
+    CONTENT_BOUNDARY_DIVISOR = 32
+    _WORD_START_PATTERN = re.compile(r'\s(?=\S)')
+
+    def _next_content_boundary(self, buffer: str, buffer_start: int, boundary: int, step: int, exhausted: bool) -> int:
+        """
+        Next parent end for "content" boundary mode, between 3/4 and 5/4 of `step`
+        after the previous one. Cuts are chosen by hashing the text just before each
+        word start, so after an edit the boundaries fall back into the same places
+        and every parent past the edited region keeps its content (and ID).
+        """
+        buffer_end = buffer_start + len(buffer)
+        low, high = boundary + step * 3 // 4, boundary + step * 5 // 4
+        if exhausted and buffer_end <= high:
+            return buffer_end
+        
+        fallback = None
+        for match in self._WORD_START_PATTERN.finditer(buffer, low - buffer_start, high - buffer_start):
+            cut = match.end()  # Buffer-relative
+            fallback = cut
+            if zlib.crc32(buffer[max(0, cut - 16):cut].encode("utf-8")) % self.CONTENT_BOUNDARY_DIVISOR == 0:
+                return cut + buffer_start
+        return fallback + buffer_start if fallback is not None else min(high, buffer_end)
+
+    def _chunk_id(self, prefix: str, doc_key: str, *parts: str) -> str:
+        """Deterministic chunk ID from the document key and chunk-identifying parts."""
+        digest = hashlib.sha1("\x1f".join((doc_key,) + parts).encode("utf-8")).hexdigest()
+        return f"{prefix}_{digest}"
+
+    def _make_parent_group(self, raw_content: str, start: int, title: str, sentence_pattern,
+                           doc_key: str = None, occurrences: Dict[str, int] = None) -> Tuple[Dict, List[Dict]]:
+        """Builds one parent chunk and its sentence-level child chunks from a raw parent window."""
+        parent_content = raw_content.strip()
+        if not parent_content:
+            return None
+        
+        if doc_key is not None:
+            # Repeated identical parents in one document get distinct IDs by occurrence
+            content_hash = hashlib.sha1(parent_content.encode("utf-8")).hexdigest()
+            occurrence = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = occurrence + 1
+            parent_id = self._chunk_id("parent", doc_key, content_hash, str(occurrence))
+        else:
+            parent_id = f"parent_{uuid.uuid4().hex}"
+        # Span of the stripped parent within the document
+        parent_start = start + len(raw_content) - len(raw_content.lstrip())
+        parent = {
+            "id": parent_id,
+            "metadata": {"content": parent_content, "title": title},
+            "start": parent_start,
+            "end": parent_start + len(parent_content)
+        }
+        
+        if self.token_chunker:
+            # Token mode: sentence spans merged/split to the target token size
+            child_spans = self.token_chunker.chunk(parent_content, self._sentence_spans(parent_content, sentence_pattern))
+        else:
+            # Create child chunks from this parent chunk using optimized sentence splitting
+            sentences = sentence_pattern.split(parent_content)
             
-        logger.info(f"Chunking complete: {len(parent_chunks)} parent chunks, {len(child_chunks)} child chunks")
-        return parent_chunks, child_chunks
+            # Filter and process sentences more efficiently
+            valid_sentences = [
+                sentence.strip() 
+                for sentence in sentences 
+                if len(sentence.strip()) > 20  # Filter out very short sentences
+            ]
+            
+            # Record each valid sentence's span in the parent
+            child_spans = []
+            cursor = 0
+            for sentence in valid_sentences:
+                child_start = parent_content.find(sentence, cursor)
+                cursor = child_start + len(sentence)
+                child_spans.append((child_start, cursor))
+        
+        children = [
+            {
+                # A child is identified by its parent and its span within it
+                "id": self._chunk_id("child", parent_id, str(child_start), str(child_end)) if doc_key is not None else f"child_{uuid.uuid4().hex}",
+                "content": parent_content[child_start:child_end],
+                "parent_id": parent_id,
+                "start": child_start,
+                "end": child_end
+            }
+            for child_start, child_end in child_spans
+        ]
+        
+        return parent, children
+
+    @staticmethod
+    def _sentence_spans(text: str, sentence_pattern) -> List[Tuple[int, int]]:
+        """(start, end) of every whitespace-stripped sentence in `text`."""
+        spans = []
+        position = 0
+        for separator in list(sentence_pattern.finditer(text)) + [None]:
+            end = separator.start() if separator else len(text)
+            segment = text[position:end]
+            start = position + len(segment) - len(segment.lstrip())
+            stop = start + len(segment.strip())
+            if stop > start:
+                spans.append((start, stop))
+            if separator:
+                position = separator.end()
+        return spans
 
 
 # Singleton instance
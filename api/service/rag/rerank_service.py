@@ -2,6 +2,7 @@ from typing import List, Dict, Any
 import logging
 from flashrank import Ranker, RerankRequest
 from lib.config import settings
+from service.rag.inference_pool import inference_pool
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,13 @@ class RerankService:
         if self.initialized:
             return
             
+        if inference_pool.is_process_mode:
+            # Reranking runs in the inference pool's worker processes, which load their own model
+            self.ranker = None
+            self.initialized = True
+            logger.info("FlashRank Service initialized; inference runs in the process pool.")
+            return
+
         try:
             logger.info("Initializing FlashRank Service (ms-marco-MiniLM-L-12-v2)...")
             # Uses MiniLM - better accuracy/reliability trade-off than TinyBERT, still very fast
@@ -50,57 +58,85 @@ class RerankService:
             return documents[:top_n]
 
         try:
-            # Prepare data for FlashRank
-            # FlashRank expects list of dicts with "id" and "text" (or similar)
-            passages = []
-            for i, doc in enumerate(documents):
-                content = doc.get("metadata", {}).get("content", "")
-                # Create a unique ID if not present
-                doc_id = doc.get("id", str(i))
-                
-                passages.append({
-                    "id": doc_id,
-                    "text": content,
-                    "meta": {"original_index": i} # Keep track of original document
-                })
-
+            passages = self._build_passages(documents)
             if not passages:
                 return []
 
             rerank_request = RerankRequest(query=query, passages=passages)
             results = self.ranker.rerank(rerank_request)
+            return self._map_results(results, documents, top_n)
             
-            # Map results back to original documents
-            reranked_docs = []
-            for res in results:
-                # Find original doc
-                original_idx = res.get("meta", {}).get("original_index")
-                if original_idx is not None and 0 <= original_idx < len(documents):
-                    doc = documents[original_idx].copy()
-                    # Add normalized score
-                    score = res.get('score', 0.0)
-                    
-                    # Sanity check: FlashRank occasionally returns 0 for very short or oddly formatted text
-                    # If 0, fallback to the original retrieval score to ensure we don't drop relevant chunks
-                    if score <= 0.0001:
-                        # Use retrieval_score (from vector DB) or a small fallback
-                        fallback_score = doc.get('retrieval_score', 0.1)
-                        logger.warning(f"RERANK: Score was {score} for doc {doc_id}, falling back to {fallback_score}")
-                        score = fallback_score
-                        
-                    doc['score'] = score
-                    reranked_docs.append(doc)
-            
-            if reranked_docs and all(d['score'] == 0.0 for d in reranked_docs):
-                 logger.warning("FlashRank returned all zero scores. This might indicate an issue with the model or input.")
+        except Exception as e:
+            logger.error(f"Error during local reranking: {e}")
+            # Fallback to original order
+            return documents[:top_n]
+
+    async def rerank_documents_async(self, query: str, documents: List[Dict[str, Any]], top_n: int = 5) -> List[Dict[str, Any]]:
+        """
+        Same as rerank_documents, but runs FlashRank inference on the inference pool
+        instead of blocking the event loop.
+        """
+        if not documents or (not self.ranker and not inference_pool.is_process_mode):
+            if documents:
+                logger.warning("Reranker not initialized, returning original order")
+            return documents[:top_n]
+
+        try:
+            passages = self._build_passages(documents)
+            if not passages:
+                return []
+
+            results = await inference_pool.rerank(query, passages, local_ranker=self.ranker)
+            return self._map_results(results, documents, top_n)
 
-            logger.info(f"Reranked {len(documents)} documents locally using FlashRank")
-            return reranked_docs[:top_n]
-            
         except Exception as e:
             logger.error(f"Error during local reranking: {e}")
             # Fallback to original order
             return documents[:top_n]
 
+    def _build_passages(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Prepare data for FlashRank, which expects list of dicts with "id" and "text"."""
+        passages = []
+        for i, doc in enumerate(documents):
+            content = doc.get("metadata", {}).get("content", "")
+            # Create a unique ID if not present
+            doc_id = doc.get("id", str(i))
+            
+            passages.append({
+                "id": doc_id,
+                "text": content,
+                "meta": {"original_index": i} # Keep track of original document
+            })
+        return passages
+
+    def _map_results(self, results: List[Dict[str, Any]], documents: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        """Map FlashRank results back to the original documents."""
+        reranked_docs = []
+        for res in results:
+            # Find original doc
+            original_idx = res.get("meta", {}).get("original_index")
+            if original_idx is not None and 0 <= original_idx < len(documents):
+                doc = documents[original_idx].copy()
+                doc_id = doc.get("id", str(original_idx))
+                # Add normalized score
+                score = res.get('score', 0.0)
+                
+                # Sanity check: FlashRank occasionally returns 0 for very short or oddly formatted text
+                # If 0, fallback to the original retrieval score to ensure we don't drop relevant chunks
+                if score <= 0.0001:
+                    # Use retrieval_score (from vector DB) or a small fallback
+                    fallback_score = doc.get('retrieval_score', 0.1)
+                    logger.warning(f"RERANK: Score was {score} for doc {doc_id}, falling back to {fallback_score}")
+                    score = fallback_score
+                    
+                doc['score'] = score
+                reranked_docs.append(doc)
+        
+        if reranked_docs and all(d['score'] == 0.0 for d in reranked_docs):
+             logger.warning("FlashRank returned all zero scores. This might indicate an issue with the model or input.")
+
+        logger.info(f"Reranked {len(documents)} documents locally using FlashRank")
+        return reranked_docs[:top_n]
+
 # Singleton instance
 rerank_service = RerankService()
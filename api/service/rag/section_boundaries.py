@@ -0,0 +1,70 @@
+import re
+from collections import deque
+from typing import Deque, Optional
+
+# A heading line ("# " .. "###### ") or a code fence line, at the start of a line
+_MARKER = re.compile(r'(#{1,6}) \S|(`{3,}|~{3,})')
+# Chars after a line start needed to classify the line
+MARKER_PREFIX_CHARS = 16
+
+
+class SectionBoundaryScanner:
+    """
+    Finds section starts in text as it streams through the chunker: heading lines and
+    the opening fence of a code block (the markers the Markdown extractor keeps), with
+    headings inside code blocks ignored. Lines are classified once, in order, from
+    their first MARKER_PREFIX_CHARS characters, so the result does not depend on how
+    the text is split into stream pieces as long as the caller has that much text
+    past any position it asks about.
+    """
+
+    def __init__(self):
+        self._markers: Deque[int] = deque()  # Section starts found and not yet passed
+        self._line_start = 0      # Next line start to classify
+        self._classified = False  # Whether the line at _line_start has been classified
+        self._scan = 0            # Where to look for the end of the current line
+        self._fence: Optional[str] = None  # Opening fence while inside a code block
+
+    def feed(self, buffer: str, buffer_start: int, exhausted: bool):
+        """Classifies every line whose start is at least MARKER_PREFIX_CHARS before the buffer end."""
+        buffer_end = buffer_start + len(buffer)
+        while True:
+            if not self._classified:
+                if self._line_start >= buffer_end or (
+                        not exhausted and self._line_start + MARKER_PREFIX_CHARS > buffer_end):
+                    return
+                offset = self._line_start - buffer_start
+                self._classify(self._line_start, buffer[offset:offset + MARKER_PREFIX_CHARS])
+                self._classified = True
+                self._scan = self._line_start
+            newline = buffer.find("\n", self._scan - buffer_start)
+            if newline < 0:
+                self._scan = buffer_end
+                return
+            self._line_start = buffer_start + newline + 1
+            self._classified = False
+
+    def _classify(self, position: int, prefix: str):
+        match = _MARKER.match(prefix)
+        if match is None:
+            return
+        fence = match.group(2)
+        if self._fence is not None:
+            # Only a bare fence of the same kind and at least the same length closes the block
+            if fence and fence[0] == self._fence[0] and len(fence) >= len(self._fence) \
+                    and not prefix[len(fence):].split("\n", 1)[0].strip():
+                self._fence = None
+        elif fence:
+            self._fence = fence
+            self._markers.append(position)
+        else:
+            self._markers.append(position)
+
+    def next_marker(self, after: int, before: int) -> Optional[int]:
+        """The first section start strictly between `after` and `before`; earlier ones are dropped."""
+        markers = self._markers
+        while markers and markers[0] <= after:
+            markers.popleft()
+        if markers and markers[0] < before:
+            return markers[0]
+        return None
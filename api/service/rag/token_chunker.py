@@ -0,0 +1,99 @@
+import logging
+import threading
+from typing import List, Dict, Any, Tuple, Callable
+from service.monitoring.histogram import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Spans are (start, end) character offsets within the text being chunked
+Span = Tuple[int, int]
+
+
+class TokenChunker:
+    """
+    Token-aware child chunking, measured in the embedding model's tokens.
+
+    Consecutive sentences are merged until a chunk would exceed `target_tokens`,
+    sentences longer than `max_tokens` are split at token boundaries (so nothing is
+    silently truncated by the model), and chunks still under `min_tokens` are dropped.
+    Chunks are contiguous spans of the input text.
+    """
+
+    def __init__(self, tokenizer_provider: Callable[[], Any], target_tokens: int = 128,
+                 max_tokens: int = 510, min_tokens: int = 8):
+        self.tokenizer_provider = tokenizer_provider
+        self.max_tokens = max(1, max_tokens)
+        self.target_tokens = max(1, min(target_tokens, self.max_tokens))
+        self.min_tokens = min_tokens
+        self.tokens_per_chunk = Histogram([16, 32, 64, 128, 256, 512])
+        self._lock = threading.Lock()
+        self._counters = {"sentences": 0, "chunks": 0, "sentences_merged": 0, "sentences_split": 0, "chunks_dropped": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "target_tokens": self.target_tokens,
+            "max_tokens": self.max_tokens,
+            "min_tokens": self.min_tokens,
+            **counters,
+            "tokens_per_chunk": self.tokens_per_chunk.snapshot(),
+        }
+
+    def _token_offsets(self, texts: List[str]) -> List[List[Span]]:
+        """Character span of every token in each text (special tokens excluded)."""
+        tokenizer = self.tokenizer_provider()
+        if tokenizer is not None:
+            try:
+                encodings = tokenizer.encode_batch(texts, add_special_tokens=False)
+                return [list(enc.offsets) for enc in encodings]
+            except Exception as e:
+                logger.warning(f"Tokenizer unavailable for chunking, estimating ~4 chars/token: {e}")
+        return [[(i, min(i + 4, len(text))) for i in range(0, len(text), 4)] for text in texts]
+
+    def chunk(self, text: str, sentence_spans: List[Span]) -> List[Span]:
+        """Group the given sentence spans of `text` into token-sized chunk spans."""
+        sentences = [(start, end) for start, end in sentence_spans if text[start:end].strip()]
+        if not sentences:
+            return []
+
+        # 1. Measure each sentence; split the ones that do not fit the model window
+        units: List[Tuple[int, int, int]] = []  # (start, end, tokens)
+        split = 0
+        for (start, end), offsets in zip(sentences, self._token_offsets([text[s:e] for s, e in sentences])):
+            if not offsets:
+                continue
+            if len(offsets) <= self.max_tokens:
+                units.append((start, end, len(offsets)))
+                continue
+            split += 1
+            for i in range(0, len(offsets), self.max_tokens):
+                piece = offsets[i:i + self.max_tokens]
+                units.append((start + piece[0][0], start + piece[-1][1], len(piece)))
+
+        # 2. Greedily merge consecutive units up to the target size
+        chunks: List[List[int]] = []  # [start, end, tokens]
+        for start, end, tokens in units:
+            if chunks and chunks[-1][2] + tokens <= self.target_tokens:
+                chunks[-1][1] = end
+                chunks[-1][2] += tokens
+            else:
+                chunks.append([start, end, tokens])
+
+        # 3. Fold a short tail into the previous chunk, then drop what is still too small
+        if len(chunks) >= 2 and chunks[-1][2] < self.min_tokens and chunks[-2][2] + chunks[-1][2] <= self.max_tokens:
+            tail = chunks.pop()
+            chunks[-1][1] = tail[1]
+            chunks[-1][2] += tail[2]
+        kept = [chunk for chunk in chunks if chunk[2] >= self.min_tokens]
+
+        for _, _, tokens in kept:
+            self.tokens_per_chunk.observe(tokens)
+        with self._lock:
+            self._counters["sentences"] += len(sentences)
+            self._counters["chunks"] += len(kept)
+            self._counters["sentences_merged"] += max(0, len(units) - len(chunks))
+            self._counters["sentences_split"] += split
+            self._counters["chunks_dropped"] += len(chunks) - len(kept)
+
+        return [(start, end) for start, end, _ in kept]
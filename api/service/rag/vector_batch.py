@@ -0,0 +1,58 @@
+from typing import List, Dict, Any, Iterator
+import numpy as np
+
+
+class VectorBatch:
+    """
+    A batch of vectors backed by one contiguous (n, dim) float32 matrix, with
+    parallel lists of IDs and metadata.
+
+    Vectors stay in numpy from embedding through to the vector store; they are
+    only turned into Python float lists per upsert request, at the store boundary.
+    """
+
+    def __init__(self, ids: List[str], values: np.ndarray, metadata: List[Dict[str, Any]] = None):
+        values = np.ascontiguousarray(values, dtype=np.float32)
+        if values.ndim != 2 or values.shape[0] != len(ids):
+            raise ValueError(f"values must be shaped (len(ids), dim); got {values.shape} for {len(ids)} ids")
+        self.ids = list(ids)
+        self.values = values
+        self.metadata = list(metadata) if metadata is not None else [{} for _ in ids]
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]], dim: int) -> "VectorBatch":
+        """Build a batch from Pinecone-style dicts ({'id', 'values', 'metadata'})."""
+        if not records:
+            return cls([], np.zeros((0, dim), dtype=np.float32), [])
+        return cls(
+            [r["id"] for r in records],
+            np.asarray([r["values"] for r in records], dtype=np.float32),
+            [r.get("metadata", {}) for r in records],
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.values.shape[1]
+
+    def slice(self, start: int, end: int) -> "VectorBatch":
+        """A view over rows [start, end) without copying the matrix."""
+        return VectorBatch(self.ids[start:end], self.values[start:end], self.metadata[start:end])
+
+    def take(self, rows: List[int]) -> "VectorBatch":
+        """A copy holding only the given rows, in the given order."""
+        return VectorBatch([self.ids[i] for i in rows], self.values[rows], [self.metadata[i] for i in rows])
+
+    def iter_slices(self, batch_size: int) -> Iterator["VectorBatch"]:
+        for start in range(0, len(self), batch_size):
+            yield self.slice(start, start + batch_size)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Serialize to the dict format the Pinecone client expects."""
+        rows = self.values.tolist()
+        return [
+            {"id": vector_id, "values": row, "metadata": meta}
+            for vector_id, row, meta in zip(self.ids, rows, self.metadata)
+        ]
@@ -0,0 +1,85 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Union
+import logging
+
+from service.rag.vector_batch import VectorBatch
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStore(ABC):
+    """
+    Interface shared by the vector-store backends (Pinecone, local index).
+    Backends are selected with settings.vector_store_backend; see vector_store_service.
+    """
+
+    @abstractmethod
+    def initialize(self) -> bool:
+        """Connect to / open the store. Returns False if the store is unusable."""
+
+    @abstractmethod
+    async def upsert_vectors(self, vectors: Union[VectorBatch, List[Dict[str, Any]]]) -> bool:
+        """Insert or replace vectors ({'id', 'values', 'metadata'} records or a VectorBatch)."""
+
+    @abstractmethod
+    async def query_vectors(self, query_vector: List[float], top_k: int = 5, username: str = None, documents: List[str] = None) -> List[Dict[str, Any]]:
+        """Return the top_k matches as [{'id', 'score', 'metadata'}], scoped to a user and optional documents."""
+
+    @abstractmethod
+    async def fetch(self, ids: List[str], username: str = None) -> Dict[str, Dict[str, Any]]:
+        """Return {id: {'id', 'values', 'metadata'}} for the IDs that exist (within the user's partition if given)."""
+
+    @abstractmethod
+    async def delete_vectors_by_chunk_ids(self, chunk_ids: list, username: str = None) -> int:
+        """Delete vectors by their IDs (within the user's partition if given). Returns the number of IDs submitted."""
+
+    @abstractmethod
+    async def delete_vectors_by_filter(self, filter_dict: Dict[str, Any]) -> bool:
+        """Delete vectors using a metadata filter."""
+
+    def shutdown(self):
+        """Release executors or file handles held by the backend."""
+
+    async def get_parent_ids_from_chunks(self, chunk_ids: list, username: str = None) -> list:
+        """Fetch parent IDs from chunk vectors before deletion."""
+        if not chunk_ids:
+            return []
+
+        try:
+            parent_ids = set()
+            # Fetch vectors in batches to get their metadata
+            batch_size = 100
+            for i in range(0, len(chunk_ids), batch_size):
+                vectors = await self.fetch(chunk_ids[i:i + batch_size], username=username)
+                for vector_data in vectors.values():
+                    parent_id = vector_data.get('metadata', {}).get('parent_id')
+                    if parent_id:
+                        parent_ids.add(parent_id)
+
+            logger.info(f"Found {len(parent_ids)} unique parent IDs from {len(chunk_ids)} chunks")
+            return list(parent_ids)
+        except Exception as e:
+            logger.error(f"Failed to fetch parent IDs from vector store: {e}")
+            return []
+
+
+def matches_filter(metadata: Dict[str, Any], filter_dict: Dict[str, Any]) -> bool:
+    """
+    Evaluate the subset of Pinecone's metadata filter language used by this app:
+    plain equality, $eq, $ne, $in and $nin, implicitly AND-ed across fields.
+    """
+    for field, condition in (filter_dict or {}).items():
+        value = metadata.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
@@ -0,0 +1,31 @@
+import logging
+
+from lib.config import settings
+from service.rag.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+def create_vector_store() -> VectorStore:
+    """
+    Select the vector-store backend from settings.vector_store_backend:
+    - "pinecone" (default): managed Pinecone index
+    - "local": in-process exact cosine index persisted under settings.local_vector_store_dir
+    """
+    backend = (settings.vector_store_backend or "pinecone").lower()
+    if backend == "local":
+        from service.rag.local_vector_service import LocalVectorService
+        return LocalVectorService(
+            root_dir=settings.local_vector_store_dir,
+            dimension=settings.embedding_dim,
+            dtype=settings.local_vector_store_dtype,
+        )
+
+    if backend != "pinecone":
+        logger.warning(f"Unknown vector store backend '{backend}', falling back to Pinecone")
+    from service.rag.pinecone_service import pinecone_service
+    return pinecone_service
+
+
+# Singleton instance
+vector_store_service = create_vector_store()
@@ -36,12 +36,35 @@ export function DocumentUpload({ onUploadSuccess, compact = false }) {
       // Transition to extracting almost immediately
       setTimeout(() => setStage('extracting'), 500);
 
-      const response = await documentService.uploadFile(file, (p) => {
-        setProgress(p);
-        if (p > 30 && p < 75) setStage('vectorizing');
-        if (p >= 75) setStage('storing');
+      let response = await documentService.uploadFile(file, (p) => {
+        // Queued uploads still have to be indexed after the transfer
+        setProgress(Math.round(p / 2));
       });
 
+      // 202: indexing runs as a background job; wait for it before reporting success
+      if (response.status_url) {
+        const job = await documentService.waitForJob(response.status_url, (update) => {
+          if (update.stage === 'extracting') {
+            setStage('extracting');
+            setProgress(60);
+          } else if (update.stage === 'indexing') {
+            setStage('vectorizing');
+            setProgress(75);
+          }
+        });
+        setStage('storing');
+        setProgress(100);
+        response = job.result || {};
+      } else {
+        setStage('storing');
+        setProgress(100);
+      }
+
+      if (response.skipped) {
+        showToast({ type: 'info', message: response.message || 'Skipped: near-duplicate of an existing document' });
+        return;
+      }
+
       // Track the uploaded document
       documentService.addDocument({
         title: file.name.split('.')[0],
@@ -29,6 +29,17 @@ export const documentService = {
     return response.data;
   },
 
+  // Poll a queued upload's ingestion job until it completes; throws if it fails
+  async waitForJob(statusUrl, onUpdate, intervalMs = 1500) {
+    for (;;) {
+      const { data: job } = await api.get(statusUrl);
+      onUpdate?.(job);
+      if (job.status === 'completed') return job;
+      if (job.status === 'failed') throw new Error(job.error || 'Indexing failed');
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+  },
+
   // Get list of indexed documents from backend
   async getDocuments() {
     try {
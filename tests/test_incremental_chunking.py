@@ -0,0 +1,83 @@
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+# Chunking only; keep the model, LLM and storage services out of the import
+_SERVICES = [
+    "service.rag.gemini_service",
+    "service.rag.groq_service",
+    "service.rag.embedding_service",
+    "service.rag.vector_store_service",
+    "service.rag.parent_chunks_service",
+    "service.rag.document_text_service",
+    "service.rag.rerank_service",
+]
+# (only these entries are removed afterwards; patch.dict would also drop numpy etc. and
+# break other test modules that import them later)
+_stubs = {name: mock.MagicMock() for name in _SERVICES if name not in sys.modules}
+sys.modules.update(_stubs)
+try:
+    from lib.config import settings  # noqa: E402
+    from service.rag.rag_service import RAGService  # noqa: E402
+finally:
+    for _name in _stubs:
+        del sys.modules[_name]
+
+DOC_KEY = "alice/report.txt"
+
+
+def make_document(words: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    vocab = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit",
+             "sed", "do", "eiusmod", "tempor", "incididunt", "labore", "magna", "aliqua"]
+    sentences, count = [], 0
+    while count < words:
+        length = rng.randint(6, 18)
+        sentences.append(" ".join(rng.choice(vocab) for _ in range(length)).capitalize() + ".")
+        count += length
+    return " ".join(sentences)
+
+
+class IncrementalChunkingTest(unittest.TestCase):
+    def chunk_ids(self, service: RAGService, text: str):
+        parents, children = service._chunk_document_small_to_big(text, "Report", doc_key=DOC_KEY)
+        return {p["id"] for p in parents}, {c["id"] for c in children}
+
+    def test_incremental_indexing_defaults_to_content_boundaries(self):
+        if settings.incremental_indexing and "PARENT_BOUNDARY_MODE" not in os.environ:
+            self.assertEqual(settings.parent_boundary_mode, "content")
+
+    def test_edit_near_start_reuses_most_chunks(self):
+        service = RAGService()
+        service.parent_boundary_mode = "content"
+        original = make_document(20000)
+        edited = original[:5000] + " A new sentence here. " + original[5000:]
+
+        old_parents, old_children = self.chunk_ids(service, original)
+        new_parents, new_children = self.chunk_ids(service, edited)
+
+        self.assertGreaterEqual(len(new_parents & old_parents) / len(new_parents), 0.9)
+        self.assertGreaterEqual(len(new_children & old_children) / len(new_children), 0.9)
+
+    def test_section_boundaries_only_for_markdown_text(self):
+        service = RAGService()
+        service.parent_boundary_mode = "fixed"
+        service.parent_section_boundaries = True
+        # A plain-text upload with a line that merely looks like a Markdown heading
+        text = make_document(120) + "\n# Not a heading\n" + make_document(120, seed=8)
+        heading = text.index("# Not a heading")
+
+        def parent_starts(section_markers):
+            groups = service.iter_small_to_big([text], "Report", doc_key=DOC_KEY, section_markers=section_markers)
+            return [parent["start"] for parent, _ in groups]
+
+        self.assertNotIn(heading, parent_starts(section_markers=False))
+        self.assertIn(heading, parent_starts(section_markers=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
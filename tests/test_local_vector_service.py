@@ -0,0 +1,64 @@
+import glob
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from service.rag.local_vector_service import LocalVectorService  # noqa: E402
+from service.rag.vector_batch import VectorBatch  # noqa: E402
+
+DIM = 4
+
+
+class LocalVectorMetadataIsolationTest(unittest.IsolatedAsyncioTestCase):
+    """Results must not alias the index: retrieval writes parent text into result metadata."""
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.service = LocalVectorService(self.tmp.name, DIM)
+        self.service.initialize()
+        # Slim metadata: no child text stored with the vectors
+        metadata = [{"username": "alice", "source_filename": "a.txt", "parent_id": f"p{i}"} for i in range(3)]
+        values = np.eye(3, DIM, dtype=np.float32) + 0.1
+        await self.service.upsert_vectors(VectorBatch(["c0", "c1", "c2"], values, metadata))
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    def stored_metadata(self):
+        records = []
+        for path in glob.glob(os.path.join(self.tmp.name, "*", "seg_*.meta.jsonl")):
+            with open(path, "r", encoding="utf-8") as f:
+                records.extend(json.loads(line)["metadata"] for line in f)
+        return records
+
+    async def test_query_then_compact_keeps_metadata_slim(self):
+        matches = await self.service.query_vectors([1.0, 0.0, 0.0, 0.0], top_k=3, username="alice")
+        self.assertEqual(len(matches), 3)
+        for match in matches:
+            # What RAGService.retrieval_module does with each match
+            match["metadata"]["content"] = "parent text"
+
+        fetched = await self.service.fetch(["c0"], username="alice")
+        fetched["c0"]["metadata"]["content"] = "parent text"
+
+        for index in self.service._tenants.values():
+            index.compact()
+
+        stored = self.stored_metadata()
+        self.assertEqual(len(stored), 3)
+        for metadata in stored:
+            self.assertNotIn("content", metadata)
+
+        reloaded = LocalVectorService(self.tmp.name, DIM)
+        for match in await reloaded.query_vectors([1.0, 0.0, 0.0, 0.0], top_k=3, username="alice"):
+            self.assertNotIn("content", match["metadata"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from service.rag.pinecone_service import PineconeService  # noqa: E402
+
+UPSERT_SECONDS = 0.5
+
+
+class SlowUpsertIndex:
+    """Stands in for a Pinecone index: upsert blocks its thread like a slow round trip, query is fast."""
+
+    def __init__(self):
+        self.upserted = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace=""):
+        time.sleep(UPSERT_SECONDS)
+        with self._lock:
+            self.upserted += len(vectors)
+
+    def query(self, vector, top_k, include_metadata, filter, namespace=""):
+        return {"matches": [{"id": "v0", "score": 0.9, "metadata": {"username": "alice"}}]}
+
+
+class PineconeServiceConcurrencyTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.service = PineconeService()
+        self.service.index = SlowUpsertIndex()
+        self.service.max_workers = 4
+        self.service.upsert_concurrency = 2
+
+    async def asyncTearDown(self):
+        self.service.shutdown()
+
+    async def test_query_is_served_during_slow_upsert(self):
+        vectors = [
+            {"id": f"v{i}", "values": [0.1] * 4, "metadata": {"username": "alice"}}
+            for i in range(400)
+        ]
+        finished = []
+
+        async def upsert():
+            self.assertTrue(await self.service.upsert_vectors(vectors))
+            finished.append("upsert")
+
+        async def query():
+            started = time.perf_counter()
+            matches = await self.service.query_vectors([0.1] * 4, top_k=1, username="alice")
+            finished.append("query")
+            return matches, time.perf_counter() - started
+
+        upsert_task = asyncio.create_task(upsert())
+        await asyncio.sleep(0.05)  # Upsert batches are now blocking their worker threads
+
+        matches, latency = await query()
+        await upsert_task
+
+        self.assertEqual(finished, ["query", "upsert"])
+        self.assertEqual(matches[0]["id"], "v0")
+        self.assertLess(latency, UPSERT_SECONDS / 2)
+        self.assertEqual(self.service.index.upserted, len(vectors))
+
+    async def test_event_loop_keeps_running_during_upsert(self):
+        vectors = [{"id": f"v{i}", "values": [0.1] * 4, "metadata": {}} for i in range(100)]
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        try:
+            await self.service.upsert_vectors(vectors)
+        finally:
+            ticker_task.cancel()
+        # A blocked loop would manage at most one tick during the upsert
+        self.assertGreater(ticks, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()